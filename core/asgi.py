@@ -13,24 +13,23 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+# Build the Django application first: it sets up the app registry, which the
+# consumers imported by the websocket routing below depend on.
+django_asgi_app = get_asgi_application()
 
-
-# ASGI_APPLICATION = 'core.asgi.application'
-
-
-
-import os
-from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from tasks.routing import websocket_urlpatterns
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from django.urls import re_path  # noqa: E402
+from tasks.routing import http_urlpatterns, websocket_urlpatterns  # noqa: E402
+from users.authentication import JWTAuthMiddleware  # noqa: E402
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    # Long-lived streams (see tasks/routing.py) are served by Channels; everything else by Django.
+    "http": URLRouter([
+        *http_urlpatterns,
+        re_path(r'', django_asgi_app),
+    ]),
+    # Websockets authenticate with a JWT (see JWTAuthMiddleware), not the session.
+    "websocket": JWTAuthMiddleware(
         URLRouter(
             websocket_urlpatterns
         )
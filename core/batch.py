@@ -0,0 +1,79 @@
+"""
+Multi-get: fetching many objects by id in one request.
+
+Clients holding ids (e.g. from websocket notifications) pass them as
+``?ids=1,2,3`` or, for long lists, as ``POST {"ids": [1, 2, 3]}``. Views load
+the ids the user may see with a single ``id IN (...)`` query and answer::
+
+    {"results": [...], "missing": [4], "forbidden": [5]}
+
+``results`` follows the order of the requested ids. ``missing`` ids don't exist
+or belong to another organization; ``forbidden`` ones exist in the user's
+organization but aren't visible to them. At most ``BATCH_MAX_IDS`` ids are
+accepted per request.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+def parse_ids(value):
+    """
+    Returns the distinct ids in ``value`` (a comma-separated string or a list), in the order given.
+
+    Raises:
+    ValidationError
+        If an id isn't a positive integer, or there are none or more than ``BATCH_MAX_IDS``.
+    """
+    if isinstance(value, str):
+        value = [part for part in value.split(',') if part.strip()]
+    if not isinstance(value, (list, tuple)):
+        raise ValidationError({'ids': ["Expected a list of ids."]})
+    try:
+        ids = [int(part) for part in value]
+    except (TypeError, ValueError):
+        raise ValidationError({'ids': ["Ids must be integers."]})
+    if not ids or min(ids) < 1:
+        raise ValidationError({'ids': ["Expected one or more positive ids."]})
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > settings.BATCH_MAX_IDS:
+        raise ValidationError({'ids': [f"At most {settings.BATCH_MAX_IDS} ids per request."]})
+    return ids
+
+
+class BatchRetrieveMixin:
+    """
+    Generic view mixin answering multi-get requests; subclasses implement ``get_batch``.
+    """
+
+    def get_batch_ids(self):
+        if self.request.method == 'GET':
+            return parse_ids(self.request.query_params.get('ids', ''))
+        return parse_ids(self.request.data.get('ids') if hasattr(self.request.data, 'get') else None)
+
+    def get_batch(self, ids):
+        """
+        Loads the requested objects the user may see, with one query.
+
+        Returns:
+        tuple
+            ``({id: obj}, forbidden_ids)``: the visible objects by id, and the set of
+            requested ids that exist but aren't visible to the user.
+
+        Raises:
+        ImproperlyConfigured
+            Unless overridden.
+        """
+        raise ImproperlyConfigured(f'{type(self).__name__} must implement get_batch(ids).')
+
+    def batch(self, request, *args, **kwargs):
+        ids = self.get_batch_ids()
+        found, forbidden = self.get_batch(ids)
+        self.batch_objects = [found[pk] for pk in ids if pk in found]
+        return Response({
+            'results': self.get_serializer(self.batch_objects, many=True).data,
+            'missing': [pk for pk in ids if pk not in found and pk not in forbidden],
+            'forbidden': [pk for pk in ids if pk in forbidden],
+        })
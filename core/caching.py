@@ -0,0 +1,272 @@
+"""
+Two-tier caching for small, hot lookups (users by id, tags by name, ...).
+
+``TwoTierCache`` keeps a bounded in-process LRU with a TTL in front of the
+shared Django cache (Redis, or an in-memory stand-in in development; see
+``CACHES``). A lookup is served from the worker's own memory when it can, from
+the shared cache otherwise, and only loaded from the database when both miss::
+
+    user_cache = TwoTierCache('users')
+    user = user_cache.get(user_id, lambda: User.objects.filter(id=user_id).first())
+
+``invalidate(key)`` (called from ``post_save``/``post_delete`` receivers)
+deletes the shared entry, takes the next number of the cache's invalidation
+counter (an atomic ``incr``) and records the key under that number. Every
+worker reads the counter at most every ``CACHE_VERSION_CHECK_INTERVAL``
+seconds and drops just the keys invalidated since its last check, so saving
+one user doesn't empty every worker's local tier. If it fell too far behind,
+or the log entries expired, it drops the whole local tier instead; the shared
+tier still holds the other entries, so refilling costs no queries.
+``CACHE_LOCAL_TTL`` bounds staleness should a check be missed.
+
+Hits, misses and evictions are counted per cache in ``/metrics`` and returned
+by ``stats()``.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .metrics import REGISTRY
+
+MISSING = object()
+# Invalidations a worker replays key by key; further behind, it drops its whole local tier.
+INVALIDATION_LOG_SIZE = 1000
+
+LOOKUPS = REGISTRY.counter(
+    'cache_lookups_total',
+    'Two-tier cache lookups by outcome: local_hit, shared_hit or miss.',
+    ('cache', 'result'),
+)
+EVICTIONS = REGISTRY.counter(
+    'cache_local_evictions_total',
+    'Entries dropped from the in-process tier: size, expired or invalidated.',
+    ('cache', 'reason'),
+)
+
+_registry = {}
+
+
+class LRUCache:
+    """
+    A thread-safe mapping holding at most ``maxsize`` entries, each for ``ttl`` seconds.
+
+    Attributes:
+    maxsize: The least recently used entry is evicted beyond this size.
+    ttl: Seconds an entry stays valid.
+    on_evict: Called with ``'size'`` or ``'expired'`` whenever an entry is dropped.
+    """
+
+    def __init__(self, maxsize, ttl, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evicted(self, reason):
+        if self.on_evict:
+            self.on_evict(reason)
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires >= time.monotonic():
+                self._data.move_to_end(key)
+                return value
+            del self._data[key]
+        self._evicted('expired')
+        return default
+
+    def set(self, key, value):
+        evicted = 0
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        for _ in range(evicted):
+            self._evicted('size')
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, MISSING) is not MISSING
+
+    def clear(self):
+        with self._lock:
+            dropped = len(self._data)
+            self._data.clear()
+        return dropped
+
+
+class TwoTierCache:
+    """
+    An in-process ``LRUCache`` in front of a shared Django cache, invalidated across workers.
+
+    Attributes:
+    name: Namespaces the shared keys and labels the metrics.
+    local: The in-process tier.
+    timeout: Seconds entries live in the shared tier.
+    """
+
+    def __init__(self, name, maxsize=None, ttl=None, timeout=None, alias='default'):
+        self.name = name
+        self.local = LRUCache(
+            maxsize or settings.CACHE_LOCAL_MAXSIZE,
+            ttl or settings.CACHE_LOCAL_TTL,
+            on_evict=lambda reason: EVICTIONS.inc(cache=name, reason=reason),
+        )
+        self.timeout = timeout or settings.CACHE_SHARED_TIMEOUT
+        self.alias = alias
+        self._stamp = MISSING
+        self._checked = 0.0
+        _registry[name] = self
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @property
+    def stamp_key(self):
+        return f'twotier:{self.name}:stamp'
+
+    def log_key(self, number):
+        return f'twotier:{self.name}:invalidated:{number}'
+
+    def shared_key(self, key):
+        # Quoted: keys may hold user input such as tag names, and cache keys can't contain spaces.
+        return f'twotier:{self.name}:{quote(str(key))}'
+
+    def _sync(self):
+        # Drop the keys other workers invalidated since the last check.
+        now = time.monotonic()
+        if now - self._checked < settings.CACHE_VERSION_CHECK_INTERVAL:
+            return
+        self._checked = now
+        # A missing counter is recreated at 0 by the next invalidation.
+        stamp = self.shared.get(self.stamp_key, 0)
+        if stamp == self._stamp:
+            return
+        if self._stamp is not MISSING:
+            keys = None
+            if 0 < stamp - self._stamp <= INVALIDATION_LOG_SIZE:
+                numbers = range(self._stamp + 1, stamp + 1)
+                logged = self.shared.get_many([self.log_key(number) for number in numbers])
+                if len(logged) == len(numbers):
+                    keys = logged.values()
+            if keys is None:
+                EVICTIONS.inc(self.local.clear(), cache=self.name, reason='invalidated')
+            else:
+                for key in keys:
+                    if self.local.pop(key):
+                        EVICTIONS.inc(cache=self.name, reason='invalidated')
+        self._stamp = stamp
+
+    def get(self, key, load):
+        """
+        Returns the value cached for ``key``, calling ``load()`` and caching its result on a miss.
+
+        ``None`` results are returned but not cached.
+        """
+        return self.get_many([key], lambda keys: {key: load()}).get(key)
+
+    def get_many(self, keys, load_many):
+        """
+        Returns ``{key: value}`` for ``keys``, loading every key missing from both tiers with one ``load_many(missing)`` call.
+        """
+        self._sync()
+        found = {}
+        for key in keys:
+            value = self.local.get(key)
+            if value is not MISSING:
+                found[key] = value
+        LOOKUPS.inc(len(found), cache=self.name, result='local_hit')
+        missing = [key for key in keys if key not in found]
+        if not missing:
+            return found
+
+        shared_keys = {self.shared_key(key): key for key in missing}
+        hits = self.shared.get_many([*shared_keys, self.stamp_key])
+        stamp = hits.pop(self.stamp_key, None)
+        for shared_key, value in hits.items():
+            key = shared_keys[shared_key]
+            found[key] = value
+            self.local.set(key, value)
+        LOOKUPS.inc(len(hits), cache=self.name, result='shared_hit')
+        missing = [key for key in missing if key not in found]
+        if not missing:
+            return found
+
+        LOOKUPS.inc(len(missing), cache=self.name, result='miss')
+        loaded = {key: value for key, value in load_many(missing).items() if value is not None}
+        found.update(loaded)
+        # Skip the shared write if something was invalidated while loading: the rows may be stale.
+        if loaded and self.shared.get(self.stamp_key) == stamp:
+            self.shared.set_many({self.shared_key(key): value for key, value in loaded.items()}, self.timeout)
+            for key, value in loaded.items():
+                self.local.set(key, value)
+        return found
+
+    def invalidate(self, key):
+        """
+        Drops ``key`` from both tiers here and, within ``CACHE_VERSION_CHECK_INTERVAL``, from every other worker.
+
+        Repeated once the current transaction commits, so that readers can't cache the old row in between.
+        """
+        self._invalidate(key)
+        transaction.on_commit(lambda: self._invalidate(key))
+
+    def _invalidate(self, key):
+        if self.local.pop(key):
+            EVICTIONS.inc(cache=self.name, reason='invalidated')
+        self.shared.delete(self.shared_key(key))
+        try:
+            number = self.shared.incr(self.stamp_key)
+        except ValueError:
+            # No counter yet, or it was evicted: workers that saw an older one drop their whole local tier.
+            self.shared.add(self.stamp_key, 0, None)
+            number = self.shared.incr(self.stamp_key)
+        # Workers that don't find the entry (e.g. it expired) drop their whole local tier too.
+        self.shared.set(self.log_key(number), key, settings.CACHE_LOCAL_TTL)
+
+    def clear(self):
+        """
+        Empties the local tier of this worker.
+        """
+        self.local.clear()
+
+    def stats(self):
+        return {
+            'size': len(self.local),
+            'local_hits': LOOKUPS.value(cache=self.name, result='local_hit'),
+            'shared_hits': LOOKUPS.value(cache=self.name, result='shared_hit'),
+            'misses': LOOKUPS.value(cache=self.name, result='miss'),
+            'evictions': {
+                reason: EVICTIONS.value(cache=self.name, reason=reason)
+                for reason in ('size', 'expired', 'invalidated')
+            },
+        }
+
+
+def clear_local_caches():
+    """
+    Empties the local tier of every ``TwoTierCache`` in this worker (e.g. between tests).
+    """
+    for cache in _registry.values():
+        cache.clear()
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in sorted(_registry.items())}
@@ -0,0 +1,150 @@
+"""
+``Idempotency-Key`` support for create endpoints.
+
+A client (or a gateway retrying a timed-out request) sends the same
+``Idempotency-Key`` header with every attempt of a ``POST``. The first attempt
+creates the object; its response is kept for ``IDEMPOTENCY_KEY_TTL`` seconds,
+together with a fingerprint of the request, and replayed to later attempts
+without running the view again, so a retry neither creates a duplicate nor sends
+notifications twice. Replays carry ``Idempotent-Replayed: true``.
+
+Keys are scoped to the user and the URL name and stored in the organization's
+``TenantCache``. While an attempt runs it holds a lock (a ``cache.add``) for at
+most ``IDEMPOTENCY_LOCK_TIMEOUT`` seconds. ``add`` is only atomic on some
+backends (Redis, memcached, and the in-memory cache within one process), so the
+file-based, database and dummy caches are refused with ``ImproperlyConfigured``.
+The cache must also keep the stored responses until they expire: use Redis with
+a ``volatile-*`` or ``noeviction`` policy rather than one that culls live keys. A concurrent duplicate waits up
+to ``IDEMPOTENCY_WAIT_SECONDS`` for the first attempt's response, then gets a
+``409`` with ``Retry-After``. Reusing a key for a different request is a ``422``.
+Only successful responses are kept; a failed attempt may be retried with the
+same key.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import REGISTRY
+from .tenancy import TenantCache, require_atomic_cache
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+REQUESTS = REGISTRY.counter(
+    'idempotent_requests_total',
+    'Requests with an Idempotency-Key by outcome: executed, replayed, conflict or mismatch.',
+    ('view', 'outcome'),
+)
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    The stored response and the lock for one user's key on one URL.
+
+    Raises:
+    ImproperlyConfigured
+        If the organization's cache backend has no atomic ``add()``.
+    """
+
+    def __init__(self, user, view_name, key):
+        self.cache = TenantCache(user.organization_id)
+        require_atomic_cache(self.cache.cache, HEADER)
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        self.key = f'idempotency:{user.id}:{view_name}:{digest}'
+        self.lock_key = f'{self.key}:lock'
+
+    def get(self):
+        return self.cache.get(self.key)
+
+    def save(self, fingerprint, response):
+        self.cache.set(self.key, {
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'data': response.data,
+        }, settings.IDEMPOTENCY_KEY_TTL)
+
+    def lock(self):
+        return self.cache.add(self.lock_key, 1, settings.IDEMPOTENCY_LOCK_TIMEOUT)
+
+    def unlock(self):
+        self.cache.delete(self.lock_key)
+
+    def acquire(self):
+        """
+        Takes the lock, waiting up to ``IDEMPOTENCY_WAIT_SECONDS`` while another attempt holds it.
+
+        Returns:
+        tuple
+            ``(stored, locked)``: the stored response if the other attempt saved one meanwhile,
+            and whether the lock was taken.
+        """
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            if self.lock():
+                # The other attempt may have saved its response just before releasing the lock.
+                return self.get(), True
+            stored = self.get()
+            if stored is not None or time.monotonic() >= deadline:
+                return stored, False
+            time.sleep(POLL_INTERVAL)
+
+
+class IdempotentCreateMixin:
+    """
+    Makes ``create`` idempotent for requests carrying an ``Idempotency-Key`` header.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({"detail": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        view_name = request.resolver_match.url_name
+        store = IdempotencyStore(request.user, view_name, key)
+        fingerprint = request_fingerprint(request)
+        stored = store.get()
+        locked = False
+        if stored is None:
+            stored, locked = store.acquire()
+        try:
+            if stored is not None:
+                return self.replay(view_name, stored, fingerprint)
+            if not locked:
+                REQUESTS.inc(view=view_name, outcome='conflict')
+                return Response(
+                    {"detail": f"A request with this {HEADER} is still in progress."},
+                    status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'},
+                )
+            response = super().create(request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                store.save(fingerprint, response)
+            REQUESTS.inc(view=view_name, outcome='executed')
+            return response
+        finally:
+            if locked:
+                store.unlock()
+
+    def replay(self, view_name, stored, fingerprint):
+        if stored['fingerprint'] != fingerprint:
+            REQUESTS.inc(view=view_name, outcome='mismatch')
+            return Response({"detail": f"This {HEADER} was used with a different request."},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        REQUESTS.inc(view=view_name, outcome='replayed')
+        return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
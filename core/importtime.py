@@ -0,0 +1,110 @@
+"""
+Import-time profiling for worker cold starts.
+
+``profile_import`` imports a module in a fresh interpreter under
+``python -X importtime`` and parses the report, so the numbers reflect a real
+worker boot rather than the already-warm test or management process. Used by
+``manage.py profile_imports``.
+"""
+
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Environment of a deployed worker: no doc generators, no development server.
+PRODUCTION_ENV = {
+    'API_DOCS_ENABLED': '0',
+    'ASGI_RUNSERVER_ENABLED': '0',
+}
+
+
+class ImportRecord:
+    """
+    One line of the ``-X importtime`` report.
+
+    Attributes:
+    name: The module name.
+    self_us: Microseconds spent importing the module itself.
+    cumulative_us: Microseconds including the module's own imports.
+    depth: Nesting level; 0 for modules imported directly by the profiled import.
+    """
+
+    __slots__ = ('name', 'self_us', 'cumulative_us', 'depth')
+
+    def __init__(self, name, self_us, cumulative_us, depth):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.depth = depth
+
+
+class ImportProfile:
+    def __init__(self, module, records):
+        self.module = module
+        self.records = records
+
+    @property
+    def total_ms(self):
+        # The module and its parent packages; interpreter start-up imports are excluded.
+        return sum(
+            record.cumulative_us for record in self.records
+            if record.depth == 0 and (record.name == self.module or self.module.startswith(record.name + '.'))
+        ) / 1000
+
+    @property
+    def modules(self):
+        return {record.name for record in self.records}
+
+    def slowest(self, count=20, max_depth=None):
+        """
+        Returns the ``count`` records with the highest cumulative time, optionally up to ``max_depth``.
+        """
+        records = [r for r in self.records if max_depth is None or r.depth <= max_depth]
+        return sorted(records, key=lambda r: r.cumulative_us, reverse=True)[:count]
+
+
+def parse_importtime(output):
+    """
+    Parses the stderr of ``python -X importtime`` into ``ImportRecord`` objects.
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            record = ImportRecord(name.strip(), int(self_us), int(cumulative_us), 0)
+        except ValueError:
+            # The header line ("self [us] | cumulative | imported package").
+            continue
+        # Nested imports are indented by two spaces per level after the first.
+        record.depth = max((len(name) - len(name.lstrip()) - 1) // 2, 0)
+        records.append(record)
+    return records
+
+
+def profile_import(module='core.asgi', env=None):
+    """
+    Imports ``module`` in a new interpreter and returns its ``ImportProfile``.
+
+    Parameters:
+    module : str
+        The module to import.
+    env : dict
+        Extra environment variables; defaults to ``PRODUCTION_ENV``.
+
+    Raises:
+    RuntimeError
+        If the import fails.
+    """
+    environ = {**os.environ, **(PRODUCTION_ENV if env is None else env)}
+    environ.setdefault('DJANGO_SETTINGS_MODULE', os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=settings.BASE_DIR, env=environ, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return ImportProfile(module, parse_importtime(result.stderr))
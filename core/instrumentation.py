@@ -0,0 +1,192 @@
+"""
+Per-request performance instrumentation.
+
+``ServerTimingMiddleware`` measures each request and breaks its time down into
+phases (database, serializer, authentication, channel-layer publish). The
+breakdown is returned in a ``Server-Timing`` header and aggregated into the
+metrics served at ``/metrics`` (see ``core/metrics.py``).
+
+Code outside the middleware reports a phase with ``timer``::
+
+    with timer('channel'):
+        async_to_sync(channel_layer.group_send)(group, event)
+
+``timer`` is a no-op outside an instrumented request.
+
+``DB_TIME`` keeps a moving average of the database time per request, which
+``core/throttling.py`` uses to detect an overloaded database.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timings', default=None)
+
+REQUEST_DURATION = REGISTRY.histogram(
+    'http_request_duration_seconds',
+    'Request latency by URL name.',
+    ('view', 'method', 'status'),
+)
+PHASE_DURATION = REGISTRY.histogram(
+    'http_request_phase_duration_seconds',
+    'Time spent per request in each instrumented phase, by URL name.',
+    ('view', 'phase'),
+)
+DB_QUERIES = REGISTRY.counter(
+    'http_request_db_queries_total',
+    'SQL queries run while serving requests, by URL name.',
+    ('view',),
+)
+
+PHASES = ('db', 'serializer', 'auth', 'channel')
+
+
+class MovingAverage:
+    """
+    An exponentially weighted moving average: each sample moves the value by ``alpha`` of the difference.
+    """
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.value = 0.0
+
+    def update(self, sample):
+        self.value += self.alpha * (sample - self.value)
+
+
+DB_TIME = MovingAverage()
+REGISTRY.gauge(
+    'http_request_db_seconds_average',
+    'Moving average of the database time per request.',
+    function=lambda: DB_TIME.value,
+)
+
+
+class RequestTimings:
+    """
+    Accumulates phase durations for the request being served.
+    """
+
+    __slots__ = ('started', 'durations', 'queries', 'depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.depth = {}
+
+    def add(self, phase, duration):
+        self.durations[phase] = self.durations.get(phase, 0.0) + duration
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a database execute wrapper for the duration of the request.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add('db', time.perf_counter() - started)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def timer(phase):
+    """
+    Adds the time spent in the block to ``phase`` of the current request.
+
+    Nested timers for the same phase (e.g. a nested serializer) are only counted once.
+    """
+    timings = _current.get()
+    if timings is None or timings.depth.get(phase):
+        yield
+        return
+    timings.depth[phase] = 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.depth[phase] = 0
+        timings.add(phase, time.perf_counter() - started)
+
+
+def server_timing_header(timings, total):
+    entries = [f'total;dur={total * 1000:.2f}']
+    for phase, duration in timings.durations.items():
+        if phase == 'db':
+            entries.append(f'db;dur={duration * 1000:.2f};desc="{timings.queries} queries"')
+        elif duration:
+            entries.append(f'{phase};dur={duration * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    Times every request, adds a ``Server-Timing`` header and records latency metrics.
+
+    Should be the first entry in ``MIDDLEWARE`` so that the total covers the whole stack.
+    Requests slower than ``SLOW_REQUEST_THRESHOLD_MS`` are logged with their breakdown.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', None)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - timings.started
+        response['Server-Timing'] = server_timing_header(timings, total)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unresolved'
+        REQUEST_DURATION.observe(total, view=view, method=request.method, status=response.status_code)
+        for phase, duration in timings.durations.items():
+            PHASE_DURATION.observe(duration, view=view, phase=phase)
+        DB_QUERIES.inc(timings.queries, view=view)
+        DB_TIME.update(timings.durations['db'])
+
+        if self.slow_threshold is not None and total * 1000 >= self.slow_threshold:
+            logger.warning(
+                "Slow request %s %s (%s): %s",
+                request.method, request.path, view, response['Server-Timing'],
+            )
+        return response
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timer('serializer'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin reporting the time spent producing ``.data`` to the ``serializer`` phase.
+
+    Set ``list_serializer_class = TimedListSerializer`` in ``Meta`` to time ``many=True`` too.
+    """
+
+    @property
+    def data(self):
+        with timer('serializer'):
+            return super().data
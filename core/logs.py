@@ -0,0 +1,209 @@
+"""
+Non-blocking, structured logging.
+
+Request threads and the event loop never write logs themselves. ``QueueLogHandler``
+puts each record on a bounded in-memory queue, and a ``QueueListener`` thread
+formats it and writes it to the real stream. A slow or blocked sink fills the queue
+rather than stalling API workers. Once the queue is full (``LOG_QUEUE_SIZE``),
+records are dropped and counted.
+
+``JSONFormatter`` writes one JSON object per line. ``RequestContextFilter`` adds
+the id, method and path of the request being served, and the milliseconds since
+it started. ``RequestLogMiddleware`` sets the request id from ``X-Request-ID``, or
+a new one, and returns it in the response. It also logs one ``core.access`` line
+per request with its status and duration. ``SamplingFilter`` keeps only a fraction
+of high-volume records below WARNING: ``LOG_SAMPLE_RATES`` gives a rate per logger
+name.
+
+Use %-style arguments (``logger.info("Created %s", email)``) rather than f-strings,
+so that messages are only formatted when a record is actually kept.
+
+``/metrics`` reports ``log_records_total{level,outcome}`` (queued, dropped or
+sampled_out) and ``log_queue_depth``.
+"""
+
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+from .metrics import REGISTRY
+
+access_logger = logging.getLogger('core.access')
+
+_request = ContextVar('log_request', default=None)
+_handlers = []
+
+RECORDS = REGISTRY.counter(
+    'log_records_total',
+    'Log records by outcome: queued, dropped (queue full) or sampled_out.',
+    ('level', 'outcome'),
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    'log_queue_depth',
+    'Log records waiting to be written.',
+    function=lambda: sum(handler.queue.qsize() for handler in _handlers),
+)
+
+# Attributes every LogRecord has; anything else was passed with `extra=`.
+RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'log_context', 'elapsed_ms'}
+# Client-supplied request ids are only reused if they look like one.
+REQUEST_ID_RE = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # May wait for room: the writer is still draining the queue.
+        self.queue.put(self._sentinel)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds ``request_id``, ``method``, ``path`` and ``elapsed_ms`` to records logged while serving a request.
+
+    Runs in the thread that logs, before the record is queued.
+    """
+
+    def filter(self, record):
+        context = _request.get()
+        if context is not None:
+            started, record.log_context = context
+            record.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps records below WARNING with the probability ``LOG_SAMPLE_RATES`` gives their logger (or its nearest parent).
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates
+
+    def rate(self, name):
+        rates = self.rates if self.rates is not None else settings.LOG_SAMPLE_RATES
+        while name:
+            if name in rates:
+                return rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        RECORDS.inc(level=record.levelname, outcome='sampled_out')
+        return False
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats a record as a single-line JSON object, including the fields passed with ``extra=``.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'log_context', None) or {})
+        if getattr(record, 'elapsed_ms', None) is not None:
+            entry['elapsed_ms'] = record.elapsed_ms
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Queues records for a background thread that writes them to ``stream`` (stderr by default).
+
+    The formatter configured for this handler is used by the writer. ``close()``, called by
+    ``logging.shutdown`` at exit, writes out what is still queued.
+
+    Attributes:
+    target: The ``StreamHandler`` the listener writes with.
+    listener: The ``QueueListener`` thread.
+    """
+
+    def __init__(self, stream=None, queue_size=1000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.listener = _Listener(self.queue, self.target)
+        self.listener.start()
+        _handlers.append(self)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Only resolve what can't cross threads or may still change; the writer formats the rest.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            RECORDS.inc(level=record.levelname, outcome='dropped')
+        else:
+            RECORDS.inc(level=record.levelname, outcome='queued')
+
+    def close(self):
+        if self in _handlers:
+            _handlers.remove(self)
+            self.listener.stop()
+            self.target.close()
+        super().close()
+
+
+class RequestLogMiddleware:
+    """
+    Tags the request's log records with a request id, returned as ``X-Request-ID``, and logs an access line.
+
+    Should come first in ``MIDDLEWARE`` so that every other middleware logs with the id.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_RE.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        started = time.perf_counter()
+        token = _request.set((started, {'request_id': request_id, 'method': request.method, 'path': request.path}))
+        try:
+            response = self.get_response(request)
+            response['X-Request-ID'] = request_id
+            access_logger.info(
+                "%s %s %s", request.method, request.path, response.status_code,
+                extra={'status': response.status_code, 'duration_ms': round((time.perf_counter() - started) * 1000, 2)},
+            )
+            return response
+        finally:
+            _request.reset(token)
@@ -0,0 +1,201 @@
+"""
+A small in-process metrics registry rendered in the Prometheus text format.
+
+Metrics are kept per worker process; scrape every worker (or aggregate at the
+collector) to get totals. All updates take a single lock and do O(1) work, so
+they are cheap enough to stay on in production.
+
+The metrics reveal per-route latencies and queue depths, so ``metrics_view``
+only answers the addresses in ``METRICS_ALLOWED_IPS`` and requests carrying
+``METRICS_TOKEN`` as a bearer token; everyone else gets a ``403``.
+"""
+
+import bisect
+import hmac
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, labels, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', labels, (), value) for labels, value in items]
+
+
+class Gauge(Metric):
+    """
+    A gauge set explicitly, or computed at scrape time when ``function`` is given.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self.function is not None:
+            return self.function()
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self.function is not None:
+            return [('', (), (), self.function())]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', labels, (), value) for labels, value in items]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', labels, (('le', _format_value(float(bound))),), cumulative))
+            samples.append(('_bucket', labels, (('le', '+Inf'),), count))
+            samples.append(('_sum', labels, (), total))
+            samples.append(('_count', labels, (), count))
+        return samples
+
+
+class Registry:
+    """
+    Holds named metrics. Registering an existing name returns the existing metric.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._register(Gauge, name, documentation, labelnames, function=function)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def metrics_allowed(request):
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'.encode()
+        if hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+            return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """
+    Serves every registered metric in the Prometheus text exposition format, to allowed scrapers only.
+    """
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,79 @@
+"""
+Path-aware versions of the session, CSRF, authentication and messages middleware.
+
+These middleware exist for the admin. The API authenticates every request with
+JWTs (``users.authentication.JWTAuthentication``) and never reads the session,
+the CSRF cookie, ``request.user`` as set by Django or flash messages. Each class
+below behaves exactly like its parent, except for requests whose path starts
+with one of ``LEAN_MIDDLEWARE_PATHS``, which pass straight through.
+
+They subclass the Django classes, so the admin's system checks, which look for
+these middleware in ``MIDDLEWARE``, keep passing.
+"""
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+
+
+class PathAwareMiddlewareMixin:
+    """
+    Skips the wrapped middleware's hooks for paths under ``LEAN_MIDDLEWARE_PATHS``.
+
+    The prefixes are read when the middleware is instantiated, i.e. once per handler.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.lean_paths = tuple(getattr(settings, 'LEAN_MIDDLEWARE_PATHS', ()))
+
+    def is_lean(self, request):
+        return bool(self.lean_paths) and request.path_info.startswith(self.lean_paths)
+
+
+class LeanSessionMiddleware(PathAwareMiddlewareMixin, SessionMiddleware):
+    def process_request(self, request):
+        if not self.is_lean(request):
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if self.is_lean(request):
+            return response
+        return super().process_response(request, response)
+
+
+class LeanCsrfViewMiddleware(PathAwareMiddlewareMixin, CsrfViewMiddleware):
+    def process_request(self, request):
+        if not self.is_lean(request):
+            super().process_request(request)
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if self.is_lean(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+    def process_response(self, request, response):
+        if self.is_lean(request):
+            return response
+        return super().process_response(request, response)
+
+
+class LeanAuthenticationMiddleware(PathAwareMiddlewareMixin, AuthenticationMiddleware):
+    # DRF sets request.user itself once JWTAuthentication has run.
+
+    def process_request(self, request):
+        if not self.is_lean(request):
+            super().process_request(request)
+
+
+class LeanMessageMiddleware(PathAwareMiddlewareMixin, MessageMiddleware):
+    def process_request(self, request):
+        if not self.is_lean(request):
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if self.is_lean(request):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,152 @@
+"""
+Prebuilt OpenAPI schema.
+
+``manage.py build_openapi_schema`` introspects the API once at build time and
+writes the schema to ``OPENAPI_SCHEMA_DIR``. ``schema_file_view`` serves those
+files with an ``ETag`` and cache headers, so clients and health checks hitting
+``/swagger.json`` never trigger view introspection.
+
+The documentation generators (``drf_yasg``) are only imported by the build
+command and, when ``API_DOCS_ENABLED`` is set, by the Swagger/ReDoc UIs.
+"""
+
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+
+API_INFO = {
+    'title': "Your Project API",
+    'default_version': 'v1',
+    'description': "API documentation for Your Project",
+    'terms_of_service': "https://www.google.com/policies/terms/",
+    'contact_email': "contact@yourproject.local",
+    'license_name': "BSD License",
+}
+
+SCHEMA_FORMATS = {
+    '.json': ('swagger.json', 'application/json'),
+    '.yaml': ('swagger.yaml', 'application/yaml'),
+}
+
+
+def get_openapi_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title=API_INFO['title'],
+        default_version=API_INFO['default_version'],
+        description=API_INFO['description'],
+        terms_of_service=API_INFO['terms_of_service'],
+        contact=openapi.Contact(email=API_INFO['contact_email']),
+        license=openapi.License(name=API_INFO['license_name']),
+        # Define the security schema for JWT authentication
+        security=[{"Bearer": []}],
+    )
+
+
+def get_schema_view():
+    """
+    Returns the drf_yasg schema view used by the Swagger and ReDoc UIs.
+    """
+    from drf_yasg.views import get_schema_view as yasg_schema_view
+    from rest_framework import permissions
+
+    return yasg_schema_view(
+        get_openapi_info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def generate_schema_documents():
+    """
+    Introspects the API and returns ``{format: bytes}`` for every format in ``SCHEMA_FORMATS``.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(info=get_openapi_info()).get_schema(request=None, public=True)
+    return {
+        '.json': OpenAPICodecJson(validators=[]).encode(schema),
+        '.yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def write_schema_documents(directory=None):
+    """
+    Generates the schema and writes it to ``directory`` (``OPENAPI_SCHEMA_DIR`` by default).
+
+    Returns:
+    list
+        The paths written.
+    """
+    directory = directory or settings.OPENAPI_SCHEMA_DIR
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for fmt, content in generate_schema_documents().items():
+        path = os.path.join(directory, SCHEMA_FORMATS[fmt][0])
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        paths.append(path)
+    _documents.clear()
+    return paths
+
+
+class SchemaDocument:
+    __slots__ = ('content', 'etag', 'mtime')
+
+    def __init__(self, content, mtime=None):
+        self.content = content
+        self.etag = '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+        self.mtime = mtime
+
+
+_documents = {}
+_lock = threading.Lock()
+
+
+def _load_document(fmt):
+    path = os.path.join(settings.OPENAPI_SCHEMA_DIR, SCHEMA_FORMATS[fmt][0])
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        mtime = None
+
+    document = _documents.get(fmt)
+    if document is not None and document.mtime == mtime:
+        return document
+
+    with _lock:
+        if mtime is not None:
+            with open(path, 'rb') as fh:
+                document = SchemaDocument(fh.read(), mtime)
+        elif settings.API_DOCS_ENABLED:
+            # No prebuilt file (e.g. local development): generate once per process.
+            document = SchemaDocument(generate_schema_documents()[fmt])
+        else:
+            return None
+        _documents[fmt] = document
+    return document
+
+
+@require_safe
+def schema_file_view(request, format):
+    """
+    Serves the prebuilt OpenAPI schema as a cacheable asset with an ETag.
+    """
+    document = _load_document(format)
+    if document is None:
+        raise Http404("The API schema has not been built; run `manage.py build_openapi_schema`.")
+
+    if document.etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(document.content, content_type=SCHEMA_FORMATS[format][1])
+    response['ETag'] = document.etag
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_MAX_AGE)
+    return response
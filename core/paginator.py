@@ -0,0 +1,70 @@
+"""
+Admin paginator that avoids ``COUNT(*)`` over large tables.
+"""
+
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Returns the planner's row estimate for ``model``'s table, or None if unavailable.
+
+    Uses ``pg_class.reltuples`` on PostgreSQL, ``information_schema`` on MySQL and
+    ``sqlite_stat1`` (populated by ``ANALYZE``) on SQLite.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table]),
+        'mysql': (
+            "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+            [table],
+        ),
+        'sqlite': ("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    sql, params = queries[connection.vendor]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        # e.g. sqlite_stat1 does not exist until ANALYZE has run once.
+        return None
+    if not row or row[0] is None:
+        return None
+    value = int(str(row[0]).split()[0])
+    return value if value >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose ``count`` never scans more than ``count_limit`` rows.
+
+    Unfiltered querysets use the database's row estimate when the table is larger than
+    ``count_limit``. Filtered querysets count at most ``count_limit`` matching rows, so
+    the changelist shows that many pages at most and users narrow the filter instead.
+
+    Use with ``show_full_result_count = False`` so the admin doesn't run its own full count.
+    """
+
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None:
+            return super().count
+
+        bounded = queryset[:self.count_limit + 1].count()
+        if bounded <= self.count_limit:
+            return bounded
+        if not query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None:
+                return max(estimate, bounded)
+        return self.count_limit
@@ -0,0 +1,145 @@
+"""
+Per-view SQL query budgets.
+
+Views declare how many queries a request may run with a ``query_budget``
+attribute, either a single integer or a dict keyed by HTTP method::
+
+    class TaskListCreateView(generics.ListCreateAPIView):
+        query_budget = {'GET': 4, 'POST': 5}
+
+Budgets must not depend on the amount of data or on the page size. Views we do
+not own (e.g. the simplejwt token views) are budgeted by URL name through the
+``QUERY_BUDGETS`` setting.
+
+``QueryBudgetMiddleware`` logs requests that exceed their budget together with
+the offending SQL, and ``QueryBudgetTestMixin`` runs endpoints at two data sizes
+in the test suite (``manage.py test --tag query_budget``).
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .caching import clear_local_caches
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """
+    Context manager that records every SQL statement run on the default connection.
+
+    Attributes:
+    queries: A list of ``(sql, duration_seconds)`` tuples.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+
+def get_query_budget(resolver_match, method):
+    """
+    Returns the query budget for a resolved URL and HTTP method, or None if none is declared.
+    """
+    if resolver_match is None:
+        return None
+    view_class = getattr(resolver_match.func, 'view_class', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if budget is None:
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(resolver_match.url_name)
+    if isinstance(budget, dict):
+        budget = budget.get(method)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Development middleware that logs requests running more queries than their view's budget.
+
+    Enabled when ``QUERY_BUDGET_MIDDLEWARE_ENABLED`` is true (defaults to ``DEBUG``).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_MIDDLEWARE_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+
+        budget = get_query_budget(getattr(request, 'resolver_match', None), request.method)
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                "Query budget exceeded for %s %s: %d queries (budget %d)\n%s",
+                request.method,
+                request.path,
+                counter.count,
+                budget,
+                "\n".join(f"  [{duration * 1000:.2f}ms] {sql}" for sql, duration in counter.queries),
+            )
+        return response
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin asserting that an endpoint stays within its budget at two data sizes.
+
+    Methods:
+    assertQueryBudget: Calls ``grow`` until ``sizes[0]`` and then ``sizes[1]`` units of data
+        exist, runs ``request`` at each size and fails if the query count grows or exceeds
+        the view's budget. When given, ``prepare`` runs outside the count and its return
+        value is passed to ``request`` (e.g. a fresh token or object to delete).
+    """
+
+    def assertQueryBudget(self, request, grow, sizes=(2, 10), prepare=None):
+        measured = []
+        grown = 0
+        for size in sizes:
+            while grown < size:
+                grow()
+                grown += 1
+            args = (prepare(),) if prepare else ()
+            # Measure with cold caches, so that lookups cached by earlier requests count at both sizes.
+            clear_local_caches()
+            cache.clear()
+            with QueryCounter() as counter:
+                response = request(*args)
+            self.assertLess(response.status_code, 400, getattr(response, 'data', response))
+            measured.append(counter)
+
+        budget = get_query_budget(response.wsgi_request.resolver_match, response.wsgi_request.method)
+        self.assertIsNotNone(budget, f"No query budget declared for {response.wsgi_request.path}")
+
+        small, large = measured
+        self.assertEqual(
+            small.count, large.count,
+            "Query count grew with data size:\n" + "\n".join(sql for sql, _ in large.queries),
+        )
+        self.assertLessEqual(
+            large.count, budget,
+            f"Query budget of {budget} exceeded:\n" + "\n".join(sql for sql, _ in large.queries),
+        )
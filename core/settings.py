@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -32,19 +35,18 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # Admin modules are registered on demand by admin.autodiscover() in core/urls.py,
+    # not at worker start-up.
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'daphne',
     'django.contrib.staticfiles',
     'rest_framework', 
     'django_filters',
     'users',
     'tasks',
-    'drf_yasg',
-    'drf_spectacular',
 
     # 'drf_spectacular_sidecar',
     'channels',
@@ -53,16 +55,48 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
 ]
 
+# The Swagger/ReDoc UIs and live schema generation. Production workers serve the
+# prebuilt schema from OPENAPI_SCHEMA_DIR and don't load the doc generators.
+API_DOCS_ENABLED = os.environ.get('API_DOCS_ENABLED', str(DEBUG)).lower() in ('1', 'true', 'yes')
+
+if API_DOCS_ENABLED:
+    INSTALLED_APPS += [
+        'drf_yasg',
+        'drf_spectacular',
+    ]
+
+# Daphne's app replaces `runserver` with an ASGI server and installs the Twisted
+# reactor when it is imported. Deployed workers are started by the ASGI server
+# itself and don't need it.
+ASGI_RUNSERVER_ENABLED = os.environ.get('ASGI_RUNSERVER_ENABLED', str(DEBUG)).lower() in ('1', 'true', 'yes')
+
+if ASGI_RUNSERVER_ENABLED:
+    # Must come before django.contrib.staticfiles, which also overrides `runserver`.
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('django.contrib.staticfiles'), 'daphne')
+
+# Upper bound for `import core.asgi` in a fresh interpreter with the doc generators
+# and the development server disabled; checked by `manage.py profile_imports`.
+ASGI_IMPORT_BUDGET_MS = 1500
+
 MIDDLEWARE = [
+    'core.logs.RequestLogMiddleware',
+    'core.instrumentation.ServerTimingMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.LeanSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.LeanCsrfViewMiddleware',
+    'core.middleware.LeanAuthenticationMiddleware',
+    'core.middleware.LeanMessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'users.backends.LoginUnavailableMiddleware',
 ]
 
+# Requests under these prefixes authenticate with JWTs and skip the session, CSRF,
+# session-auth and messages middleware (see core/middleware.py). Everything else,
+# notably /admin/, runs the full stack.
+LEAN_MIDDLEWARE_PATHS = ('/api/', '/ws/')
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -113,6 +147,27 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher hashes new passwords; hashes made by the others (or with a
+# different PASSWORD_HASH_ITERATIONS) are upgraded on the next successful login.
+# Pick the iteration count with `manage.py benchmark_hashers --target-ms ...`.
+PASSWORD_HASHERS = [
+    'users.hashing.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = 600000
+
+# Password checks run in a bounded thread pool (users/backends.py). Logins that
+# find LOGIN_VERIFY_QUEUE_SIZE checks already waiting, or wait longer than
+# LOGIN_VERIFY_TIMEOUT seconds, get a 503 with Retry-After: LOGIN_RETRY_AFTER.
+AUTHENTICATION_BACKENDS = ['users.backends.OffloadedModelBackend']
+LOGIN_VERIFY_WORKERS = 4
+LOGIN_VERIFY_QUEUE_SIZE = 32
+LOGIN_VERIFY_TIMEOUT = 5
+LOGIN_RETRY_AFTER = 1
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
@@ -139,17 +194,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.JWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.SlidingWindowThrottle',
+    ],
+    # Reverse proxies in front of the app whose X-Forwarded-For entries are trusted for
+    # the client IP of anonymous requests (see core/throttling.py); 0 uses REMOTE_ADDR.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
 }
 
+if API_DOCS_ENABLED:
+    REST_FRAMEWORK['DEFAULT_SCHEMA_CLASS'] = 'drf_spectacular.openapi.AutoSchema'
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=3),
@@ -171,22 +234,131 @@ SIMPLE_JWT = {
 
 AUTH_USER_MODEL = 'users.User'
 
+# Rows created without an organization (self-registration, single-tenant installs)
+# belong to this one. It is created by users/migrations/0002_organization.py.
+DEFAULT_ORGANIZATION_ID = 1
+
+# Organization id -> cache / channel layer alias, for tenants large enough to need
+# their own (see core/tenancy.py). Everyone else shares 'default'.
+TENANT_CACHE_ALIASES = {}
+TENANT_CHANNEL_LAYERS = {}
+
+# Tasks one WebSocket connection may follow with {"action": "subscribe"} (see tasks/consumers.py).
+TASK_SUBSCRIPTIONS_PER_CONNECTION = 100
+
+# Server-sent notification stream (/api/notifications/stream/, see tasks/consumers.py).
+# Each user's last NOTIFICATION_REPLAY_SIZE notifications are kept in the cache for
+# NOTIFICATION_REPLAY_TTL seconds so reconnecting clients can resume with Last-Event-ID;
+# 0 disables the buffer. Idle streams get a comment every NOTIFICATION_STREAM_HEARTBEAT seconds.
+NOTIFICATION_REPLAY_SIZE = 50
+NOTIFICATION_REPLAY_TTL = 600
+NOTIFICATION_STREAM_HEARTBEAT = 15
+
+
+# Completed tasks older than this are moved to the archive tables by
+# `manage.py archive_tasks` (see tasks/archive.py).
+TASK_ARCHIVE_AFTER_DAYS = 90
+TASK_ARCHIVE_BATCH_SIZE = 500
+
+# Delta sync (/api/tasks/changes/, see tasks/sync.py). Changes are final after
+# TASK_SYNC_SETTLE_SECONDS; tombstones, and so cursors, last TASK_TOMBSTONE_RETENTION_DAYS
+# and are pruned by `manage.py archive_tasks`.
+TASK_SYNC_PAGE_SIZE = 500
+TASK_SYNC_MAX_PAGE_SIZE = 1000
+TASK_SYNC_SETTLE_SECONDS = 2
+TASK_TOMBSTONE_RETENTION_DAYS = 30
+
+# Tag autocomplete (/api/tags/?q=, see tasks/tags.py). Each worker keeps an organization's
+# TAG_TOP_N most used tags in memory for TAG_TOP_CACHE_SECONDS; other matches are ranked
+# among the first TAG_SEARCH_SCAN_LIMIT in name order.
+TAG_SEARCH_LIMIT = 10
+TAG_SEARCH_MAX_LIMIT = 50
+TAG_SEARCH_SCAN_LIMIT = 2000
+TAG_TOP_N = 1000
+TAG_TOP_CACHE_SECONDS = 30
+
+# ?include=comments (see tasks/includes.py): latest comments returned per task.
+TASK_INCLUDE_COMMENTS_PER_TASK = 5
+
+# Multi-get (?ids= and the batch endpoints, see core/batch.py): ids accepted per request.
+BATCH_MAX_IDS = 500
+
+# Idempotency-Key on POST /api/tasks/ and comments (see core/idempotency.py): responses are
+# replayed for IDEMPOTENCY_KEY_TTL seconds; a concurrent duplicate waits up to
+# IDEMPOTENCY_WAIT_SECONDS for the first attempt, whose lock expires after IDEMPOTENCY_LOCK_TIMEOUT.
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+IDEMPOTENCY_WAIT_SECONDS = 2
+
+# Sliding-window throttling per user (or client IP) and URL name (see core/throttling.py):
+# (capacity, tokens per second on average), with 'default' for URL names not listed.
+# A paginated GET costs one token per default page of rows. While the average DB
+# time per request exceeds THROTTLE_SHED_DB_SECONDS, or a gauge in THROTTLE_SHED_QUEUES
+# exceeds its limit, requests cost THROTTLE_SHED_COST times as much.
+THROTTLE_ENABLED = True
+THROTTLE_BUCKETS = {
+    'default': (300, 20),
+    'task-list-create': (120, 10),
+    'task-tag-list-create': (60, 5),
+    'task-changes': (120, 10),
+    'task-batch': (60, 5),
+    'archived-task-list': (60, 5),
+    'user-search': (120, 10),
+    'user-bulk-provision': (10, 0.2),
+    'login': (20, 0.5),
+    'token_obtain_pair': (20, 0.5),
+}
+THROTTLE_SHED_DB_SECONDS = 0.25
+THROTTLE_SHED_QUEUES = {
+    'login_pending': LOGIN_VERIFY_QUEUE_SIZE,
+    'log_queue_depth': 5000,
+}
+THROTTLE_SHED_COST = 4
+
+
+# Query budgets for views we don't own, keyed by URL name (see core/query_budget.py).
+# Our own views declare a `query_budget` attribute instead.
+QUERY_BUDGET_MIDDLEWARE_ENABLED = DEBUG
+QUERY_BUDGETS = {
+    'token_obtain_pair': 3,
+    'token_refresh': 6,
+    'token_verify': 1,
+    'token_blacklist': 6,
+}
 
 
-# Logging configuration
+
+# Logging configuration. Records are queued and written as JSON lines by a background
+# thread (see core/logs.py). At most LOG_QUEUE_SIZE records wait; more are dropped and
+# counted. LOG_SAMPLE_RATES keeps that fraction of a logger's records below WARNING.
+LOG_QUEUE_SIZE = 10000
+LOG_SAMPLE_RATES = {
+    'core.access': 0.1,
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
+        'json': {
+            '()': 'core.logs.JSONFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'core.logs.SamplingFilter',
+        },
+        'request_context': {
+            '()': 'core.logs.RequestContextFilter',
         },
     },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+            'class': 'core.logs.QueueLogHandler',
+            'stream': 'ext://sys.stderr',
+            'queue_size': LOG_QUEUE_SIZE,
+            'formatter': 'json',
+            'filters': ['sampling', 'request_context'],
         },
     },
     'root': {
@@ -195,6 +367,37 @@ LOGGING = {
     },
 }
 
+# Requests slower than this are logged with their Server-Timing breakdown
+# (see core/instrumentation.py). Set to None to disable.
+SLOW_REQUEST_THRESHOLD_MS = 1000
+
+# GET /metrics (see core/metrics.py) answers only clients whose REMOTE_ADDR is in
+# METRICS_ALLOWED_IPS (comma-separated; loopback by default in DEBUG) or that send
+# "Authorization: Bearer <METRICS_TOKEN>". Behind a reverse proxy every request comes
+# from the proxy's address, so block /metrics there and give scrapers the token.
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1' if DEBUG else '').split(',')
+    if ip.strip()
+]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Bulk user provisioning (users/provisioning.py): rows per conflict query and
+# bulk_create, and password-hashing processes (None = one per CPU).
+USER_PROVISIONING_BATCH_SIZE = 1000
+USER_PROVISIONING_WORKERS = None
+# POST /api/users/bulk/ hashes in the request, so it takes at most USER_PROVISIONING_MAX_ROWS
+# rows over USER_PROVISIONING_HTTP_WORKERS processes: at ~0.3 s per hash that is ~8 s,
+# and the other cores stay free for logins. Larger imports use manage.py provision_users.
+USER_PROVISIONING_MAX_ROWS = 50
+USER_PROVISIONING_HTTP_WORKERS = 2
+
+# Assignee search (/api/users/search/, see users/directory.py). Each user's last
+# USER_RECENT_ASSIGNEES assignees are kept in the shared cache for USER_RECENT_ASSIGNEES_TTL.
+USER_SEARCH_LIMIT = 10
+USER_SEARCH_MAX_LIMIT = 50
+USER_RECENT_ASSIGNEES = 10
+USER_RECENT_ASSIGNEES_TTL = 30 * 24 * 3600
+
 
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
@@ -205,8 +408,18 @@ SWAGGER_SETTINGS = {
         }
     },
     'USE_SESSION_AUTH': False,  # Disable session authentication for the UI
+    # Point the UI at the prebuilt, cached schema instead of introspecting on every load.
+    'SPEC_URL': '/swagger.json',
 }
 
+REDOC_SETTINGS = {
+    'SPEC_URL': '/swagger.json',
+}
+
+# Written by `manage.py build_openapi_schema` and served at /swagger.json and /swagger.yaml.
+OPENAPI_SCHEMA_DIR = BASE_DIR / 'openapi'
+OPENAPI_SCHEMA_MAX_AGE = 300
+
 ASGI_APPLICATION = 'core.asgi.application'
 WSGI_APPLICATION = 'core.asgi.application'
 
@@ -219,4 +432,33 @@ CHANNEL_LAYERS = {
             "hosts": [('127.0.0.1', 6379)],  
         },
     },
-}
\ No newline at end of file
+}
+# Shared cache, seen by every worker: Redis, from REDIS_CACHE_URL (e.g.
+# redis://127.0.0.1:6379/1). Throttle buckets, idempotency keys, notification ids
+# and cache invalidations rely on its atomic add() and incr(), and on entries
+# surviving until they expire. With DEBUG on and no REDIS_CACHE_URL, a single-process
+# in-memory cache stands in. core/tenancy.py and core/caching.py build on it.
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_CACHE_URL'],
+        },
+    }
+elif DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'CULL_FREQUENCY': 10},
+        },
+    }
+else:
+    raise ImproperlyConfigured("Set REDIS_CACHE_URL: workers need a shared cache with atomic add() and incr().")
+
+# Two-tier caches (see core/caching.py): each worker keeps up to CACHE_LOCAL_MAXSIZE entries
+# per cache for CACHE_LOCAL_TTL seconds, and checks for invalidations from other workers
+# every CACHE_VERSION_CHECK_INTERVAL seconds. Shared entries last CACHE_SHARED_TIMEOUT.
+CACHE_LOCAL_MAXSIZE = 10000
+CACHE_LOCAL_TTL = 60
+CACHE_SHARED_TIMEOUT = 3600
+CACHE_VERSION_CHECK_INTERVAL = 1
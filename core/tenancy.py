@@ -0,0 +1,129 @@
+"""
+Tenant isolation for caches and channel groups.
+
+Every cache key written through ``TenantCache`` is namespaced by organization
+and by a per-organization version stamp, so ``invalidate()`` drops all of a
+tenant's entries at once without touching anyone else's. Organizations listed
+in ``TENANT_CACHE_ALIASES`` get a cache of their own, so that a large tenant's
+working set cannot evict the entries of smaller ones.
+
+Channel groups are likewise namespaced (``tenant_group``), and organizations
+listed in ``TENANT_CHANNEL_LAYERS`` publish on a dedicated channel layer.
+"""
+
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_ALIAS = 'default'
+# Backends whose add() and incr() read and then write, so two workers can both succeed.
+NON_ATOMIC_BACKENDS = (DatabaseCache, DummyCache, FileBasedCache)
+
+
+def require_atomic_cache(cache, feature):
+    """
+    Raises:
+    ImproperlyConfigured
+        If ``cache`` can't back ``feature`` because its ``add()`` and ``incr()`` aren't atomic.
+    """
+    if isinstance(cache, NON_ATOMIC_BACKENDS):
+        raise ImproperlyConfigured(
+            f"{feature} needs a cache with atomic add() and incr(), such as Redis; "
+            f"{type(cache).__name__} doesn't have them."
+        )
+
+
+class TenantCache:
+    """
+    A view of a cache restricted to one organization's namespace.
+
+    Attributes:
+    organization_id: The tenant.
+    cache: The backing cache; ``TENANT_CACHE_ALIASES[organization_id]`` or the default cache.
+    """
+
+    def __init__(self, organization_id):
+        self.organization_id = organization_id
+        alias = getattr(settings, 'TENANT_CACHE_ALIASES', {}).get(organization_id, DEFAULT_ALIAS)
+        self.cache = caches[alias]
+        self._version = None
+
+    @property
+    def version_key(self):
+        return f'tenant:{self.organization_id}:version'
+
+    @property
+    def version(self):
+        if self._version is None:
+            version = self.cache.get(self.version_key)
+            if version is None:
+                # A timestamp rather than a counter: if the stamp is evicted, the new one
+                # still can't collide with a version whose entries are still cached.
+                self.cache.add(self.version_key, time.time_ns(), None)
+                version = self.cache.get(self.version_key)
+            self._version = version
+        return self._version
+
+    def make_key(self, key):
+        return f'tenant:{self.organization_id}:{self.version}:{key}'
+
+    def get(self, key, default=None):
+        return self.cache.get(self.make_key(key), default)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(self.make_key(key), value, timeout)
+
+    def add(self, key, value, timeout=None):
+        """
+        Sets ``key`` only if it isn't set yet; returns True if it was added.
+        """
+        return self.cache.add(self.make_key(key), value, timeout)
+
+    def incr(self, key, initial=0, timeout=None):
+        """
+        Atomically adds one to the counter ``key`` and returns the new value; a missing
+        counter is created with the value ``initial`` first.
+        """
+        try:
+            return self.cache.incr(self.make_key(key))
+        except ValueError:
+            self.cache.add(self.make_key(key), initial, timeout)
+            return self.cache.incr(self.make_key(key))
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def get_many(self, keys):
+        found = self.cache.get_many([self.make_key(key) for key in keys])
+        return {key: found[self.make_key(key)] for key in keys if self.make_key(key) in found}
+
+    def set_many(self, mapping, timeout=None):
+        self.cache.set_many({self.make_key(key): value for key, value in mapping.items()}, timeout)
+
+    def invalidate(self):
+        """
+        Drops every entry of this organization by moving it to a new version.
+        """
+        self._version = time.time_ns()
+        self.cache.set(self.version_key, self._version, None)
+
+
+def tenant_group(organization_id, name):
+    """
+    Returns the channel group ``name`` in the namespace of ``organization_id``.
+    """
+    return f'org_{organization_id}.{name}'
+
+
+def tenant_channel_layer_alias(organization_id):
+    return getattr(settings, 'TENANT_CHANNEL_LAYERS', {}).get(organization_id, DEFAULT_ALIAS)
+
+
+def get_tenant_channel_layer(organization_id):
+    return get_channel_layer(tenant_channel_layer_alias(organization_id))
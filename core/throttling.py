@@ -0,0 +1,146 @@
+"""
+Sliding-window request throttling with adaptive load shedding.
+
+Every API request takes tokens from a budget kept in the shared cache for its
+client (the user, or the client IP for anonymous requests) and its URL name.
+A budget allows ``capacity`` tokens per window of ``capacity / rate`` seconds,
+so ``rate`` tokens per second on average; ``THROTTLE_BUCKETS`` sets both per
+URL name, with a ``'default'`` entry for the rest, so heavy endpoints (listings,
+logins) get smaller budgets. A request that finds too few tokens left gets a
+``429`` with ``Retry-After``.
+
+The tokens taken in each fixed window are counted with ``cache.add`` and
+``cache.incr``, which are atomic on Redis, so concurrent requests can't take the
+same tokens; the file-based, database and dummy caches are refused. The tokens
+counted against a request are those of the current window plus the share of the
+previous window's tokens that still falls within the last ``capacity / rate``
+seconds.
+
+Client IPs come from ``REMOTE_ADDR``. Behind trusted reverse proxies, set
+``NUM_PROXIES`` (``REST_FRAMEWORK['NUM_PROXIES']``) to their number so the
+address they add to ``X-Forwarded-For`` is used; otherwise clients could pick a
+fresh budget with every request by sending their own header.
+
+A paginated ``GET`` costs one token per ``page_size`` rows of the view's
+default page size, so polling with ``?page_size=100`` uses its budget ten times
+faster than with the default page.
+
+When the server is overloaded, every request costs ``THROTTLE_SHED_COST`` times
+as much, so clients are slowed down before the database is saturated. The
+server counts as overloaded while the moving average of the database time per
+request exceeds ``THROTTLE_SHED_DB_SECONDS``, or a gauge named in
+``THROTTLE_SHED_QUEUES`` (e.g. ``login_pending``) exceeds its limit.
+
+Set ``THROTTLE_ENABLED = False`` to turn throttling off; the benchmark commands
+do, so that they time the endpoints rather than ``429`` responses.
+
+``/metrics`` reports
+``throttle_decisions_total{view,outcome}`` (allowed, throttled or shed) and
+``throttle_overloaded``.
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from rest_framework.throttling import BaseThrottle
+
+from .instrumentation import DB_TIME
+from .metrics import REGISTRY
+from .tenancy import require_atomic_cache
+
+DECISIONS = REGISTRY.counter(
+    'throttle_decisions_total',
+    'Throttled API requests by outcome: allowed, throttled, or shed (throttled because the server is overloaded).',
+    ('view', 'outcome'),
+)
+
+
+def overloaded():
+    """
+    Returns whether database latency or a queue depth is above its ``THROTTLE_SHED_*`` threshold.
+    """
+    if DB_TIME.value > settings.THROTTLE_SHED_DB_SECONDS:
+        return True
+    for name, limit in settings.THROTTLE_SHED_QUEUES.items():
+        gauge = REGISTRY.get(name)
+        if gauge is not None and gauge.value() > limit:
+            return True
+    return False
+
+
+def window_key(scope, client, window):
+    return f'throttle:{scope}:{client}:{window}'
+
+
+OVERLOADED = REGISTRY.gauge(
+    'throttle_overloaded',
+    'Whether requests currently cost THROTTLE_SHED_COST times their tokens (1) or not (0).',
+    function=lambda: int(overloaded()),
+)
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Takes a request's cost from its client's budget for the URL name.
+
+    Attributes:
+    wait_seconds: Seconds until enough tokens are available, once a request was refused.
+    """
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_scope(self, request, view):
+        match = request.resolver_match
+        return match.url_name if match and match.url_name else 'default'
+
+    def get_client(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def get_cost(self, request, view):
+        paginator = getattr(view, 'paginator', None)
+        default_size = getattr(paginator, 'page_size', None) or getattr(paginator, 'default_limit', None)
+        if request.method != 'GET' or not default_size:
+            return 1
+        size = (paginator.get_page_size(request) if hasattr(paginator, 'get_page_size')
+                else paginator.get_limit(request)) or default_size
+        return max(1, math.ceil(size / default_size))
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        require_atomic_cache(caches[DEFAULT_CACHE_ALIAS], 'Throttling')
+        scope = self.get_scope(request, view)
+        buckets = settings.THROTTLE_BUCKETS
+        capacity, rate = buckets.get(scope, buckets['default'])
+        cost = self.get_cost(request, view)
+        shedding = overloaded()
+        if shedding:
+            cost *= settings.THROTTLE_SHED_COST
+        # A request costing more than the whole budget uses up an untouched one.
+        cost = min(cost, capacity)
+
+        client = self.get_client(request)
+        length = capacity / rate
+        window, elapsed = divmod(time.time(), length)
+        key = window_key(scope, client, int(window))
+        # Kept through the next window, which still counts part of it.
+        cache.add(key, 0, math.ceil(2 * length) + 1)
+        taken = cache.incr(key, cost)
+        previous = cache.get(window_key(scope, client, int(window) - 1), 0)
+        used = previous * (1 - elapsed / length) + taken
+        allowed = used <= capacity
+        if not allowed:
+            # Refused requests don't use up the budget.
+            cache.decr(key, cost)
+            self.wait_seconds = (used - capacity) / rate
+
+        DECISIONS.inc(view=scope, outcome='allowed' if allowed else 'shed' if shedding else 'throttled')
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
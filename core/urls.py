@@ -1,34 +1,32 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from core.metrics import metrics_view
+from core.openapi import schema_file_view
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Your Project API",
-        default_version='v1',
-        description="API documentation for Your Project",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@yourproject.local"),
-        license=openapi.License(name="BSD License"),
-        # Define the security schema for JWT authentication
-        security=[{"Bearer": []}],
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+# INSTALLED_APPS uses SimpleAdminConfig, so ModelAdmins are registered here, when the
+# URLconf is first loaded, rather than while the worker boots.
+admin.autodiscover()
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('users.urls')),
     path('api/', include('tasks.urls')),
-    # Swagger UI:
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    
-    # ReDoc UI:
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-    
-    # Raw OpenAPI JSON/YAML:
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    path('metrics', metrics_view, name='metrics'),
+
+    # Raw OpenAPI JSON/YAML, prebuilt by `manage.py build_openapi_schema`:
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_file_view, name='schema-json'),
 ]
+
+if settings.API_DOCS_ENABLED:
+    from core.openapi import get_schema_view
+
+    schema_view = get_schema_view()
+
+    urlpatterns += [
+        # Swagger UI:
+        path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+
+        # ReDoc UI:
+        path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    ]
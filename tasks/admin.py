@@ -1,22 +1,160 @@
-from django.contrib import admin
-from .models import Task, Tag, Comment
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.utils import timezone
+from core.paginator import EstimatedCountPaginator
+from users.admin import OrganizationFilter
+from users.models import User
+from .models import Task, TaskTag, TaskTombstone, Tag, Comment
+from .signals import notify_bulk, publish_task_events, task_payload
+from .sync import record_removals
+from .tags import recount_usage, tags_of
+
+
+class TaskActionForm(ActionForm):
+    assignee_email = forms.EmailField(required=False, label='Assignee email')
+
+
+class AssignedToFilter(admin.SimpleListFilter):
+    """
+    Filters tasks by assignee without loading every user into the sidebar.
+    """
+    title = 'assigned to'
+    parameter_name = 'assigned'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('me', 'Me'),
+            ('none', 'Unassigned'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'me':
+            return queryset.filter(assigned_to=request.user)
+        if self.value() == 'none':
+            return queryset.filter(assigned_to__isnull=True)
+        return queryset
+
+
+def _bulk_update(queryset, message, **changes):
+    """
+    Applies `changes` to every task in `queryset` with a single UPDATE and notifies each
+    assignee once per batch instead of once per task. Subscribers of each task's live
+    channel get the task as `task_changes` sends it for a single save.
+    """
+    # Capture the affected tasks first: the update may move them out of the filtered queryset.
+    affected = list(queryset.select_related(None).only('organization', 'assigned_to', 'title', 'status', 'due_date'))
+    # update() bypasses auto_now; delta-sync clients rely on updated_at (see tasks/sync.py).
+    updated = queryset.update(updated_at=timezone.now(), **changes)
+    assignee = changes.get('assigned_to')
+    if assignee is not None:
+        record_removals([
+            (task.organization_id, task.id, task.assigned_to_id)
+            for task in affected
+            if task.assigned_to_id is not None and task.assigned_to_id != assignee.id
+        ], TaskTombstone.REASSIGNED)
+    changed = sorted(field for field in ('assigned_to', 'status') if field in changes)
+    for task in affected:
+        if assignee is not None:
+            task.assigned_to_id = assignee.id
+        task.status = changes.get('status', task.status)
+    notify_bulk(message, (
+        (task.organization_id, task.assigned_to_id, task.id, task.title, task.status) for task in affected
+    ))
+    publish_task_events(
+        (task.organization_id, task.id, 'task.updated', {'task': task_payload(task), 'changed': changed})
+        for task in affected
+    )
+    return updated
+
+
+class TaskTagInline(admin.TabularInline):
+    # Task.tags has an explicit through model, so the admin edits its rows instead of the field.
+    model = TaskTag
+    autocomplete_fields = ('tag',)
+    extra = 0
+
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
-    list_display = ('title', 'description', 'due_date', 'status', 'assigned_to', 'created_by', 'created_at',  ) 
+    list_display = ('title', 'description', 'due_date', 'status', 'assigned_to', 'created_by', 'created_at', 'organization') 
+    list_select_related = ('assigned_to', 'created_by', 'organization')
     search_fields = ('title', 'description')
-    list_filter = ('status', 'due_date', 'assigned_to')
+    list_filter = ('status', 'due_date', AssignedToFilter, OrganizationFilter)
+    autocomplete_fields = ('organization', 'assigned_to', 'created_by')
+    inlines = [TaskTagInline]
     ordering = ('due_date',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = TaskActionForm
+    actions = ['reassign', 'mark_todo', 'mark_in_progress', 'mark_completed']
+
+    @admin.action(description='Reassign selected tasks to the assignee email')
+    def reassign(self, request, queryset):
+        email = request.POST.get('assignee_email')
+        assignee = User.objects.filter(email=email).first() if email else None
+        if assignee is None:
+            self.message_user(request, 'Enter the email of an existing user to reassign to.', messages.ERROR)
+            return
+        # Tasks can only be assigned within their own organization.
+        queryset = queryset.filter(organization_id=assignee.organization_id)
+        updated = _bulk_update(queryset, 'Task assignment has been changed.', assigned_to=assignee)
+        self.message_user(request, f'{updated} tasks in {assignee.organization} reassigned to {assignee.email}.')
+
+    def _set_status(self, request, queryset, status):
+        updated = _bulk_update(queryset, 'Task status has been updated.', status=status)
+        self.message_user(request, f'{updated} tasks marked as {dict(Task.STATUS_CHOICES)[status]}.')
+
+    @admin.action(description='Mark selected tasks as To-Do')
+    def mark_todo(self, request, queryset):
+        self._set_status(request, queryset, 'TODO')
+
+    @admin.action(description='Mark selected tasks as In Progress')
+    def mark_in_progress(self, request, queryset):
+        self._set_status(request, queryset, 'IN_PROGRESS')
+
+    @admin.action(description='Mark selected tasks as Completed')
+    def mark_completed(self, request, queryset):
+        self._set_status(request, queryset, 'COMPLETED')
+
+    def save_related(self, request, form, formsets, change):
+        # Inline rows are saved without m2m_changed; recount the tags they added or removed.
+        before = set(tags_of([form.instance.id]))
+        super().save_related(request, form, formsets, change)
+        recount_usage(before | set(tags_of([form.instance.id])))
+
+    # Deleted tasks leave tombstones for delta-sync clients (see tasks/sync.py)
+    # and no longer count towards their tags' usage (see tasks/tags.py).
+    def delete_model(self, request, obj):
+        record_removals([(obj.organization_id, obj.id, obj.assigned_to_id)], TaskTombstone.DELETED)
+        tag_ids = set(tags_of([obj.id]))
+        super().delete_model(request, obj)
+        recount_usage(tag_ids)
+
+    def delete_queryset(self, request, queryset):
+        record_removals(queryset.values_list('organization_id', 'id', 'assigned_to_id'), TaskTombstone.DELETED)
+        tag_ids = set(tags_of(queryset.values('id')))
+        super().delete_queryset(request, queryset)
+        recount_usage(tag_ids)
   
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'usage_count', 'organization')
+    list_select_related = ('organization',)
+    list_filter = (OrganizationFilter,)
     search_fields = ('name',)
+    autocomplete_fields = ('organization',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ('user', 'task', 'content', 'created_at')
-    search_fields = ('content', 'user__username', 'task__title')
-    list_filter = ('created_at', 'task')
+    list_display = ('user', 'task', 'content', 'created_at', 'organization')
+    list_select_related = ('user', 'task', 'organization')
+    search_fields = ('content', '=user__username', '^task__title')
+    list_filter = ('created_at', OrganizationFilter)
+    autocomplete_fields = ('organization', 'task', 'user')
     ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
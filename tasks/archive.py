@@ -0,0 +1,119 @@
+"""
+Hot/cold archival of completed tasks.
+
+Completed tasks left unchanged for ``TASK_ARCHIVE_AFTER_DAYS`` are moved, together with
+their comments and tag links, from the hot ``Task``/``Comment`` tables into
+``ArchivedTask``/``ArchivedComment``. Each batch is copied and deleted in its
+own transaction, so an interrupted run loses nothing and simply resumes with
+the next batch when restarted. Archived tasks leave tombstones for delta-sync
+clients; restored tasks come back with a new ``updated_at``, so they aren't
+archived again until they have been left alone that long once more. Tag usage counts only
+cover active tasks and are recounted both ways.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Task, TaskTombstone, Comment, ArchivedTask, ArchivedComment
+from .sync import record_removals
+from .tags import recount_usage, tags_of
+
+TASK_FIELDS = ['id', 'organization_id', 'title', 'description', 'due_date', 'status', 'assigned_to_id', 'created_by_id', 'created_at']
+COMMENT_FIELDS = ['id', 'organization_id', 'task_id', 'user_id', 'content', 'created_at']
+
+
+def archivable_tasks(older_than=None):
+    """
+    Returns the completed tasks not changed (or restored) for ``older_than``.
+    """
+    if older_than is None:
+        older_than = timedelta(days=settings.TASK_ARCHIVE_AFTER_DAYS)
+    return Task.objects.filter(status='COMPLETED', updated_at__lt=timezone.now() - older_than)
+
+
+def _copy(source_model, target_model, ids, fields, key='id'):
+    rows = list(source_model.objects.filter(**{f'{key}__in': ids}).values(*fields))
+    objs = target_model.objects.bulk_create([target_model(**row) for row in rows])
+
+    # bulk_create overwrites auto_now_add fields with the current time; put the originals back.
+    preserved = [
+        field.attname for field in target_model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False) and field.attname in fields
+    ]
+    if preserved:
+        for obj, row in zip(objs, rows):
+            for attname in preserved:
+                setattr(obj, attname, row[attname])
+        target_model.objects.bulk_update(objs, preserved)
+    return objs
+
+
+def _copy_tag_links(source_through, target_through, source_key, target_key, ids):
+    links = source_through.objects.filter(**{f'{source_key}__in': ids}).values_list(source_key, 'tag_id')
+    target_through.objects.bulk_create([
+        target_through(**{target_key: task_id, 'tag_id': tag_id}) for task_id, tag_id in links
+    ])
+
+
+@transaction.atomic
+def archive_batch(ids):
+    """
+    Moves the given tasks, their comments and tag links into the archive tables.
+    """
+    ids = list(Task.objects.select_for_update().filter(id__in=ids).values_list('id', flat=True))
+    if not ids:
+        return 0
+    _copy(Task, ArchivedTask, ids, TASK_FIELDS)
+    _copy_tag_links(Task.tags.through, ArchivedTask.tags.through, 'task_id', 'archivedtask_id', ids)
+    _copy(Comment, ArchivedComment, ids, COMMENT_FIELDS, key='task_id')
+    record_removals(
+        Task.objects.filter(id__in=ids).values_list('organization_id', 'id', 'assigned_to_id'), TaskTombstone.ARCHIVED,
+    )
+    tag_ids = set(tags_of(ids))
+    Task.objects.filter(id__in=ids).delete()
+    recount_usage(tag_ids)
+    return len(ids)
+
+
+def archive_completed_tasks(older_than=None, batch_size=None, max_batches=None, log=None):
+    """
+    Archives archivable tasks in batches of ``batch_size``, oldest ids first.
+
+    Returns:
+    int
+        The number of tasks archived.
+    """
+    batch_size = batch_size or settings.TASK_ARCHIVE_BATCH_SIZE
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(archivable_tasks(older_than).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        total += archive_batch(ids)
+        batches += 1
+        if log:
+            log(f"Archived {total} tasks")
+    return total
+
+
+@transaction.atomic
+def restore_tasks(ids):
+    """
+    Moves archived tasks, their comments and tag links back into the hot tables.
+
+    Returns:
+    list
+        The ids of the restored tasks.
+    """
+    ids = list(ArchivedTask.objects.select_for_update().filter(id__in=ids).values_list('id', flat=True))
+    if not ids:
+        return []
+    _copy(ArchivedTask, Task, ids, TASK_FIELDS)
+    _copy_tag_links(ArchivedTask.tags.through, Task.tags.through, 'archivedtask_id', 'task_id', ids)
+    _copy(ArchivedComment, Comment, ids, COMMENT_FIELDS, key='task_id')
+    recount_usage(tags_of(ids))
+    ArchivedTask.objects.filter(id__in=ids).delete()
+    return ids
@@ -0,0 +1,548 @@
+"""
+Endpoint benchmark suite.
+
+Seeds a configurable dataset, runs timed scenarios against every URL in
+``tasks/urls.py`` and ``users/urls.py`` through the Django test client and the
+ASGI application, and compares the results with a saved baseline.
+"""
+
+import base64
+import itertools
+import json
+import math
+import os
+import random
+import socket
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User
+from .archive import archive_batch
+from .models import Task, Tag, Comment, ArchivedTask
+from .tags import recount_usage
+
+
+DATASET_SIZES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+BENCHMARK_PASSWORD = 'benchmark-pass-123'
+BENCHMARK_ADMIN_EMAIL = 'bench-admin@gmail.com'
+
+TASK_URL_NAMES = [
+    'task-list-create',
+    'task-detail',
+    'task-changes',
+    'task-batch',
+    'tag-list-create',
+    'tag-search',
+    'task-tag-list-create',
+    'comment-list-create',
+    'comment-detail',
+    'archived-task-list',
+    'archived-task-detail',
+    'archived-task-restore',
+]
+
+USER_URL_NAMES = [
+    'register',
+    'login',
+    'logout',
+    'token_obtain_pair',
+    'token_refresh',
+    'token_verify',
+    'token_blacklist',
+    'admin-register',
+    'user-bulk-provision',
+    'user-batch',
+    'user-search',
+]
+
+
+def parse_dataset_size(value):
+    """
+    Resolves a dataset size name (``10k``, ``1m``, ``10m``) or a plain integer.
+    """
+    value = str(value).lower()
+    if value in DATASET_SIZES:
+        return DATASET_SIZES[value]
+    return int(value.replace('_', ''))
+
+
+def seed_dataset(task_count, user_count=100, tag_count=200, comments_per_task=2,
+                 tags_per_task=2, batch_size=5000, log=None):
+    """
+    Seeds users, tags, tasks, task tags and comments with ``bulk_create``.
+
+    Rows are inserted in batches of ``batch_size`` so that seeding millions of
+    tasks keeps memory flat. All seeded users share one password hash, which
+    avoids running the password hasher once per user.
+
+    Returns:
+    dict
+        The number of rows created per model.
+    """
+    rng = random.Random(task_count)
+    password = make_password(BENCHMARK_PASSWORD)
+
+    admin, _ = User.objects.get_or_create(
+        email=BENCHMARK_ADMIN_EMAIL,
+        defaults={'username': 'benchadmin', 'password': password, 'is_staff': True, 'is_superuser': True},
+    )
+
+    offset = User.objects.count()
+    users = User.objects.bulk_create(
+        [
+            User(email=f'bench{offset + i}@gmail.com', username=f'bench{offset + i}', password=password)
+            for i in range(user_count)
+        ],
+        batch_size=batch_size,
+    )
+    user_ids = [user.id for user in users] + [admin.id]
+
+    offset = Tag.objects.count()
+    tags = Tag.objects.bulk_create(
+        [Tag(name=f'bench-tag-{offset + i}') for i in range(tag_count)],
+        batch_size=batch_size,
+    )
+    tag_ids = [tag.id for tag in tags]
+
+    statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+    task_tag = Task.tags.through
+    today = date.today()
+    created = {'users': len(users), 'tags': len(tags), 'tasks': 0, 'task_tags': 0, 'comments': 0}
+
+    for start in range(0, task_count, batch_size):
+        size = min(batch_size, task_count - start)
+        tasks = Task.objects.bulk_create([
+            Task(
+                title=f'Benchmark task {start + i}',
+                description='Seeded by the benchmark suite.',
+                due_date=today + timedelta(days=rng.randint(-30, 90)),
+                status=rng.choice(statuses),
+                assigned_to_id=rng.choice(user_ids),
+                created_by_id=rng.choice(user_ids),
+            )
+            for i in range(size)
+        ])
+
+        links = []
+        if tag_ids:
+            for task in tasks:
+                for tag_id in rng.sample(tag_ids, min(tags_per_task, len(tag_ids))):
+                    links.append(task_tag(task_id=task.id, tag_id=tag_id))
+        task_tag.objects.bulk_create(links, batch_size=batch_size)
+
+        comments = [
+            Comment(task_id=task.id, user_id=rng.choice(user_ids), content='Seeded comment.')
+            for task in tasks
+            for _ in range(comments_per_task)
+        ]
+        Comment.objects.bulk_create(comments, batch_size=batch_size)
+
+        created['tasks'] += len(tasks)
+        created['task_tags'] += len(links)
+        created['comments'] += len(comments)
+        if log:
+            log(f"Seeded {created['tasks']}/{task_count} tasks")
+
+    # Links were bulk-inserted without m2m_changed; count them once at the end.
+    for start in range(0, len(tag_ids), batch_size):
+        recount_usage(tag_ids[start:start + batch_size])
+    return created
+
+
+class Scenario:
+    """
+    A single timed request against a named URL.
+
+    Attributes:
+    name: The URL name, used to key results.
+    method: The HTTP method.
+    path: The request path, including any query string.
+    data: A dict, or a callable taking the iteration number and returning a dict.
+    token: A JWT access token sent as a Bearer header, or None.
+    prepare: A callable taking the iteration number, run before each request and not timed, or None.
+    """
+
+    def __init__(self, name, method, path, data=None, token=None, prepare=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.token = token
+        self.prepare = prepare
+
+    @property
+    def key(self):
+        return f'{self.name}:{self.method}'
+
+    def payload(self, iteration):
+        if callable(self.data):
+            return self.data(iteration)
+        return self.data
+
+
+def build_scenarios(page_size=10):
+    """
+    Builds one or more scenarios for every URL in ``tasks/urls.py`` and ``users/urls.py``.
+
+    Requires a seeded database (see ``seed_dataset``).
+    """
+    admin = User.objects.get(email=BENCHMARK_ADMIN_EMAIL)
+    access = str(RefreshToken.for_user(admin).access_token)
+    task = Task.objects.order_by('-id').first()
+    comment = Comment.objects.filter(user=admin).order_by('-id').first()
+    if comment is None:
+        comment = Comment.objects.create(task=task, user=admin, content='Benchmark comment.')
+    run_id = int(time.time() * 1000)
+    counter = itertools.count()
+
+    def unique_user(_):
+        n = next(counter)
+        return {
+            'email': f'run{run_id}x{n}@gmail.com',
+            'username': f'run{run_id}x{n}',
+            'password': BENCHMARK_PASSWORD,
+            'password2': BENCHMARK_PASSWORD,
+        }
+
+    def fresh_refresh(_):
+        return {'refresh': str(RefreshToken.for_user(admin))}
+
+    listing = f'?{urlencode({"page_size": page_size})}'
+    # A burst of notifications: the ids of the latest tasks and the users they refer to.
+    task_ids = list(Task.objects.order_by('-id').values_list('id', flat=True)[:200])
+    user_ids = list(User.objects.order_by('-id').values_list('id', flat=True)[:200])
+    credentials = {'email': BENCHMARK_ADMIN_EMAIL, 'password': BENCHMARK_PASSWORD}
+    archived = ArchivedTask.objects.order_by('-id').first()
+    archived_id = archived.id if archived else Task.objects.order_by('id').values_list('id', flat=True).first()
+
+    def archive_again(_):
+        # Restoring moves the task back; archive it (again) so every archive scenario finds it.
+        archive_batch([archived_id])
+
+    return [
+        Scenario('task-list-create', 'GET', reverse('task-list-create') + listing, token=access),
+        Scenario('task-list-create', 'POST', reverse('task-list-create'),
+                 {'title': 'Benchmark', 'description': 'Created by benchmark.'}, token=access),
+        Scenario('task-detail', 'GET', reverse('task-detail', args=[task.id]), token=access),
+        Scenario('task-detail', 'PATCH', reverse('task-detail', args=[task.id]),
+                 {'status': 'IN_PROGRESS'}, token=access),
+        Scenario('task-changes', 'GET', reverse('task-changes') + f'?{urlencode({"limit": page_size})}', token=access),
+        Scenario('task-batch', 'POST', reverse('task-batch'), {'ids': task_ids}, token=access),
+        Scenario('tag-list-create', 'PATCH', reverse('tag-list-create', args=[task.id]),
+                 {'tags': ['bench-tag-0', 'bench-tag-1']}, token=access),
+        Scenario('tag-search', 'GET', reverse('tag-search') + '?q=bench-tag-1', token=access),
+        Scenario('task-tag-list-create', 'GET', reverse('task-tag-list-create') + listing, token=access),
+        Scenario('comment-list-create', 'GET', reverse('comment-list-create', args=[task.id]) + listing,
+                 token=access),
+        Scenario('comment-list-create', 'POST', reverse('comment-list-create', args=[task.id]),
+                 {'task': task.id, 'content': 'Benchmark comment.'}, token=access),
+        Scenario('comment-detail', 'GET', reverse('comment-detail', args=[comment.id]), token=access),
+        Scenario('comment-detail', 'PATCH', reverse('comment-detail', args=[comment.id]),
+                 {'content': 'Benchmark edit.'}, token=access),
+        Scenario('archived-task-list', 'GET', reverse('archived-task-list') + listing, token=access,
+                 prepare=archive_again),
+        Scenario('archived-task-detail', 'GET', reverse('archived-task-detail', args=[archived_id]), token=access,
+                 prepare=archive_again),
+        Scenario('archived-task-restore', 'POST', reverse('archived-task-restore', args=[archived_id]),
+                 token=access, prepare=archive_again),
+        Scenario('register', 'POST', reverse('register'), unique_user),
+        Scenario('login', 'POST', reverse('login'), credentials),
+        Scenario('logout', 'POST', reverse('logout'), fresh_refresh, token=access),
+        Scenario('token_obtain_pair', 'POST', reverse('token_obtain_pair'), credentials),
+        Scenario('token_refresh', 'POST', reverse('token_refresh'), fresh_refresh),
+        Scenario('token_verify', 'POST', reverse('token_verify'), {'token': access}),
+        Scenario('token_blacklist', 'POST', reverse('token_blacklist'), fresh_refresh),
+        Scenario('admin-register', 'POST', reverse('admin-register'), unique_user, token=access),
+        Scenario('user-bulk-provision', 'POST', reverse('user-bulk-provision'),
+                 lambda i: {'users': [unique_user(i)]}, token=access),
+        Scenario('user-search', 'GET', reverse('user-search') + '?q=run', token=access),
+        Scenario('user-batch', 'GET', reverse('user-batch') + f'?{urlencode({"ids": ",".join(map(str, user_ids))})}',
+                 token=access),
+    ]
+
+
+def _client_request(client, scenario, data):
+    kwargs = {}
+    if scenario.token:
+        kwargs['HTTP_AUTHORIZATION'] = f'Bearer {scenario.token}'
+    method = getattr(client, scenario.method.lower())
+    if scenario.method == 'GET':
+        return method(scenario.path, **kwargs).status_code
+    return method(scenario.path, data=data, content_type='application/json', **kwargs).status_code
+
+
+async def _asgi_request(application, scenario, data):
+    path, _, query = scenario.path.partition('?')
+    body = json.dumps(data).encode() if data is not None and scenario.method != 'GET' else b''
+    headers = [
+        (b'host', b'testserver'),
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+    ]
+    if scenario.token:
+        headers.append((b'authorization', f'Bearer {scenario.token}'.encode()))
+    communicator = ApplicationCommunicator(application, {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': scenario.method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    })
+    await communicator.send_input({'type': 'http.request', 'body': body, 'more_body': False})
+    start = await communicator.receive_output(timeout=30)
+    while True:
+        message = await communicator.receive_output(timeout=30)
+        if not message.get('more_body'):
+            break
+    await communicator.wait()
+    return start['status']
+
+
+def percentile(samples, pct):
+    """
+    Returns the ``pct`` percentile of ``samples`` using the nearest-rank method.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(samples, statuses, elapsed):
+    return {
+        'iterations': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'throughput_rps': round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        'statuses': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def run_scenarios(scenarios, iterations=50, transports=('client', 'asgi')):
+    """
+    Runs every scenario ``iterations`` times through each transport.
+
+    Returns:
+    dict
+        Results keyed by ``<transport>:<url name>:<method>``.
+    """
+    results = {}
+    for transport in transports:
+        if transport == 'client':
+            client = Client()
+            send = lambda scenario, data: _client_request(client, scenario, data)  # noqa: E731
+        elif transport == 'asgi':
+            from core.asgi import application
+            send = lambda scenario, data: async_to_sync(_asgi_request)(application, scenario, data)  # noqa: E731
+        else:
+            raise ValueError(f'Unknown transport: {transport}')
+
+        for scenario in scenarios:
+            samples, statuses = _time_scenario(send, scenario, iterations)
+            results[f'{transport}:{scenario.key}'] = summarize(samples, statuses, sum(samples))
+    return results
+
+
+def _time_scenario(send, scenario, iterations, samples=None, statuses=None):
+    samples = [] if samples is None else samples
+    statuses = [] if statuses is None else statuses
+    for iteration in range(iterations):
+        if scenario.prepare is not None:
+            scenario.prepare(iteration)
+        data = scenario.payload(iteration)
+        started = time.perf_counter()
+        statuses.append(send(scenario, data))
+        samples.append(time.perf_counter() - started)
+    return samples, statuses
+
+
+def compare_middleware_stacks(scenario, iterations=200, rounds=5, session_user=None):
+    """
+    Times ``scenario`` through the test client with the lean middleware stack and the full one.
+
+    The full stack is ``LEAN_MIDDLEWARE_PATHS`` set to ``()``. Rounds alternate
+    between the two stacks so that drift (warm caches, CPU frequency) affects
+    both equally. With ``session_user`` the client also carries a session cookie, as
+    a browser logged into the admin would.
+
+    Returns:
+    dict
+        ``{'full': summary, 'lean': summary, 'saved_ms': {...}}`` where ``saved_ms``
+        holds the per-request difference in mean, p50 and p95.
+    """
+    stacks = {'full': (), 'lean': tuple(settings.LEAN_MIDDLEWARE_PATHS)}
+    collected = {stack: ([], []) for stack in stacks}
+    per_round = max(1, iterations // rounds)
+    for _ in range(rounds):
+        for stack, prefixes in stacks.items():
+            with override_settings(LEAN_MIDDLEWARE_PATHS=prefixes):
+                # A new client builds a new handler, which reads the setting.
+                client = Client()
+                if session_user is not None:
+                    client.force_login(session_user)
+                send = lambda scenario, data: _client_request(client, scenario, data)  # noqa: E731
+                send(scenario, scenario.payload(0))  # warm-up
+                _time_scenario(send, scenario, per_round, *collected[stack])
+
+    results = {
+        stack: summarize(samples, statuses, sum(samples))
+        for stack, (samples, statuses) in collected.items()
+    }
+    results['saved_ms'] = {
+        metric: round(results['full'][metric] - results['lean'][metric], 3)
+        for metric in ('mean_ms', 'p50_ms', 'p95_ms')
+    }
+    return results
+
+
+def _get_application():
+    from core.asgi import application
+    return application
+
+
+def _rss_bytes(pid):
+    # Linux only: resident pages from /proc, as psutil isn't a dependency.
+    with open(f'/proc/{pid}/statm') as fh:
+        return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _open_connection(port, kind, user, token):
+    if kind == 'websocket':
+        request = (
+            f'GET /ws/notifications/{user.id}/?token={token} HTTP/1.1\r\n'
+            'Host: 127.0.0.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {base64.b64encode(os.urandom(16)).decode()}\r\nSec-WebSocket-Version: 13\r\n\r\n'
+        )
+        expected, end = b' 101 ', b'\r\n\r\n'
+    else:
+        request = (
+            f'GET /api/notifications/stream/?token={token} HTTP/1.1\r\n'
+            'Host: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n'
+        )
+        # Wait for the first event, i.e. until the consumer has joined the group.
+        expected, end = b' 200 ', b'retry:'
+    sock = socket.create_connection(('127.0.0.1', port), timeout=30)
+    sock.sendall(request.encode())
+    received = b''
+    while end not in received:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        received += chunk
+    if expected not in received.split(b'\r\n', 1)[0]:
+        raise RuntimeError(f"{kind} connection failed: {received[:200]!r}")
+    return sock
+
+
+def _idle_connection_memory(kind, user, token, connections, settle):
+    from daphne.testing import DaphneProcess
+
+    server = DaphneProcess('127.0.0.1', _get_application)
+    server.daemon = True
+    server.start()
+    sockets = []
+    try:
+        if not server.ready.wait(30):
+            raise RuntimeError("Daphne did not start.")
+        # One connection first, so that one-off allocations (thread pools, layer setup) aren't counted.
+        _open_connection(server.port.value, kind, user, token).close()
+        time.sleep(settle)
+        before = _rss_bytes(server.pid)
+        sockets = [_open_connection(server.port.value, kind, user, token) for _ in range(connections)]
+        time.sleep(settle)
+        return _rss_bytes(server.pid) - before
+    finally:
+        for sock in sockets:
+            sock.close()
+        server.terminate()
+        server.join(10)
+
+
+def compare_idle_connection_memory(user, connections=500, settle=1.0):
+    """
+    Measures the server memory held per idle notification connection over WebSocket and SSE.
+
+    For each transport, starts Daphne with our ASGI application in a forked process,
+    opens ``connections`` authenticated connections as ``user``, and compares the
+    server's resident memory before and after. Linux only.
+
+    Returns:
+    dict
+        Bytes per connection for ``websocket`` and ``sse``, and ``saved_pct``.
+    """
+    token = str(RefreshToken.for_user(user).access_token)
+    results = {}
+    for kind in ('websocket', 'sse'):
+        results[kind] = round(_idle_connection_memory(kind, user, token, connections, settle) / connections)
+    results['saved_pct'] = round(100 * (1 - results['sse'] / results['websocket']), 1) if results['websocket'] else 0.0
+    return results
+
+
+def build_report(results, dataset=None, iterations=None):
+    return {
+        'created_at': timezone.now().isoformat(),
+        'dataset': dataset or {},
+        'iterations': iterations,
+        'scenarios': results,
+    }
+
+
+def load_report(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_report(report, path):
+    with open(path, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+
+
+def compare_reports(current, baseline, p95_threshold=0.2, throughput_threshold=0.2):
+    """
+    Compares two reports and returns a list of regression descriptions.
+
+    A scenario regresses when its p95 grows by more than ``p95_threshold`` or
+    its throughput drops by more than ``throughput_threshold`` (both relative).
+    Scenarios missing from either report are ignored.
+    """
+    regressions = []
+    for key, base in sorted(baseline.get('scenarios', {}).items()):
+        result = current.get('scenarios', {}).get(key)
+        if result is None:
+            continue
+        if base['p95_ms'] and result['p95_ms'] > base['p95_ms'] * (1 + p95_threshold):
+            regressions.append(
+                f"{key}: p95 {result['p95_ms']}ms exceeds baseline {base['p95_ms']}ms "
+                f"by more than {p95_threshold:.0%}"
+            )
+        if base['throughput_rps'] and result['throughput_rps'] < base['throughput_rps'] * (1 - throughput_threshold):
+            regressions.append(
+                f"{key}: throughput {result['throughput_rps']} req/s is below baseline "
+                f"{base['throughput_rps']} req/s by more than {throughput_threshold:.0%}"
+            )
+    return regressions
@@ -1,15 +1,52 @@
-from channels.generic.websocket import AsyncWebsocketConsumer
+import asyncio
 import json
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+import logging
+import weakref
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from core.tenancy import tenant_channel_layer_alias
 from .models import Task
+from .signals import replay_notifications, task_group, user_group
+
+logger = logging.getLogger(__name__)
 
 class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Delivers the user's notifications and, on request, live events of individual tasks.
+
+    Besides the user's own group, one connection can follow any number of tasks (up to
+    ``TASK_SUBSCRIPTIONS_PER_CONNECTION``) by sending::
+
+        {"action": "subscribe", "task_ids": [1, 2]}
+        {"action": "unsubscribe", "task_ids": [2]}
+
+    Clients reconnecting can pass ``?tasks=1,2`` to restore their subscriptions in the handshake.
+    """
+
+    async def __call__(self, scope, receive, send):
+        # Publish and subscribe on the user's tenant's channel layer (see core.tenancy).
+        user = scope.get('user')
+        if user is not None and user.is_authenticated:
+            self.channel_layer_alias = tenant_channel_layer_alias(user.organization_id)
+        return await super().__call__(scope, receive, send)
+
     async def connect(self):
         self.user_id = self.scope['url_route']['kwargs']['user_id']
-        self.group_name = f"user_{self.user_id}"
+        user = self.scope.get('user')
+
+        # Only the user themselves may subscribe; their organization namespaces the group.
+        if user is None or not user.is_authenticated or user.id != self.user_id:
+            await self.close()
+            return
+        self.organization_id = user.organization_id
+        self.group_name = user_group(user.organization_id, self.user_id)
+        self.task_ids = set()
 
         # Join the group
         await self.channel_layer.group_add(
@@ -19,13 +56,81 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'tasks' in query:
+            await self.subscribe(query['tasks'][0].split(','))
+
     async def disconnect(self, close_code):
-        # Leave the group
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
+        if not hasattr(self, 'group_name'):
+            return
+        # Leave the group and every task group in one round of concurrent calls
+        await asyncio.gather(
+            self.channel_layer.group_discard(self.group_name, self.channel_name),
+            *(self.channel_layer.group_discard(task_group(self.organization_id, task_id), self.channel_name)
+              for task_id in self.task_ids),
         )
 
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or '')
+            action = message['action']
+            task_ids = message['task_ids']
+        except (ValueError, TypeError, KeyError):
+            await self.send_error("Expected {\"action\": ..., \"task_ids\": [...]}.")
+            return
+        if action == 'subscribe':
+            await self.subscribe(task_ids)
+        elif action == 'unsubscribe':
+            await self.unsubscribe(task_ids)
+        else:
+            await self.send_error(f"Unknown action {action!r}.")
+
+    @staticmethod
+    def _parse_ids(task_ids):
+        ids = set()
+        for task_id in task_ids if isinstance(task_ids, list) else [task_ids]:
+            try:
+                ids.add(int(task_id))
+            except (TypeError, ValueError):
+                continue
+        return ids
+
+    @database_sync_to_async
+    def _visible_tasks(self, task_ids):
+        # One query per subscribe message, however many tasks it names.
+        return set(Task.objects.filter(organization_id=self.organization_id, id__in=task_ids)
+                   .values_list('id', flat=True))
+
+    async def subscribe(self, task_ids):
+        requested = self._parse_ids(task_ids)
+        # Tasks already joined need no round trip to the channel layer. Only as many ids as
+        # there is room for are looked up, so a huge message can't turn into a huge query.
+        room = max(settings.TASK_SUBSCRIPTIONS_PER_CONNECTION - len(self.task_ids), 0)
+        new = sorted(requested - self.task_ids)[:room]
+        allowed = await self._visible_tasks(new) if new else set()
+        await asyncio.gather(*(
+            self.channel_layer.group_add(task_group(self.organization_id, task_id), self.channel_name)
+            for task_id in allowed
+        ))
+        self.task_ids |= allowed
+        await self.send(text_data=json.dumps({
+            'type': 'subscribed',
+            'task_ids': sorted(self.task_ids & requested),
+            'rejected': sorted(requested - self.task_ids),
+        }))
+
+    async def unsubscribe(self, task_ids):
+        removed = self._parse_ids(task_ids) & self.task_ids
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(task_group(self.organization_id, task_id), self.channel_name)
+            for task_id in removed
+        ))
+        self.task_ids -= removed
+        await self.send(text_data=json.dumps({'type': 'unsubscribed', 'task_ids': sorted(removed)}))
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({'type': 'error', 'message': message}))
+
     async def send_notification(self, event):
         # Send notification to WebSocket
         await self.send(text_data=json.dumps({
@@ -35,51 +140,146 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'status': event['status'],
         }))
 
-    @staticmethod
-    def notify(group_name, message):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(group_name, {
-            'type': 'send_notification',
-            'message': message['message'],
-            'task_id': message['task_id'],
-            'task_title': message['task_title'],
-            'status': message['status'],
-        })
+    async def send_bulk_notification(self, event):
+        # Send one notification covering several tasks changed together
+        await self.send(text_data=json.dumps({
+            'message': event['message'],
+            'tasks': event['tasks'],
+        }))
 
-    @staticmethod
-    @receiver(post_save, sender=Task)
-    def task_changes(sender, instance, created, update_fields=None, **kwargs):
-        assigned_user = instance.assigned_to
-
-        if created:
-            if assigned_user:
-                NotificationConsumer.notify(f"user_{assigned_user.id}", {
-                    "message": "You have been assigned a new task.",
-                    "task_id": instance.id,
-                    "task_title": instance.title,
-                    "status": instance.status,
-                })
-        else:
-            if update_fields:
-                if 'assigned_to' in update_fields and assigned_user:
-                    NotificationConsumer.notify(f"user_{assigned_user.id}", {
-                        "message": "Task assignment has been changed.",
-                        "task_id": instance.id,
-                        "task_title": instance.title,
-                        "status": instance.status,
-                    })
-                elif 'status' in update_fields and assigned_user:
-                    NotificationConsumer.notify(f"user_{assigned_user.id}", {
-                        "message": "Task status has been updated.",
-                        "task_id": instance.id,
-                        "task_title": instance.title,
-                        "status": instance.status,
-                    })
-            else:
-                if assigned_user:
-                    NotificationConsumer.notify(f"user_{assigned_user.id}", {
-                        "message": "Task has been updated.",
-                        "task_id": instance.id,
-                        "task_title": instance.title,
-                        "status": instance.status,
-                    })
+    async def task_event(self, event):
+        # Forward an event of a subscribed task (see signals.publish_task_event)
+        await self.send(text_data=json.dumps({
+            'type': event['event'],
+            **{key: value for key, value in event.items() if key not in ('type', 'event')},
+        }))
+
+
+class StreamHeartbeats:
+    """
+    Sends the SSE heartbeat to every open stream from a single task.
+
+    A task per stream would cost every idle connection a coroutine frame and a timer.
+    """
+
+    def __init__(self):
+        self.streams = weakref.WeakSet()
+        self.task = None
+
+    def add(self, stream):
+        self.streams.add(stream)
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.run())
+
+    def discard(self, stream):
+        self.streams.discard(stream)
+
+    async def run(self):
+        while self.streams:
+            await asyncio.sleep(settings.NOTIFICATION_STREAM_HEARTBEAT)
+            for stream in list(self.streams):
+                try:
+                    await stream.send_body(b': heartbeat\n\n', more_body=True)
+                except Exception:
+                    # A broken stream mustn't stop the heartbeat of the others.
+                    logger.debug('Dropping a stream whose heartbeat failed', exc_info=True)
+                    self.discard(stream)
+
+
+_heartbeats = StreamHeartbeats()
+
+
+class NotificationStreamConsumer(AsyncHttpConsumer):
+    """
+    Streams the user's notifications as Server-Sent Events.
+
+    A receive-only alternative to ``NotificationConsumer`` for clients that don't need a
+    WebSocket: it joins the same ``user_<id>`` group, authenticates with a JWT (``?token=``
+    or an ``Authorization`` header, see ``JWTAuthMiddleware``) and sends a comment every
+    ``NOTIFICATION_STREAM_HEARTBEAT`` seconds so proxies keep idle streams open. Clients
+    reconnecting with ``Last-Event-ID`` first receive the notifications they missed.
+    """
+
+    async def __call__(self, scope, receive, send):
+        user = scope.get('user')
+        if user is not None and user.is_authenticated:
+            self.channel_layer_alias = tenant_channel_layer_alias(user.organization_id)
+        return await super().__call__(scope, receive, send)
+
+    def _last_event_id(self):
+        headers = dict(self.scope.get('headers', []))
+        value = headers.get(b'last-event-id', b'').decode()
+        if not value:
+            value = parse_qs(self.scope.get('query_string', b'').decode()).get('last_event_id', [''])[0]
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+    async def handle(self, body):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.send_response(
+                401, b'{"detail": "Authentication credentials were not provided."}',
+                headers=[(b'Content-Type', b'application/json')],
+            )
+            return
+        self.group_name = user_group(user.organization_id, user.id)
+        last_id = self._last_event_id()
+        self.replayed = set()
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.send_headers(headers=[
+            (b'Content-Type', b'text/event-stream'),
+            (b'Cache-Control', b'no-cache'),
+            (b'X-Accel-Buffering', b'no'),
+        ])
+        await self.send_body(b'retry: 3000\n\n', more_body=True)
+
+        # Joined the group before reading the buffer, so nothing falls in between; live
+        # events that were already replayed are skipped. Other live events are always sent,
+        # even if another worker gave them a lower id than one already sent.
+        if last_id:
+            for event in await database_sync_to_async(replay_notifications)(
+                    user.organization_id, user.id, last_id):
+                await self.send_event(event)
+                self.replayed.add(event['id'])
+        self.streaming = True
+        _heartbeats.add(self)
+
+    async def http_request(self, message):
+        # AsyncHttpConsumer finishes the response once handle() returns. Keep an opened stream
+        # running instead, so that group messages keep being dispatched until the client leaves.
+        if message.get('more_body'):
+            return
+        try:
+            await self.handle(message.get('body', b''))
+        finally:
+            streaming = getattr(self, 'streaming', False)
+            if not streaming:
+                await self.disconnect()
+        if not streaming:
+            raise StopConsumer()
+
+    async def disconnect(self):
+        _heartbeats.discard(self)
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def send_event(self, event):
+        event_id = event.get('id')
+        if event_id in self.replayed:
+            self.replayed.discard(event_id)
+            return
+        name = 'bulk_notification' if event['type'] == 'send_bulk_notification' else 'notification'
+        data = {key: value for key, value in event.items() if key not in ('type', 'id')}
+        lines = [f'event: {name}', f'data: {json.dumps(data)}']
+        if event_id is not None:
+            lines.insert(0, f'id: {event_id}')
+        await self.send_body(('\n'.join(lines) + '\n\n').encode(), more_body=True)
+
+    async def send_notification(self, event):
+        await self.send_event(event)
+
+    async def send_bulk_notification(self, event):
+        await self.send_event(event)
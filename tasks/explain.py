@@ -0,0 +1,156 @@
+"""
+EXPLAIN-based detection of full table scans and sorts in hot querysets.
+
+``hot_queries`` builds the querysets our busiest views and admin changelists
+run; ``analyze_plan`` runs ``EXPLAIN`` (``EXPLAIN QUERY PLAN`` on SQLite) on one
+of them and reports plan steps that read a whole table or sort without an index.
+Used by ``manage.py explain_hot_queries``.
+"""
+
+import re
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib import admin
+from django.db import connection
+from django.test import RequestFactory
+
+from users.directory import search_queryset as user_search_queryset
+from .filters import TaskFilter
+from .includes import included_comments
+from .models import Task, Tag, Comment
+from .sync import SyncCursor, changed_after, removed_after, visible_tombstones
+from .tags import _ranked, search_queryset
+from .views import ArchivedTaskListView, CommentListCreateView, TaskListCreateView, TaskListView
+
+PLAN_PATTERNS = {
+    'sqlite': [
+        (re.compile(r'\bSCAN (?!CONSTANT ROW)(\S+)\s*$'), 'full table scan'),
+        (re.compile(r'USE TEMP B-TREE FOR (.+)$'), 'temp B-tree'),
+    ],
+    'postgresql': [
+        (re.compile(r'Seq Scan on (\S+)'), 'full table scan'),
+        (re.compile(r'^\s*(?:->\s*)?((?:Incremental )?Sort)\b'), 'sort'),
+    ],
+    'mysql': [
+        (re.compile(r'\btable=(\S+).*\btype=ALL\b'), 'full table scan'),
+        (re.compile(r'(Using filesort)'), 'filesort'),
+        (re.compile(r'(Using temporary)'), 'temporary table'),
+    ],
+}
+
+
+class HotQuery:
+    """
+    A named queryset to check.
+
+    Attributes:
+    name: A label for the report.
+    queryset: The queryset to EXPLAIN.
+    allow_full_scan: True for unfiltered listings that read the table in order under a LIMIT.
+    """
+
+    def __init__(self, name, queryset, allow_full_scan=False):
+        self.name = name
+        self.queryset = queryset
+        self.allow_full_scan = allow_full_scan
+
+
+def _view_queryset(view_class, user, **kwargs):
+    view = view_class()
+    view.request = SimpleNamespace(user=user)
+    view.kwargs = kwargs
+    return view.get_queryset()
+
+
+def _page(queryset, size=10):
+    return queryset[:size]
+
+
+def _changelist_queryset(model, superuser):
+    request = RequestFactory().get('/admin/')
+    request.user = superuser
+    model_admin = admin.site._registry[model]
+    changelist = model_admin.get_changelist_instance(request)
+    return changelist.queryset[:changelist.list_per_page]
+
+
+def hot_queries(staff, member, task):
+    """
+    Builds the querysets used by the task and comment views, ``TaskFilter`` and the admin changelists.
+
+    Parameters:
+    staff : User
+        A superuser; used for staff listings and the admin.
+    member : User
+        A non-staff user with assigned tasks.
+    task : Task
+        A task, ideally with comments.
+    """
+    staff_tasks = _view_queryset(TaskListCreateView, staff)
+    member_tasks = _view_queryset(TaskListCreateView, member)
+    due_date = task.due_date.isoformat() if task.due_date else '2024-01-01'
+    comment = task.comments.first()
+    cursor = SyncCursor(task.updated_at, task.id)
+    tag_names = ','.join(task.tags.values_list('name', flat=True)) or 'none'
+    member_request = SimpleNamespace(user=member)
+
+    queries = [
+        HotQuery('TaskListCreateView staff page', _page(staff_tasks), allow_full_scan=True),
+        HotQuery('TaskListCreateView member page', _page(member_tasks)),
+        HotQuery('TaskFilter status (staff)', _page(TaskFilter({'status': 'TODO'}, queryset=staff_tasks).qs)),
+        HotQuery('TaskFilter due_date (staff)', _page(TaskFilter({'due_date': due_date}, queryset=staff_tasks).qs)),
+        HotQuery('TaskFilter status (member)', _page(TaskFilter({'status': 'TODO'}, queryset=member_tasks).qs)),
+        HotQuery('TaskFilter tags any (member)', _page(
+            TaskFilter({'tags': tag_names}, queryset=member_tasks, request=member_request).qs)),
+        HotQuery('TaskFilter tags all (member)', _page(
+            TaskFilter({'tags': tag_names, 'tags_mode': 'all'}, queryset=member_tasks, request=member_request).qs)),
+        HotQuery('TaskListView page', _page(_view_queryset(TaskListView, member)), allow_full_scan=True),
+        HotQuery('TaskSerializer tags prefetch', Tag.objects.filter(tasks__in=[task.id])),
+        HotQuery('TaskListCreateView include=comments', included_comments(list(_page(member_tasks).values_list('id', flat=True)))),
+        HotQuery('CommentListCreateView page', _page(_view_queryset(CommentListCreateView, member, task_id=task.id))),
+        HotQuery('ArchivedTaskListView member page', _page(_view_queryset(ArchivedTaskListView, member))),
+        HotQuery('TaskChangesView staff delta', _page(changed_after(staff_tasks, cursor))),
+        HotQuery('TaskChangesView member delta', _page(changed_after(member_tasks, cursor))),
+        HotQuery('TaskChangesView tombstones', _page(removed_after(visible_tombstones(member), cursor))),
+        HotQuery('TagSearchView top tags', _ranked(member.organization_id)[:settings.TAG_TOP_N]),
+        HotQuery('TagSearchView prefix range', search_queryset(member.organization_id, 'bench')[:settings.TAG_SEARCH_SCAN_LIMIT]),
+        HotQuery('UserSearchView username range', user_search_queryset(member.organization_id, 'username', 'bench')[:11]),
+        HotQuery('UserSearchView email range', user_search_queryset(member.organization_id, 'email', 'bench')[:11]),
+        HotQuery('CommentDetailView lookup', Comment.objects.filter(pk=comment.pk if comment else 0)),
+    ]
+    # The admin registers its ModelAdmins lazily (see core/urls.py).
+    admin.autodiscover()
+    for model in (Task, Comment, Tag, type(staff)):
+        if model in admin.site._registry:
+            queries.append(HotQuery(
+                f'{model.__name__} admin changelist',
+                _changelist_queryset(model, staff),
+                allow_full_scan=True,
+            ))
+    return queries
+
+
+def analyze_plan(plan, vendor=None):
+    """
+    Returns ``(problem, detail)`` tuples for every flagged step in an EXPLAIN output.
+    """
+    findings = []
+    for line in plan.splitlines():
+        for pattern, problem in PLAN_PATTERNS.get(vendor or connection.vendor, []):
+            match = pattern.search(line)
+            if match:
+                findings.append((problem, match.group(1)))
+    return findings
+
+
+def check_query(hot_query):
+    """
+    EXPLAINs a hot query and returns ``(plan, findings)``, ignoring permitted full scans.
+    """
+    plan = hot_query.queryset.explain()
+    findings = [
+        (problem, detail) for problem, detail in analyze_plan(plan)
+        if not (hot_query.allow_full_scan and problem == 'full table scan')
+    ]
+    return plan, findings
@@ -1,9 +1,42 @@
 import django_filters
-from .models import Task, Tag
+from .models import Task, TaskTag, Tag
+
 
 class TaskFilter(django_filters.FilterSet):
-    tags = django_filters.CharFilter(field_name='status', lookup_expr='icontains')
+    """
+    Filters tasks by status, due date and tags.
+
+    ``?tags=a,b`` keeps the tasks carrying any of the named tags, or all of them with
+    ``tags_mode=all``. Tags are matched as ``id IN (SELECT task_id ...)`` semi-joins on the
+    ``(tag, task)`` index rather than joined, so each task appears once; ``all`` intersects
+    one semi-join per tag, which lets a rare tag narrow the result before a popular one.
+    """
+    TAGS_MODE_CHOICES = [('any', 'Any'), ('all', 'All')]
+
+    tags = django_filters.CharFilter(method='filter_tags', label='Comma-separated tag names')
+    tags_mode = django_filters.ChoiceFilter(choices=TAGS_MODE_CHOICES, method='filter_tags_mode', empty_label=None)
 
     class Meta:
         model = Task
-        fields = ['status', 'due_date', 'tags']
+        fields = ['status', 'due_date', 'tags', 'tags_mode']
+
+    def _tagged(self, names):
+        tags = Tag.objects.filter(name__in=names)
+        if self.request is not None:
+            # Tag names are unique per organization; this also uses the (organization, name) index.
+            tags = tags.filter(organization_id=self.request.user.organization_id)
+        return TaskTag.objects.filter(tag__in=tags.values('id')).values('task')
+
+    def filter_tags(self, queryset, name, value):
+        names = {tag.strip() for tag in value.split(',') if tag.strip()}
+        if not names:
+            return queryset
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag in sorted(names):
+                queryset = queryset.filter(id__in=self._tagged([tag]))
+            return queryset
+        return queryset.filter(id__in=self._tagged(names))
+
+    def filter_tags_mode(self, queryset, name, value):
+        # Read by filter_tags.
+        return queryset
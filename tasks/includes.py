@@ -0,0 +1,84 @@
+"""
+Compound documents for the task endpoints.
+
+``GET /api/tasks/?include=comments,assignee,creator`` (and the same on
+``/api/tasks/<id>/``) returns the usual payload plus an ``included`` object
+holding the related resources, so that a client can render a board without a
+request per task or per user::
+
+    {"count": ..., "results": [...tasks...],
+     "included": {"comments": [...], "comment_counts": {"<task id>": ...}, "users": [...]}}
+
+Each resource appears once however many tasks refer to it. ``users`` holds the
+assignees, the creators and, with ``comments``, the comment authors that were
+asked for. ``comments`` holds each task's latest ``TASK_INCLUDE_COMMENTS_PER_TASK``
+comments, oldest first, and ``comment_counts`` how many each task has in all;
+the rest are listed by ``/api/tasks/<id>/comments/``. Comments and their counts
+are read with one query for the whole page, and users
+through the user cache (see ``users/caching.py``) with at most one more, so the
+number of queries doesn't depend on the page size.
+"""
+
+from django.conf import settings
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from rest_framework.exceptions import ValidationError
+
+from users.caching import get_cached_users
+from users.serializers import UserSummarySerializer
+from .models import Comment
+from .serializers import CommentSerializer
+
+INCLUDES = ('comments', 'assignee', 'creator')
+
+
+def parse_include(value):
+    """
+    Returns the set of names in a comma-separated ``include`` parameter.
+
+    Raises:
+    ValidationError
+        If a name isn't one of ``INCLUDES``.
+    """
+    names = {name.strip() for name in (value or '').split(',') if name.strip()}
+    unknown = names.difference(INCLUDES)
+    if unknown:
+        raise ValidationError({'include': [
+            f"Unknown include: {', '.join(sorted(unknown))}. Choose from {', '.join(INCLUDES)}."
+        ]})
+    return names
+
+
+def included_comments(task_ids):
+    """
+    Returns the latest ``TASK_INCLUDE_COMMENTS_PER_TASK`` comments of each task, annotated with
+    ``task_comment_count``, the number of comments of their task.
+    """
+    return Comment.objects.filter(task_id__in=task_ids).annotate(
+        recency=Window(RowNumber(), partition_by=[F('task_id')], order_by=[F('created_at').desc(), F('id').desc()]),
+        task_comment_count=Window(Count('id'), partition_by=[F('task_id')]),
+    ).filter(recency__lte=settings.TASK_INCLUDE_COMMENTS_PER_TASK).order_by('task_id', 'created_at', 'id')
+
+
+def build_included(tasks, include, context=None):
+    """
+    Returns the ``included`` object for ``tasks`` (already loaded) and the ``include`` names.
+    """
+    included = {}
+    user_ids = set()
+    if 'assignee' in include:
+        user_ids.update(task.assigned_to_id for task in tasks)
+    if 'creator' in include:
+        user_ids.update(task.created_by_id for task in tasks)
+    if 'comments' in include:
+        comments = list(included_comments([task.id for task in tasks]))
+        included['comments'] = CommentSerializer(comments, many=True, context=context).data
+        counts = {comment.task_id: comment.task_comment_count for comment in comments}
+        included['comment_counts'] = {str(task.id): counts.get(task.id, 0) for task in tasks}
+        user_ids.update(comment.user_id for comment in comments)
+    user_ids.discard(None)
+    users = get_cached_users(user_ids) if user_ids else {}
+    included['users'] = UserSummarySerializer(
+        [users[user_id] for user_id in sorted(users)], many=True, context=context,
+    ).data
+    return included
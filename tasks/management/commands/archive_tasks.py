@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.archive import archivable_tasks, archive_completed_tasks
+from tasks.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves completed tasks unchanged for TASK_ARCHIVE_AFTER_DAYS, with their comments and tags, "
+        "into the archive tables, and prunes delta-sync tombstones older than TASK_TOMBSTONE_RETENTION_DAYS. "
+        "Runs in batches and can be safely interrupted and restarted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.TASK_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many tasks would be archived.")
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options['older_than_days'])
+        if options['dry_run']:
+            self.stdout.write(f"{archivable_tasks(older_than).count()} tasks would be archived.")
+            return
+        archived = archive_completed_tasks(
+            older_than=older_than,
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        pruned = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} tasks; pruned {pruned} tombstones."))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from tasks.benchmarks import BENCHMARK_ADMIN_EMAIL, compare_idle_connection_memory
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens idle notification connections to a Daphne server over WebSocket and over "
+        "Server-Sent Events and prints the server memory each one holds (Linux only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=500)
+        parser.add_argument('--email', default=BENCHMARK_ADMIN_EMAIL, help="The user to connect as.")
+        parser.add_argument(
+            '--in-memory-layer', action='store_true',
+            help="Use the in-memory channel layer instead of CHANNEL_LAYERS (e.g. without Redis).",
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.get(email=options['email'])
+        # The server process is forked from this one, so it inherits these overrides.
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, '127.0.0.1']}
+        if options['in_memory_layer']:
+            overrides['CHANNEL_LAYERS'] = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        with override_settings(**overrides):
+            results = compare_idle_connection_memory(user, options['connections'])
+
+        for transport in ('websocket', 'sse'):
+            self.stdout.write(f"{transport:<9} {results[transport] / 1024:>8.1f} KiB per idle connection")
+        self.stdout.write(self.style.SUCCESS(f"SSE holds {results['saved_pct']}% less memory per connection."))
@@ -0,0 +1,88 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from tasks.benchmarks import (
+    build_report,
+    build_scenarios,
+    compare_reports,
+    load_report,
+    run_scenarios,
+    save_report,
+)
+from tasks.models import Task, Comment
+
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs timed scenarios against every task and user endpoint, stores the results as JSON "
+        "and fails when p95 latency or throughput regresses against a saved baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument(
+            '--transport', action='append', choices=['client', 'asgi'],
+            help="Transport to benchmark; may be repeated. Defaults to both.",
+        )
+        parser.add_argument('--output', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'latest.json'))
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline.")
+        parser.add_argument('--p95-threshold', type=float, default=0.2)
+        parser.add_argument('--throughput-threshold', type=float, default=0.2)
+        parser.add_argument(
+            '--channel-layer', choices=['memory', 'configured'], default='memory',
+            help="Use an in-memory channel layer (default) or the configured CHANNEL_LAYERS.",
+        )
+
+    def handle(self, *args, **options):
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'THROTTLE_ENABLED': False}
+        if options['channel_layer'] == 'memory':
+            overrides['CHANNEL_LAYERS'] = IN_MEMORY_CHANNEL_LAYERS
+
+        with override_settings(**overrides):
+            if not Task.objects.exists():
+                raise CommandError("No tasks found; run `manage.py seed_benchmark_data` first.")
+            dataset = {'tasks': Task.objects.count(), 'comments': Comment.objects.count()}
+            scenarios = build_scenarios(page_size=options['page_size'])
+            results = run_scenarios(
+                scenarios,
+                iterations=options['iterations'],
+                transports=options['transport'] or ('client', 'asgi'),
+            )
+
+        report = build_report(results, dataset=dataset, iterations=options['iterations'])
+        for key, result in sorted(results.items()):
+            self.stdout.write(
+                f"{key:<45} p50={result['p50_ms']:>9.2f}ms p95={result['p95_ms']:>9.2f}ms "
+                f"rps={result['throughput_rps']:>9.1f} statuses={result['statuses']}"
+            )
+
+        os.makedirs(os.path.dirname(options['output']) or '.', exist_ok=True)
+        save_report(report, options['output'])
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options['save_baseline']:
+            save_report(report, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING("No baseline found; skipping regression check."))
+            return
+
+        regressions = compare_reports(
+            report,
+            load_report(options['baseline']),
+            p95_threshold=options['p95_threshold'],
+            throughput_threshold=options['throughput_threshold'],
+        )
+        if regressions:
+            raise CommandError("Performance regressions detected:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from tasks.benchmarks import BENCHMARK_ADMIN_EMAIL, build_scenarios, compare_middleware_stacks
+from tasks.models import Task
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Times GET on TaskListCreateView with the full middleware stack and with the lean stack "
+        "used for LEAN_MIDDLEWARE_PATHS, and prints the per-request difference."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument(
+            '--session', action='store_true',
+            help="Also send an admin session cookie, as a browser logged into the admin would.",
+        )
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], THROTTLE_ENABLED=False):
+            if not Task.objects.exists():
+                raise CommandError("No tasks found; run `manage.py seed_benchmark_data` first.")
+            scenario = next(
+                scenario for scenario in build_scenarios(page_size=options['page_size'])
+                if scenario.key == 'task-list-create:GET'
+            )
+            session_user = User.objects.get(email=BENCHMARK_ADMIN_EMAIL) if options['session'] else None
+            results = compare_middleware_stacks(
+                scenario, options['iterations'], options['rounds'], session_user=session_user,
+            )
+
+        for stack in ('full', 'lean'):
+            result = results[stack]
+            self.stdout.write(
+                f"{stack:<5} mean={result['mean_ms']:>8.3f}ms p50={result['p50_ms']:>8.3f}ms "
+                f"p95={result['p95_ms']:>8.3f}ms rps={result['throughput_rps']:>8.1f} statuses={result['statuses']}"
+            )
+        saved = results['saved_ms']
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved per request: mean={saved['mean_ms']:.3f}ms p50={saved['p50_ms']:.3f}ms p95={saved['p95_ms']:.3f}ms"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.openapi import write_schema_documents
+
+
+class Command(BaseCommand):
+    help = "Generates the OpenAPI schema once and writes it to OPENAPI_SCHEMA_DIR for /swagger.json and /swagger.yaml."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=None, help="Defaults to the OPENAPI_SCHEMA_DIR setting.")
+
+    def handle(self, *args, **options):
+        for path in write_schema_documents(options['output_dir']):
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path}"))
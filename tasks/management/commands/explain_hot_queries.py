@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from tasks.benchmarks import seed_dataset
+from tasks.explain import check_query, hot_queries
+from tasks.models import Task
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the querysets behind the task, comment and admin views and fails when "
+        "any of them needs a full table scan, a temp B-tree or a filesort."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Seed tasks until at least this many exist before explaining.",
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="Refresh planner statistics (ANALYZE) before explaining.",
+        )
+        parser.add_argument('--show-plans', action='store_true', help="Print every plan, not only flagged ones.")
+
+    def handle(self, *args, **options):
+        missing = options['seed'] - Task.objects.count()
+        if missing > 0:
+            seed_dataset(missing, user_count=max(10, missing // 100), tag_count=max(10, missing // 50))
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        staff = User.objects.filter(is_superuser=True).first()
+        member = (
+            User.objects.filter(is_staff=False)
+            .annotate(task_count=Count('tasks'))
+            .order_by('-task_count')
+            .first()
+        )
+        task = Task.objects.annotate(comment_count=Count('comments')).order_by('-comment_count').first()
+        if not (staff and member and task):
+            raise CommandError(
+                "A superuser, a non-staff user and at least one task are required; "
+                "pass --seed or run `manage.py seed_benchmark_data` first."
+            )
+
+        failures = 0
+        for hot_query in hot_queries(staff, member, task):
+            plan, findings = check_query(hot_query)
+            if findings:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {hot_query.name}"))
+                for problem, detail in findings:
+                    self.stdout.write(f"    {problem}: {detail}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {hot_query.name}"))
+            if findings or options['show_plans']:
+                self.stdout.write(f"    SQL: {hot_query.queryset.query}")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    | {line}")
+
+        if failures:
+            raise CommandError(f"{failures} hot queries need a full scan or an unindexed sort.")
+        self.stdout.write(self.style.SUCCESS("All hot queries are index-backed."))
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importtime import profile_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a module (core.asgi by default) in a fresh interpreter under `python -X importtime`, "
+        "prints the slowest imports and fails when the total exceeds ASGI_IMPORT_BUDGET_MS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='core.asgi')
+        parser.add_argument('--top', type=int, default=20, help="Number of imports to list.")
+        parser.add_argument('--depth', type=int, default=None, help="Only list imports nested at most this deep.")
+        parser.add_argument(
+            '--budget-ms', type=float, default=None,
+            help="Defaults to the ASGI_IMPORT_BUDGET_MS setting; 0 disables the check.",
+        )
+        parser.add_argument(
+            '--dev', action='store_true',
+            help="Profile with the current environment instead of a production worker's "
+                 "(doc generators and the development server disabled).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            profile = profile_import(options['module'], env={} if options['dev'] else None)
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for record in profile.slowest(options['top'], options['depth']):
+            self.stdout.write(
+                f"{record.cumulative_us / 1000:>14.1f} {record.self_us / 1000:>9.1f}  "
+                f"{'  ' * record.depth}{record.name}"
+            )
+
+        budget = options['budget_ms']
+        if budget is None:
+            budget = settings.ASGI_IMPORT_BUDGET_MS
+        summary = f"import {profile.module}: {profile.total_ms:.1f} ms ({len(profile.records)} modules)"
+        if budget and profile.total_ms > budget:
+            raise CommandError(f"{summary}, over the {budget:.0f} ms budget")
+        self.stdout.write(self.style.SUCCESS(summary))
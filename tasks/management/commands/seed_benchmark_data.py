@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from tasks.benchmarks import DATASET_SIZES, parse_dataset_size, seed_dataset
+
+
+class Command(BaseCommand):
+    help = "Seeds users, tags, tasks and comments for the endpoint benchmark suite."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', default='10k',
+            help=f"Number of tasks to seed: one of {', '.join(DATASET_SIZES)} or an integer.",
+        )
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--tags-per-task', type=int, default=2)
+        parser.add_argument('--comments-per-task', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        created = seed_dataset(
+            parse_dataset_size(options['size']),
+            user_count=options['users'],
+            tag_count=options['tags'],
+            tags_per_task=options['tags_per_task'],
+            comments_per_task=options['comments_per_task'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        summary = ', '.join(f'{count} {name}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary}.'))
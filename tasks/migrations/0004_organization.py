@@ -0,0 +1,90 @@
+# Generated by Django 4.2.15 on 2026-10-19 02:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_organization'),
+        ('tasks', '0003_task_archive'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedtask',
+            name='archivedtask_assignee_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='archivedtask',
+            name='archivedtask_archived_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_status_due_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_assignee_status_idx',
+        ),
+        migrations.AddField(
+            model_name='archivedcomment',
+            name='organization',
+            field=models.ForeignKey(default=users.models.default_organization_id, on_delete=django.db.models.deletion.CASCADE, related_name='archived_comments', to='users.organization'),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='organization',
+            field=models.ForeignKey(db_index=False, default=users.models.default_organization_id, on_delete=django.db.models.deletion.CASCADE, related_name='archived_tasks', to='users.organization'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='organization',
+            field=models.ForeignKey(db_index=False, default=users.models.default_organization_id, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='users.organization'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='organization',
+            field=models.ForeignKey(db_index=False, default=users.models.default_organization_id, on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='users.organization'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='organization',
+            field=models.ForeignKey(db_index=False, default=users.models.default_organization_id, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='users.organization'),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['organization', 'assigned_to', '-archived_at', '-id'], name='archivedtask_assignee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['organization', '-archived_at', '-id'], name='archivedtask_archived_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['organization', 'created_at', 'id'], name='comment_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['organization', 'status', 'due_date'], name='task_org_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['organization', 'assigned_to', 'status'], name='task_org_assignee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['organization', 'due_date', '-id'], name='task_org_due_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('organization', 'name'), name='tag_org_name_uniq'),
+        ),
+    ]
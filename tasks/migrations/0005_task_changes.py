@@ -0,0 +1,65 @@
+# Generated by Django 4.2.15 on 2026-10-19 03:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import users.models
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Existing tasks were last known to change when they were created.
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('users', '0002_organization'),
+        ('tasks', '0004_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.BigIntegerField()),
+                ('reason', models.CharField(choices=[('deleted', 'Deleted'), ('archived', 'Archived'), ('reassigned', 'Reassigned')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['organization', 'updated_at', 'id'], name='task_org_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['organization', 'assigned_to', 'updated_at', 'id'], name='task_org_assignee_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='tasktombstone',
+            name='assigned_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='tasktombstone',
+            name='organization',
+            field=models.ForeignKey(db_index=False, default=users.models.default_organization_id, on_delete=django.db.models.deletion.CASCADE, related_name='task_tombstones', to='users.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='tasktombstone',
+            index=models.Index(fields=['organization', 'id'], name='tombstone_org_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasktombstone',
+            index=models.Index(fields=['organization', 'assigned_to', 'id'], name='tombstone_org_assignee_idx'),
+        ),
+    ]
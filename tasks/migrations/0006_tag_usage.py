@@ -0,0 +1,38 @@
+# Generated by Django 4.2.15 on 2026-10-19 03:20
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+def backfill_usage_count(apps, schema_editor):
+    Tag = apps.get_model('tasks', 'Tag')
+    TaskTag = apps.get_model('tasks', 'Task').tags.through
+    links = (
+        TaskTag.objects.filter(tag_id=models.OuterRef('pk'))
+        .values('tag_id').annotate(count=models.Count('*')).values('count')
+    )
+    Tag.objects.update(usage_count=django.db.models.functions.Coalesce(models.Subquery(links), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_usage_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(models.F('organization'), django.db.models.functions.text.Lower('name'), name='tag_org_lower_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['organization', '-usage_count', 'name'], name='tag_org_usage_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    Turns the auto-created Task.tags table into the explicit TaskTag model.
+
+    The table, its columns and indexes stay as they are; only the migration state
+    learns about the model. Then the single-column indexes, both covered by a
+    composite one, are replaced with a (tag, task) index.
+    """
+
+    dependencies = [
+        ('tasks', '0006_tag_usage'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='TaskTag',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.task')),
+                        ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tasks.tag')),
+                    ],
+                    options={
+                        'db_table': 'tasks_task_tags',
+                        'unique_together': {('task', 'tag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='task',
+                    name='tags',
+                    field=models.ManyToManyField(blank=True, related_name='tasks', through='tasks.TaskTag', to='tasks.tag'),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='tasktag',
+            name='tag',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tasks.tag'),
+        ),
+        migrations.AlterField(
+            model_name='tasktag',
+            name='task',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tasks.task'),
+        ),
+        migrations.AddIndex(
+            model_name='tasktag',
+            index=models.Index(fields=['tag', 'task'], name='tasktag_tag_task_idx'),
+        ),
+    ]
@@ -1,12 +1,44 @@
 
 from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
+
+from users.models import Organization, default_organization_id
+
+
+def tenant_field(related_name, db_index=False):
+    # Not indexed on its own: every model leads its composite indexes with it.
+    return models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name=related_name,
+        default=default_organization_id, db_index=db_index,
+    )
 
 
 
 
 class Tag(models.Model):
-    name = models.CharField(max_length=50, unique=True)
+    organization = tenant_field('tags')
+    name = models.CharField(max_length=50)
+    # Tasks carrying the tag; ranks autocomplete results (see tasks/tags.py).
+    usage_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'name'], name='tag_org_name_uniq'),
+        ]
+        indexes = [
+            # Case-insensitive prefix search as a range on LOWER(name).
+            models.Index(F('organization'), Lower('name'), name='tag_org_lower_name_idx'),
+            models.Index(fields=['organization', '-usage_count', 'name'], name='tag_org_usage_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets post_save invalidate the cached id of the old name on a rename (see tasks/tags.py).
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
 
     def __str__(self):
         return self.name
@@ -18,6 +50,7 @@ class Task(models.Model):
         ('COMPLETED', 'Completed'),
     ]
 
+    organization = tenant_field('tasks')
     title = models.CharField(max_length=255)
     description = models.TextField()
     due_date = models.DateField(null=True, blank=True) 
@@ -25,20 +58,145 @@ class Task(models.Model):
     assigned_to = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='tasks')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_tasks')
     created_at = models.DateTimeField(auto_now_add=True)
-    tags = models.ManyToManyField(Tag, related_name='tasks', blank=True)
+    # Bumped on every save and by bulk updates; drives /api/tasks/changes/ (see tasks/sync.py).
+    updated_at = models.DateTimeField(auto_now=True)
+    tags = models.ManyToManyField(Tag, through='TaskTag', related_name='tasks', blank=True)
 
+    class Meta:
+        indexes = [
+            # Tenant-leading, so each organization's queries only touch its own rows.
+            models.Index(fields=['organization', 'status', 'due_date'], name='task_org_status_due_idx'),
+            models.Index(fields=['organization', 'assigned_to', 'status'], name='task_org_assignee_idx'),
+            models.Index(fields=['organization', 'due_date', '-id'], name='task_org_due_date_idx'),
+            models.Index(fields=['organization', 'updated_at', 'id'], name='task_org_updated_idx'),
+            models.Index(fields=['organization', 'assigned_to', 'updated_at', 'id'], name='task_org_assignee_updated_idx'),
+            # Matches the (cross-tenant) admin changelist ordering (due_date, then -pk as a tiebreaker).
+            models.Index(fields=['due_date', '-id'], name='task_due_date_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets post_save tell a reassignment and record it for the previous assignee (see signals.py).
+        instance._loaded_assigned_to_id = instance.__dict__.get('assigned_to_id')
+        return instance
 
+    def save(self, *args, update_fields=None, **kwargs):
+        # auto_now is only written when the field is saved; partial saves are changes too.
+        # An empty update_fields saves nothing, so it stays empty.
+        if update_fields:
+            update_fields = {*update_fields, 'updated_at'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class TaskTag(models.Model):
+    """
+    The links behind ``Task.tags``, kept in the table Django originally created for them.
+
+    Declared explicitly to index the tag side: ``(tag, task)`` finds the tasks carrying a
+    tag from the index alone, and ``(task, tag)`` (the unique constraint) a task's tags.
+    """
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, db_index=False)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        db_table = 'tasks_task_tags'
+        unique_together = [('task', 'tag')]
+        indexes = [
+            models.Index(fields=['tag', 'task'], name='tasktag_tag_task_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id}: {self.tag_id}"
+
+
+class TaskTombstone(models.Model):
+    """
+    Records a task leaving someone's view, for clients syncing through /api/tasks/changes/.
+
+    ``assigned_to`` is the assignee the task was removed from: for ``reassigned`` the previous
+    one, otherwise the assignee at the time. Pruned after ``TASK_TOMBSTONE_RETENTION_DAYS``.
+    """
+    DELETED = 'deleted'
+    ARCHIVED = 'archived'
+    REASSIGNED = 'reassigned'
+    REASON_CHOICES = [
+        (DELETED, 'Deleted'),
+        (ARCHIVED, 'Archived'),
+        (REASSIGNED, 'Reassigned'),
+    ]
+
+    organization = tenant_field('task_tombstones')
+    task_id = models.BigIntegerField()
+    assigned_to = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'id'], name='tombstone_org_idx'),
+            models.Index(fields=['organization', 'assigned_to', 'id'], name='tombstone_org_assignee_idx'),
+        ]
+
+    def __str__(self):
+        return f"Task {self.task_id} {self.reason}"
 
 
 class Comment(models.Model):
+    organization = tenant_field('comments')
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', 'created_at', 'id'], name='comment_task_created_idx'),
+            models.Index(fields=['organization', 'created_at', 'id'], name='comment_org_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Comment by {self.user} on {self.task}"
+
+class ArchivedTask(models.Model):
+    """
+    A completed task moved out of the hot `tasks_task` table (see tasks/archive.py).
+
+    Keeps the original task id so that it can be restored unchanged.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    organization = tenant_field('archived_tasks')
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    due_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES)
+    assigned_to = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_tasks')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    tags = models.ManyToManyField(Tag, related_name='archived_tasks', blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'assigned_to', '-archived_at', '-id'], name='archivedtask_assignee_idx'),
+            models.Index(fields=['organization', '-archived_at', '-id'], name='archivedtask_archived_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedComment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    organization = tenant_field('archived_comments', db_index=True)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='comments')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    content = models.TextField()
+    created_at = models.DateTimeField()
+
     def __str__(self):
-        return f"Comment by {self.user} on {self.task}"
\ No newline at end of file
+        return f"Archived comment by {self.user} on {self.task}"
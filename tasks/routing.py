@@ -1,5 +1,6 @@
 from django.urls import path
-from .consumers import NotificationConsumer
+from users.authentication import JWTAuthMiddleware
+from .consumers import NotificationConsumer, NotificationStreamConsumer
 
 
 
@@ -7,3 +8,9 @@ from .consumers import NotificationConsumer
 websocket_urlpatterns = [
     path('ws/notifications/<int:user_id>/', NotificationConsumer.as_asgi()),
 ]
+
+# Served by Channels rather than Django: the stream stays open for as long as the client listens.
+http_urlpatterns = [
+    path('api/notifications/stream/', JWTAuthMiddleware(NotificationStreamConsumer.as_asgi()),
+         name='notification-stream'),
+]
@@ -2,26 +2,112 @@
 from rest_framework import serializers
 from .models import * 
 from django.contrib.auth import get_user_model
+from core.instrumentation import TimedListSerializer, TimedSerializerMixin
 
 User = get_user_model()
 
 
+class TenantScopedFieldsMixin:
+    """
+    Limits the choices of the related fields in ``tenant_scoped_fields`` to the requesting user's organization.
+    """
+    tenant_scoped_fields = ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return fields
+        for name in self.tenant_scoped_fields:
+            field = fields.get(name)
+            if field is not None and not field.read_only:
+                field.queryset = field.queryset.filter(organization_id=request.user.organization_id)
+        return fields
+
+
+class ChangedFieldsUpdateMixin:
+    """
+    Saves only the columns an update actually changes.
+
+    ``ModelSerializer.update`` rewrites every column, so receivers can't tell what changed and
+    unchanged rows are written anyway. Here, values equal to the loaded ones are dropped, the
+    rest are saved with ``update_fields``, and an update that changes nothing skips the write
+    (and its signals) altogether. The changed field names are left in ``changed_fields``.
+    """
+
+    def update(self, instance, validated_data):
+        opts = instance._meta
+        changed, many_to_many = [], {}
+        for name, value in validated_data.items():
+            field = opts.get_field(name)
+            if field.many_to_many:
+                many_to_many[name] = value
+                continue
+            current = getattr(instance, field.attname)
+            new = value.pk if field.is_relation and value is not None else value
+            if current != new:
+                setattr(instance, name, value)
+                changed.append(name)
+        if changed:
+            instance.save(update_fields=changed)
+        for name, value in many_to_many.items():
+            getattr(instance, name).set(value)
+        self.changed_fields = changed
+        return instance
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'name']
 
-class TaskSerializer(serializers.ModelSerializer):
+class TagUsageSerializer(TagSerializer):
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['usage_count']
+
+
+class TaskSerializer(ChangedFieldsUpdateMixin, TenantScopedFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
+    tenant_scoped_fields = ('assigned_to',)
 
     class Meta:
         model = Task
-        fields = ['id', 'title', 'description', 'due_date', 'status', 'assigned_to', 'created_by', 'created_at', 'tags']
+        fields = ['id', 'title', 'description', 'due_date', 'status', 'assigned_to', 'created_by', 'created_at', 'updated_at', 'tags']
+        # Set by perform_create; it decides who may delete the task.
+        read_only_fields = ['created_by']
+        list_serializer_class = TimedListSerializer
 
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(ChangedFieldsUpdateMixin, TenantScopedFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    tenant_scoped_fields = ('task',)
+
     class Meta:
         model = Comment
         fields = ['id', 'task', 'user', 'content', 'created_at']
-        read_only_fields = ['created_at', 'user']
\ No newline at end of file
+        read_only_fields = ['created_at', 'user']
+        list_serializer_class = TimedListSerializer
+
+
+class ArchivedCommentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedComment
+        fields = ['id', 'user', 'content', 'created_at']
+
+
+class ArchivedTaskSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    tags = TagSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedTask
+        fields = ['id', 'title', 'description', 'due_date', 'status', 'assigned_to', 'created_by', 'created_at', 'archived_at', 'tags']
+        read_only_fields = fields
+        list_serializer_class = TimedListSerializer
+
+
+class ArchivedTaskDetailSerializer(ArchivedTaskSerializer):
+    comments = ArchivedCommentSerializer(many=True, read_only=True)
+
+    class Meta(ArchivedTaskSerializer.Meta):
+        fields = ArchivedTaskSerializer.Meta.fields + ['comments']
+        read_only_fields = fields
@@ -1,52 +1,211 @@
-from django.db.models.signals import post_save
+import asyncio
+import time
+
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from .models import Task
+from .models import Task, TaskTombstone, Tag, Comment
 from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from core.instrumentation import timer
+from core.tenancy import TenantCache, get_tenant_channel_layer, tenant_group
+from .sync import record_removals
+from .tags import add_usage, recount_usage, tag_cache, tag_key, top_tags
+
+
+def user_group(organization_id, user_id):
+    return tenant_group(organization_id, f"user_{user_id}")
+
+def _last_id_key(user_id):
+    return f"notifications:{user_id}:last"
+
+def _replay_key(user_id, event_id):
+    return f"notifications:{user_id}:{event_id}"
+
+def remember_notification(organization_id, user_id, event):
+    """
+    Gives `event` the user's next id and keeps it for `NOTIFICATION_REPLAY_TTL` seconds, so that
+    streams resuming with Last-Event-ID (see NotificationStreamConsumer) can catch up.
+    """
+    cache = TenantCache(organization_id)
+    # Ids come from an atomic counter, so workers never hand out the same one. It starts at the
+    # current time in microseconds: a counter lost from the cache restarts above the ids clients
+    # already saw, and the ids stay small enough for JavaScript numbers.
+    event['id'] = cache.incr(_last_id_key(user_id), initial=time.time_ns() // 1000)
+    if settings.NOTIFICATION_REPLAY_SIZE:
+        cache.set(_replay_key(user_id, event['id']), event, settings.NOTIFICATION_REPLAY_TTL)
+    return event
+
+def replay_notifications(organization_id, user_id, after_id):
+    """
+    Returns the user's remembered events newer than `after_id`, oldest first; at most
+    the last `NOTIFICATION_REPLAY_SIZE`.
+    """
+    cache = TenantCache(organization_id)
+    last_id = cache.get(_last_id_key(user_id))
+    if last_id is None or not settings.NOTIFICATION_REPLAY_SIZE:
+        return []
+    first_id = max(after_id + 1, last_id - settings.NOTIFICATION_REPLAY_SIZE + 1)
+    found = cache.get_many([_replay_key(user_id, event_id) for event_id in range(first_id, last_id + 1)])
+    return sorted(found.values(), key=lambda event: event['id'])
+
+def task_group(organization_id, task_id):
+    return tenant_group(organization_id, f"task_{task_id}")
+
+def publish_task_event(organization_id, task_id, event, **data):
+    """
+    Sends `event` (e.g. "comment.created") to the connections subscribed to the task.
+
+    Deletions are published by the views rather than from post_delete receivers, which
+    would stop Django from fast-deleting tasks and comments in bulk (e.g. when archiving).
+    """
+    publish_task_events([(organization_id, task_id, event, data)])
+
+def publish_task_events(events):
+    """
+    Publishes several task events with a single round trip to the event loop.
+
+    `events` is an iterable of (organization_id, task_id, event, data) tuples, each sent
+    as `publish_task_event(organization_id, task_id, event, **data)` would.
+    """
+    async def send_all():
+        await asyncio.gather(*(
+            get_tenant_channel_layer(organization_id).group_send(task_group(organization_id, task_id), {
+                'type': 'task.event',
+                'event': event,
+                'task_id': task_id,
+                **data,
+            })
+            for organization_id, task_id, event, data in events
+        ))
+
+    with timer('channel'):
+        async_to_sync(send_all)()
+
+def task_payload(task):
+    return {
+        'title': task.title,
+        'status': task.status,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'assigned_to': task.assigned_to_id,
+    }
 
-def notify(group_name, message):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(group_name, {
+def notify(organization_id, user_id, message):
+    channel_layer = get_tenant_channel_layer(organization_id)
+    event = remember_notification(organization_id, user_id, {
         'type': 'send_notification',
         'message': message['message'],
         'task_id': message['task_id'],
         'task_title': message['task_title'],
         'status': message['status'],
     })
+    with timer('channel'):
+        async_to_sync(channel_layer.group_send)(user_group(organization_id, user_id), event)
+
+def notify_bulk(message, tasks, batch_size=100):
+    """
+    Sends one notification per assignee for a batch of tasks changed in bulk.
+
+    `tasks` is an iterable of (organization_id, assigned_to_id, task_id, title, status) tuples;
+    tasks without an assignee are skipped. Each user gets at most one message per `batch_size` tasks.
+    """
+    by_user = {}
+    for organization_id, assigned_to_id, task_id, title, status in tasks:
+        if assigned_to_id is not None:
+            by_user.setdefault((organization_id, assigned_to_id), []).append(
+                {'task_id': task_id, 'task_title': title, 'status': status}
+            )
+
+    for (organization_id, user_id), user_tasks in by_user.items():
+        channel_layer = get_tenant_channel_layer(organization_id)
+        for start in range(0, len(user_tasks), batch_size):
+            event = remember_notification(organization_id, user_id, {
+                'type': 'send_bulk_notification',
+                'message': message,
+                'tasks': user_tasks[start:start + batch_size],
+            })
+            with timer('channel'):
+                async_to_sync(channel_layer.group_send)(user_group(organization_id, user_id), event)
+
+def changed_fields(update_fields):
+    """
+    Returns the fields a save changed, or None for a full save, where every column is written.
+    """
+    if update_fields is None:
+        return None
+    return sorted(set(update_fields) - {'updated_at'})
 
 @receiver(post_save, sender=Task)
 def task_changes(sender, instance, created, update_fields=None, **kwargs):
-    assigned_user = instance.assigned_to
+    assigned_user_id = instance.assigned_to_id
+
+    def send(text):
+        notify(instance.organization_id, assigned_user_id, {
+            "message": text,
+            "task_id": instance.id,
+            "task_title": instance.title,
+            "status": instance.status,
+        })
 
     if created:
-        if assigned_user:
-            notify(f"user_{assigned_user.id}", {
-                "message": "You have been assigned a new task.",
-                "task_id": instance.id,
-                "task_title": instance.title,
-                "status": instance.status,
-            })
+        if assigned_user_id:
+            send("You have been assigned a new task.")
     else:
-        if update_fields:
-            if 'assigned_to' in update_fields and assigned_user:
-                notify(f"user_{assigned_user.id}", {
-                    "message": "Task assignment has been changed.",
-                    "task_id": instance.id,
-                    "task_title": instance.title,
-                    "status": instance.status,
-                })
-            elif 'status' in update_fields and assigned_user:
-                notify(f"user_{assigned_user.id}", {
-                    "message": "Task status has been updated.",
-                    "task_id": instance.id,
-                    "task_title": instance.title,
-                    "status": instance.status,
-                })
+        previous_user_id = getattr(instance, '_loaded_assigned_to_id', None)
+        if previous_user_id is not None and previous_user_id != assigned_user_id:
+            record_removals([(instance.organization_id, instance.id, previous_user_id)], TaskTombstone.REASSIGNED)
+        # TaskSerializer saves only the columns that changed (see ChangedFieldsUpdateMixin).
+        changed = changed_fields(update_fields)
+        publish_task_event(instance.organization_id, instance.id, 'task.updated',
+                           task=task_payload(instance), changed=changed)
+        if assigned_user_id:
+            if changed and 'assigned_to' in changed:
+                send("Task assignment has been changed.")
+            elif changed and 'status' in changed:
+                send("Task status has been updated.")
+            else:
+                send("Task has been updated.")
+    instance._loaded_assigned_to_id = assigned_user_id
+
+@receiver(post_save, sender=Comment)
+def comment_changes(sender, instance, created, **kwargs):
+    publish_task_event(instance.organization_id, instance.task_id, 'comment.created' if created else 'comment.updated', comment={
+        'id': instance.id,
+        'user': instance.user_id,
+        'content': instance.content,
+        'created_at': instance.created_at.isoformat(),
+    })
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def tag_usage_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps Tag.usage_count in step with task.tags (and tag.tasks) changes.
+
+    post_add only reports links that didn't exist yet, so additions are counted in place;
+    removals report whatever ids were passed, so the affected tags are recounted instead.
+    """
+    if action == 'post_add' and pk_set:
+        if reverse:
+            add_usage([instance.pk], len(pk_set))
         else:
-            if assigned_user:
-                notify(f"user_{assigned_user.id}", {
-                    "message": "Task has been updated.",
-                    "task_id": instance.id,
-                    "task_title": instance.title,
-                    "status": instance.status,
-                })
+            add_usage(pk_set)
+    elif action == 'post_remove' and pk_set:
+        recount_usage([instance.pk] if reverse else pk_set)
+    elif action == 'pre_clear' and not reverse:
+        instance._cleared_tag_ids = list(instance.tags.values_list('id', flat=True))
+    elif action == 'post_clear':
+        recount_usage([instance.pk] if reverse else instance.__dict__.pop('_cleared_tag_ids', []))
+
+@receiver(post_save, sender=Tag)
+def tag_created(sender, instance, created, **kwargs):
+    # New tags are otherwise missing from this worker's autocomplete until the top list expires.
+    if created:
+        top_tags.invalidate(instance.organization_id)
+        # In case a deleted tag of the same name is still cached (e.g. the database was reset).
+        tag_cache.invalidate(tag_key(instance.organization_id, instance.name))
+    elif getattr(instance, '_loaded_name', instance.name) != instance.name:
+        tag_cache.invalidate(tag_key(instance.organization_id, instance._loaded_name))
+        instance._loaded_name = instance.name
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    tag_cache.invalidate(tag_key(instance.organization_id, instance.name))
@@ -0,0 +1,187 @@
+"""
+Delta sync for clients that keep local copies of their tasks.
+
+``/api/tasks/changes/?since=<cursor>`` returns the tasks created or updated since
+the cursor, ordered by ``Task.updated_at``. It also returns the ids of tasks that
+left the user's view since then: deleted, archived, or reassigned to someone else.
+Those are recorded as ``TaskTombstone`` rows by ``record_removals``. Both lookups
+use tenant-leading indexes, so a sync reads rows in proportion to what changed,
+not to how many tasks exist.
+
+Rows are only considered final ``TASK_SYNC_SETTLE_SECONDS`` after they change,
+because a transaction that started earlier may still commit an older
+``updated_at``. Cursors never move past that point. Recent changes can therefore
+be sent twice, but none are skipped.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TaskTombstone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class SyncCursor:
+    """
+    A position in the change feed, encoded as ``<updated_at in µs>.<task id>.<tombstone id>``.
+
+    Attributes:
+    updated_at: ``updated_at`` of the last task returned.
+    task_id: Its id, breaking ties between tasks updated in the same microsecond.
+    tombstone_id: The last tombstone returned.
+    """
+
+    def __init__(self, updated_at=EPOCH, task_id=0, tombstone_id=0):
+        self.updated_at = updated_at
+        self.task_id = task_id
+        self.tombstone_id = tombstone_id
+
+    @classmethod
+    def decode(cls, value):
+        """
+        Raises:
+        ValueError
+            If ``value`` isn't a cursor returned by ``encode``.
+        """
+        micros, task_id, tombstone_id = (int(part) for part in value.split('.'))
+        if min(micros, task_id, tombstone_id) < 0:
+            raise ValueError(value)
+        try:
+            return cls(EPOCH + micros * MICROSECOND, task_id, tombstone_id)
+        except OverflowError:
+            # Past datetime.max.
+            raise ValueError(value)
+
+    def encode(self):
+        return f'{(self.updated_at - EPOCH) // MICROSECOND}.{self.task_id}.{self.tombstone_id}'
+
+    @property
+    def is_initial(self):
+        return self.updated_at == EPOCH and not self.task_id and not self.tombstone_id
+
+
+class SyncPage:
+    """
+    One page of the change feed.
+
+    Attributes:
+    changed: Tasks created or updated since the cursor.
+    removed: Ids of tasks that left the user's view.
+    cursor: The ``SyncCursor`` to pass as ``since`` next time.
+    has_more: True if another request would return more changes right away.
+    """
+
+    def __init__(self, changed, removed, cursor, has_more):
+        self.changed = changed
+        self.removed = removed
+        self.cursor = cursor
+        self.has_more = has_more
+
+
+def record_removals(tasks, reason):
+    """
+    Records tombstones for ``(organization_id, task_id, assigned_to_id)`` tuples with a single INSERT.
+    """
+    tombstones = [
+        TaskTombstone(organization_id=organization_id, task_id=task_id, assigned_to_id=assigned_to_id, reason=reason)
+        for organization_id, task_id, assigned_to_id in tasks
+    ]
+    TaskTombstone.objects.bulk_create(tombstones)
+    return len(tombstones)
+
+
+def visible_tombstones(user):
+    """
+    Returns the tombstones relevant to ``user``, mirroring how tasks are scoped for them.
+
+    Staff see every task of their organization, so only deletions and archivals remove
+    a task from their view. Other users also lose tasks reassigned away from them.
+    """
+    tombstones = TaskTombstone.objects.filter(organization_id=user.organization_id)
+    if user.is_staff:
+        return tombstones.exclude(reason=TaskTombstone.REASSIGNED)
+    return tombstones.filter(assigned_to=user)
+
+
+def is_expired(cursor):
+    """
+    True if tombstones the cursor still needs may have been pruned; the client must resync.
+    """
+    retention = timedelta(days=settings.TASK_TOMBSTONE_RETENTION_DAYS)
+    return not cursor.is_initial and cursor.updated_at < timezone.now() - retention
+
+
+def changed_after(tasks, cursor):
+    """
+    Returns ``tasks`` updated after ``cursor`` in feed order.
+    """
+    # The leading `updated_at >= ...` lets the database seek the index instead of scanning it.
+    return tasks.filter(
+        Q(updated_at__gte=cursor.updated_at),
+        Q(updated_at__gt=cursor.updated_at) | Q(id__gt=cursor.task_id),
+    ).order_by('updated_at', 'id')
+
+
+def removed_after(tombstones, cursor):
+    """
+    Returns ``tombstones`` recorded after ``cursor`` in feed order.
+    """
+    return tombstones.filter(id__gt=cursor.tombstone_id).order_by('id')
+
+
+def changes_since(tasks, tombstones, cursor, limit):
+    """
+    Returns the ``SyncPage`` of ``tasks`` and ``tombstones`` (both already scoped to the user) after ``cursor``.
+    """
+    settled = timezone.now() - timedelta(seconds=settings.TASK_SYNC_SETTLE_SECONDS)
+
+    changed = list(changed_after(tasks, cursor)[:limit + 1])
+    more_tasks = len(changed) > limit
+    changed = changed[:limit]
+    if more_tasks and changed[-1].updated_at <= settled:
+        updated_at, task_id = changed[-1].updated_at, changed[-1].id
+    else:
+        # Everything up to `settled` has been returned; unsettled rows are sent again next time.
+        more_tasks = False
+        updated_at, task_id = max((settled, 0), (cursor.updated_at, cursor.task_id))
+
+    removed = list(removed_after(tombstones, cursor).values_list('id', 'task_id', 'created_at')[:limit + 1])
+    more_tombstones = len(removed) > limit
+    removed = removed[:limit]
+    tombstone_id = cursor.tombstone_id
+    for row_id, _, created_at in removed:
+        if created_at > settled:
+            more_tombstones = False
+            break
+        tombstone_id = row_id
+
+    removed_ids = {task_id for _, task_id, _ in removed}
+    if removed_ids:
+        # A task reassigned back, or restored from the archive, is visible again: not removed.
+        removed_ids -= set(tasks.filter(id__in=removed_ids).prefetch_related(None).values_list('id', flat=True))
+
+    return SyncPage(
+        changed=changed,
+        removed=sorted(removed_ids),
+        cursor=SyncCursor(updated_at, task_id, tombstone_id),
+        has_more=more_tasks or more_tombstones,
+    )
+
+
+def prune_tombstones(older_than=None):
+    """
+    Deletes tombstones older than ``TASK_TOMBSTONE_RETENTION_DAYS``.
+
+    Returns:
+    int
+        The number of tombstones deleted.
+    """
+    if older_than is None:
+        older_than = timedelta(days=settings.TASK_TOMBSTONE_RETENTION_DAYS)
+    deleted, _ = TaskTombstone.objects.filter(created_at__lt=timezone.now() - older_than).delete()
+    return deleted
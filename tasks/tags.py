@@ -0,0 +1,164 @@
+"""
+Tag autocomplete ranked by popularity.
+
+``Tag.usage_count`` is the number of tasks carrying the tag. It is kept up to
+date by the ``m2m_changed`` receiver in ``signals.py`` when ``task.tags``
+changes, and by ``recount_usage`` where links are added or removed in bulk
+without signals (task deletion, archival and restore, seeding).
+
+``search_tags`` answers ``/api/tags/?q=<prefix>``. Each worker keeps an
+organization's ``TAG_TOP_N`` most used tags in memory (``top_tags``). If that
+list already holds ``limit`` matches for the prefix, no other tag can rank
+higher, so short and common prefixes are answered without a query. Otherwise
+the prefix is read as a range of the ``(organization, LOWER(name))`` index, and
+at most ``TAG_SEARCH_SCAN_LIMIT`` of those long-tail matches are ranked.
+
+``tag_ids`` resolves tag names to ids through ``tag_cache`` (see
+``core/caching.py``); renaming or deleting a tag invalidates its name.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce, Lower
+
+from core.caching import TwoTierCache
+from .models import Tag, Task
+
+# Sorts after every character, so [prefix, prefix + MAX_CHAR) holds exactly the names starting with prefix.
+MAX_CHAR = '\U0010ffff'
+TAG_FIELDS = ('id', 'name', 'usage_count')
+
+
+def add_usage(tag_ids, count=1):
+    """
+    Adds ``count`` to the usage of the given tags with a single UPDATE.
+    """
+    Tag.objects.filter(id__in=tag_ids).update(usage_count=F('usage_count') + count)
+
+
+def recount_usage(tag_ids):
+    """
+    Recomputes the usage of the given tags from the task/tag links.
+
+    ``tag_ids`` may be a queryset (e.g. ``tags_of(...)``), which is run as a subquery.
+    """
+    if not isinstance(tag_ids, QuerySet):
+        tag_ids = list(tag_ids)
+        if not tag_ids:
+            return
+    links = (
+        Task.tags.through.objects.filter(tag_id=OuterRef('pk'))
+        .values('tag_id').annotate(count=Count('*')).values('count')
+    )
+    Tag.objects.filter(id__in=tag_ids).update(usage_count=Coalesce(Subquery(links), 0))
+
+
+def tags_of(task_ids):
+    """
+    Returns a queryset of the ids of the tags linked to the given tasks.
+    """
+    return Task.tags.through.objects.filter(task_id__in=task_ids).values_list('tag_id', flat=True)
+
+
+tag_cache = TwoTierCache('tags')
+
+
+def tag_key(organization_id, name):
+    return f'{organization_id}:{name}'
+
+
+def tag_ids(organization_id, names):
+    """
+    Returns ``{name: id}`` for the tags of the organization among ``names``; unknown names are left out.
+    """
+    keys = {tag_key(organization_id, name): name for name in names}
+
+    def load(missing):
+        rows = Tag.objects.filter(
+            organization_id=organization_id, name__in=[keys[key] for key in missing],
+        ).values_list('name', 'id')
+        return {tag_key(organization_id, name): tag_id for name, tag_id in rows}
+
+    return {keys[key]: tag_id for key, tag_id in tag_cache.get_many(list(keys), load).items()}
+
+
+def _ranked(organization_id):
+    return (
+        Tag.objects.filter(organization_id=organization_id)
+        .annotate(lower_name=Lower('name'))
+        .order_by('-usage_count', 'name')
+        .values(*TAG_FIELDS, 'lower_name')
+    )
+
+
+class TopTags:
+    """
+    Each organization's ``TAG_TOP_N`` most used tags, kept in this process for ``TAG_TOP_CACHE_SECONDS``.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, organization_id):
+        entry = self._entries.get(organization_id)
+        if entry is None or entry[0] < time.monotonic():
+            entry = (
+                time.monotonic() + settings.TAG_TOP_CACHE_SECONDS,
+                list(_ranked(organization_id)[:settings.TAG_TOP_N]),
+            )
+            with self._lock:
+                self._entries[organization_id] = entry
+        return entry[1]
+
+    def invalidate(self, organization_id=None):
+        with self._lock:
+            if organization_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(organization_id, None)
+
+
+top_tags = TopTags()
+
+
+def search_tags(organization_id, prefix='', limit=None):
+    """
+    Returns up to ``limit`` tags whose name starts with ``prefix`` (case-insensitively), most used first.
+
+    Returns:
+    list
+        ``{'id', 'name', 'usage_count'}`` dicts.
+    """
+    limit = limit or settings.TAG_SEARCH_LIMIT
+    prefix = prefix.strip().lower()
+    top = top_tags(organization_id)
+    matches = [tag for tag in top if tag['lower_name'].startswith(prefix)][:limit]
+    # Done if the most used tags hold `limit` matches, or if the list holds every tag of the organization.
+    if len(matches) < limit and len(top) >= settings.TAG_TOP_N:
+        # The other matches are used less than any top tag. Rank the first TAG_SEARCH_SCAN_LIMIT
+        # of them in name order, which the index returns without sorting.
+        found = {tag['id'] for tag in matches}
+        candidates = [
+            tag for tag in search_queryset(organization_id, prefix)[:settings.TAG_SEARCH_SCAN_LIMIT]
+            if tag['id'] not in found
+        ]
+        candidates.sort(key=lambda tag: (-tag['usage_count'], tag['name']))
+        matches += candidates[:limit - len(matches)]
+    return [{field: tag[field] for field in TAG_FIELDS} for tag in matches]
+
+
+def search_queryset(organization_id, prefix):
+    """
+    Returns the tags of the organization whose lowercased name starts with ``prefix``, in index order.
+    """
+    return (
+        Tag.objects.filter(organization_id=organization_id)
+        .annotate(lower_name=Lower('name'))
+        .filter(lower_name__gte=prefix, lower_name__lt=prefix + MAX_CHAR)
+        .order_by('lower_name')
+        .values(*TAG_FIELDS, 'lower_name')
+    )
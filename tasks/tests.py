@@ -0,0 +1,1146 @@
+import asyncio
+import itertools
+import json
+import logging
+import tempfile
+from io import StringIO
+from unittest import mock
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from asgiref.testing import ApplicationCommunicator
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.conf import settings
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.asgi import application
+from core.batch import BatchRetrieveMixin
+from core.idempotency import IdempotencyStore
+from core.importtime import profile_import
+from core.logs import RECORDS, JSONFormatter, QueueLogHandler, RequestContextFilter, SamplingFilter
+from core.metrics import REGISTRY
+from core.query_budget import QueryBudgetTestMixin, QueryCounter
+from core.tenancy import TenantCache, tenant_group
+from core.throttling import DECISIONS
+from users import urls as user_urls
+from users.models import Organization, User
+from . import urls as task_urls
+from .models import Task, Tag, Comment, ArchivedTask
+from .archive import archivable_tasks, archive_batch, archive_completed_tasks, restore_tasks
+from .explain import analyze_plan
+from .consumers import StreamHeartbeats
+from .signals import notify, remember_notification, replay_notifications, task_group, user_group
+from .tags import tag_ids, top_tags
+from .benchmarks import (
+    TASK_URL_NAMES,
+    USER_URL_NAMES,
+    build_scenarios,
+    compare_reports,
+    run_scenarios,
+    seed_dataset,
+)
+
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BenchmarkSuiteTests(TransactionTestCase):
+    # The ASGI transport serves requests on another thread, so seeded rows must be committed.
+    # The default organization is created by a migration; restore it after each flush.
+    serialized_rollback = True
+
+    def setUp(self):
+        seed_dataset(20, user_count=5, tag_count=5, batch_size=10)
+
+    def test_scenarios_cover_every_endpoint(self):
+        names = {scenario.name for scenario in build_scenarios()}
+        routed = {pattern.name for pattern in [*task_urls.urlpatterns, *user_urls.urlpatterns]}
+        self.assertEqual(names, routed)
+        self.assertEqual(set(TASK_URL_NAMES) | set(USER_URL_NAMES), routed)
+
+    def test_scenarios_run_through_client_and_asgi(self):
+        results = run_scenarios(build_scenarios(), iterations=2)
+        self.assertEqual(len(results), 2 * len(build_scenarios()))
+        for key, result in results.items():
+            self.assertEqual(result['iterations'], 2)
+            for code in result['statuses']:
+                self.assertLess(int(code), 400, key)
+
+
+class CompareReportsTests(TestCase):
+    baseline = {'scenarios': {'client:task-list-create:GET': {'p95_ms': 10.0, 'throughput_rps': 100.0}}}
+
+    def test_within_threshold(self):
+        current = {'scenarios': {'client:task-list-create:GET': {'p95_ms': 11.0, 'throughput_rps': 90.0}}}
+        self.assertEqual(compare_reports(current, self.baseline), [])
+
+    def test_p95_and_throughput_regressions(self):
+        current = {'scenarios': {'client:task-list-create:GET': {'p95_ms': 13.0, 'throughput_rps': 70.0}}}
+        self.assertEqual(len(compare_reports(current, self.baseline)), 2)
+
+
+@tag('query_budget')
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TaskQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('budget@gmail.com', 'budget', 'pass12345', is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.task = Task.objects.create(title='Target', description='d', assigned_to=self.user, created_by=self.user)
+        self.comment = Comment.objects.create(task=self.task, user=self.user, content='c')
+        self.counter = itertools.count()
+
+    def grow(self):
+        n = next(self.counter)
+        task = Task.objects.create(title=f'Task {n}', description='d', assigned_to=self.user, created_by=self.user)
+        tag_ = Tag.objects.create(name=f'tag-{n}')
+        task.tags.add(tag_)
+        self.task.tags.add(tag_)
+        Comment.objects.create(task=task, user=self.user, content='c')
+        Comment.objects.create(task=self.task, user=self.user, content='c')
+
+    def test_task_list(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('task-list-create')), self.grow)
+
+    def test_task_list_and_detail_with_includes(self):
+        params = {'include': 'comments,assignee,creator'}
+        self.assertQueryBudget(lambda: self.client.get(reverse('task-list-create'), params), self.grow)
+        self.assertQueryBudget(lambda: self.client.get(reverse('task-detail', args=[self.task.id]), params), self.grow)
+
+    def test_task_batch(self):
+        def ids():
+            return list(Task.objects.values_list('id', flat=True))
+
+        self.assertQueryBudget(
+            lambda task_ids: self.client.get(reverse('task-list-create'), {
+                'ids': ','.join(map(str, task_ids)), 'include': 'comments,assignee,creator',
+            }),
+            self.grow, prepare=ids,
+        )
+        self.assertQueryBudget(
+            lambda task_ids: self.client.post(reverse('task-batch'), {'ids': task_ids}, format='json'),
+            self.grow, prepare=ids,
+        )
+
+    def test_task_create(self):
+        url = reverse('task-list-create')
+        self.assertQueryBudget(
+            lambda: self.client.post(url, {'title': 't', 'description': 'd', 'assigned_to': self.user.id}),
+            self.grow,
+        )
+
+    def test_task_detail(self):
+        url = reverse('task-detail', args=[self.task.id])
+        self.assertQueryBudget(lambda: self.client.get(url), self.grow)
+        # Each PATCH changes the status: unchanged updates skip the write (see TaskUpdateTests).
+        statuses = itertools.cycle(['IN_PROGRESS', 'COMPLETED'])
+        self.assertQueryBudget(
+            lambda status: self.client.patch(url, {'status': status}), self.grow, prepare=lambda: next(statuses),
+        )
+
+    def test_task_delete(self):
+        def prepare():
+            task = Task.objects.create(title='Doomed', description='d', created_by=self.user)
+            task.tags.add(*Tag.objects.all())
+            Comment.objects.create(task=task, user=self.user, content='c')
+            return task
+
+        self.assertQueryBudget(
+            lambda task: self.client.delete(reverse('task-detail', args=[task.id])), self.grow, prepare=prepare,
+        )
+
+    def test_add_tags(self):
+        url = reverse('tag-list-create', args=[self.task.id])
+        names = iter(f'new-{n}' for n in itertools.count())
+        self.assertQueryBudget(
+            lambda tags: self.client.patch(url, {'tags': tags}, format='json'),
+            self.grow,
+            prepare=lambda: ['tag-0', next(names), next(names)],
+        )
+
+    def test_task_tag_list(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('task-tag-list-create')), self.grow)
+
+    def test_task_changes(self):
+        def grow():
+            self.grow()
+            doomed = Task.objects.create(title='Doomed', description='d', assigned_to=self.user)
+            self.client.delete(reverse('task-detail', args=[doomed.id]))
+
+        self.assertQueryBudget(lambda: self.client.get(reverse('task-changes')), grow)
+
+    def test_comments(self):
+        url = reverse('comment-list-create', args=[self.task.id])
+        self.assertQueryBudget(lambda: self.client.get(url), self.grow)
+        self.assertQueryBudget(lambda: self.client.post(url, {'task': self.task.id, 'content': 'c'}), self.grow)
+
+    def test_comment_detail(self):
+        url = reverse('comment-detail', args=[self.comment.id])
+        self.assertQueryBudget(lambda: self.client.get(url), self.grow)
+        contents = (f'edited {n}' for n in itertools.count())
+        self.assertQueryBudget(
+            lambda content: self.client.patch(url, {'content': content}), self.grow, prepare=lambda: next(contents),
+        )
+
+        self.assertQueryBudget(
+            lambda comment: self.client.delete(reverse('comment-detail', args=[comment.id])),
+            self.grow,
+            prepare=lambda: Comment.objects.create(task=self.task, user=self.user, content='c'),
+        )
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('timing@gmail.com', 'timing', 'pass12345')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_server_timing_header_and_metrics(self):
+        response = self.client.post(
+            reverse('task-list-create'), {'title': 't', 'description': 'd', 'assigned_to': self.user.id},
+        )
+        timing = response['Server-Timing']
+        for phase in ('total;dur=', 'db;dur=', 'auth;dur=', 'serializer;dur=', 'channel;dur='):
+            self.assertIn(phase, timing)
+
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{view="task-list-create",method="POST",status="201"', metrics)
+        self.assertIn('http_request_phase_duration_seconds_count{view="task-list-create",phase="auth"}', metrics)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='scrape-secret')
+    def test_metrics_are_only_served_to_scrapers(self):
+        client = Client()
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+        self.assertEqual(client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+
+
+class LoggingTests(TestCase):
+    def capture(self, queue_size=100):
+        stream = StringIO()
+        handler = QueueLogHandler(stream, queue_size)
+        handler.setFormatter(JSONFormatter())
+        handler.addFilter(RequestContextFilter())
+        self.addCleanup(handler.close)
+        return handler, stream
+
+    def lines(self, handler, stream):
+        handler.close()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    @override_settings(LOG_SAMPLE_RATES={})
+    def test_json_lines_with_request_context(self):
+        handler, stream = self.capture()
+        logger = logging.getLogger('core.access')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        response = self.client.get('/metrics', HTTP_X_REQUEST_ID='abc-123')
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        self.assertNotEqual(self.client.get('/metrics', HTTP_X_REQUEST_ID='bad id\n')['X-Request-ID'], 'bad id\n')
+
+        line = self.lines(handler, stream)[0]
+        self.assertEqual(line['message'], 'GET /metrics 200')
+        self.assertEqual((line['request_id'], line['method'], line['path'], line['status']),
+                         ('abc-123', 'GET', '/metrics', 200))
+        self.assertIn('duration_ms', line)
+        self.assertIn('elapsed_ms', line)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler, stream = self.capture(queue_size=1)
+        handler.listener.stop()  # Nothing drains the queue, as with a stuck sink.
+        logger = logging.getLogger('tests.logging')
+        logger.addHandler(handler)
+        logger.propagate = False
+        self.addCleanup(setattr, logger, 'propagate', True)
+        self.addCleanup(logger.removeHandler, handler)
+        dropped = RECORDS.value(level='WARNING', outcome='dropped')
+        logger.warning("kept %s", 1)
+        logger.warning("dropped %s", 2)
+        self.assertEqual(RECORDS.value(level='WARNING', outcome='dropped'), dropped + 1)
+
+        handler.listener.start()
+        self.assertEqual([line['message'] for line in self.lines(handler, stream)], ['kept 1'])
+
+    def test_sampling_only_applies_below_warning(self):
+        sampling = SamplingFilter(rates={'noisy': 0.0})
+        records = [logging.makeLogRecord({'name': name, 'levelno': level, 'levelname': logging.getLevelName(level)})
+                   for name, level in [('noisy.child', logging.INFO), ('noisy', logging.WARNING), ('quiet', logging.INFO)]]
+        self.assertEqual([sampling.filter(record) for record in records], [False, True, True])
+
+
+class ExplainPlanTests(TestCase):
+    def test_flags_scans_and_sorts(self):
+        plan = "3 0 0 SCAN tasks_task\n22 0 0 USE TEMP B-TREE FOR ORDER BY\n4 0 0 SCAN tasks_task USING INDEX task_due_date_idx"
+        self.assertEqual(
+            analyze_plan(plan, vendor='sqlite'),
+            [('full table scan', 'tasks_task'), ('temp B-tree', 'ORDER BY')],
+        )
+        self.assertEqual(
+            analyze_plan("Sort  (cost=1.0..2.0)\n  ->  Seq Scan on tasks_task", vendor='postgresql'),
+            [('sort', 'Sort'), ('full table scan', 'tasks_task')],
+        )
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TaskAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin@gmail.com', 'admin', 'pass12345')
+        self.member = User.objects.create_user('member@gmail.com', 'member', 'pass12345')
+        self.tasks = [
+            Task.objects.create(title=f'Task {n}', description='d', assigned_to=self.member) for n in range(3)
+        ]
+        self.client.force_login(self.admin)
+
+    def receive(self, user):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(user_group(user.organization_id, user.id), channel)
+        return lambda: async_to_sync(layer.receive)(channel)
+
+    def test_changelists_render(self):
+        for url in ('/admin/tasks/task/', f'/admin/tasks/task/{self.tasks[0].id}/change/',
+                    '/admin/tasks/comment/', '/admin/users/user/'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    def test_organization_filter_takes_a_slug(self):
+        other = Organization.objects.create(name='Other', slug='other')
+        Task.objects.create(organization=other, title='Elsewhere', description='d')
+        response = self.client.get('/admin/tasks/task/', {'organization': 'other', 'status__exact': 'TODO'})
+        self.assertEqual([task.title for task in response.context['cl'].result_list], ['Elsewhere'])
+        self.assertContains(response, '<input type="hidden" name="status__exact" value="TODO">', html=True)
+        response = self.client.get('/admin/tasks/task/', {'organization': 'default'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+
+    def test_bulk_status_change_is_one_update_and_one_notification(self):
+        receive = self.receive(self.member)
+        with QueryCounter() as counter:
+            self.client.post('/admin/tasks/task/', {
+                'action': 'mark_completed',
+                '_selected_action': [task.id for task in self.tasks],
+            })
+        self.assertEqual(Task.objects.filter(status='COMPLETED').count(), 3)
+        self.assertEqual(sum(sql.startswith('UPDATE "tasks_task"') for sql, _ in counter.queries), 1)
+        event = receive()
+        self.assertEqual(event['type'], 'send_bulk_notification')
+        self.assertEqual(len(event['tasks']), 3)
+
+    def test_bulk_update_publishes_the_full_task(self):
+        task = self.tasks[0]
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(task_group(task.organization_id, task.id), channel)
+        with mock.patch('tasks.signals.async_to_sync', wraps=async_to_sync) as blocking_calls:
+            self.client.post('/admin/tasks/task/', {
+                'action': 'mark_completed', '_selected_action': [task.id for task in self.tasks],
+            })
+        # One for the assignee's bulk notification, one for every task's event.
+        self.assertEqual(blocking_calls.call_count, 2)
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event['event'], 'task.updated')
+        self.assertEqual(event['task'], {
+            'title': task.title, 'status': 'COMPLETED', 'due_date': None, 'assigned_to': self.member.id,
+        })
+        self.assertEqual(event['changed'], ['status'])
+
+    def test_bulk_reassign(self):
+        other = User.objects.create_user('other@gmail.com', 'other', 'pass12345')
+        receive = self.receive(other)
+        self.client.post('/admin/tasks/task/', {
+            'action': 'reassign',
+            'assignee_email': other.email,
+            '_selected_action': [task.id for task in self.tasks[:2]],
+        })
+        self.assertEqual(Task.objects.filter(assigned_to=other).count(), 2)
+        self.assertEqual(len(receive()['tasks']), 2)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TaskIncludeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('boss@gmail.com', 'boss', 'pass12345', is_staff=True)
+        self.worker = User.objects.create_user('worker@gmail.com', 'worker', 'pass12345')
+        self.commenter = User.objects.create_user('commenter@gmail.com', 'commenter', 'pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tasks = [
+            Task.objects.create(title=f'Task {n}', description='d', assigned_to=self.worker, created_by=self.user)
+            for n in range(2)
+        ]
+        self.comment = Comment.objects.create(task=self.tasks[0], user=self.commenter, content='c')
+
+    def test_list_side_loads_each_resource_once(self):
+        response = self.client.get(reverse('task-list-create'), {'include': 'comments,assignee,creator'})
+        included = response.data['included']
+        self.assertEqual([comment['id'] for comment in included['comments']], [self.comment.id])
+        self.assertEqual(included['comment_counts'], {str(self.tasks[0].id): 1, str(self.tasks[1].id): 0})
+        self.assertEqual(
+            [user['username'] for user in included['users']], ['boss', 'worker', 'commenter'],
+        )
+        self.assertEqual(set(included['users'][0]), {'id', 'username', 'email'})
+
+    @override_settings(TASK_INCLUDE_COMMENTS_PER_TASK=2)
+    def test_only_the_latest_comments_are_included(self):
+        later = [Comment.objects.create(task=self.tasks[0], user=self.commenter, content=f'c{n}') for n in range(2)]
+        response = self.client.get(reverse('task-detail', args=[self.tasks[0].id]), {'include': 'comments'})
+        included = response.data['included']
+        self.assertEqual([comment['id'] for comment in included['comments']], [comment.id for comment in later])
+        self.assertEqual(included['comment_counts'], {str(self.tasks[0].id): 3})
+
+    def test_detail_includes_only_what_was_asked(self):
+        response = self.client.get(reverse('task-detail', args=[self.tasks[1].id]), {'include': 'assignee'})
+        self.assertEqual(response.data['title'], 'Task 1')
+        self.assertEqual(response.data['included'], {'users': [
+            {'id': self.worker.id, 'username': 'worker', 'email': 'worker@gmail.com'},
+        ]})
+        self.assertNotIn('included', self.client.get(reverse('task-detail', args=[self.tasks[1].id])).data)
+
+    def test_unknown_include_is_rejected(self):
+        response = self.client.get(reverse('task-list-create'), {'include': 'comments,secrets'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('include', response.data)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TaskBatchTests(TestCase):
+    def setUp(self):
+        acme = Organization.objects.create(name='Acme', slug='acme')
+        self.member = User.objects.create_user('member@gmail.com', 'member', 'pass12345')
+        other = User.objects.create_user('other@gmail.com', 'other', 'pass12345')
+        self.mine = [Task.objects.create(title=f'Mine {n}', description='d', assigned_to=self.member) for n in range(2)]
+        self.theirs = Task.objects.create(title='Theirs', description='d', assigned_to=other)
+        self.foreign = Task.objects.create(title='Foreign', description='d', organization=acme)
+        self.client = APIClient()
+        self.client.force_authenticate(self.member)
+
+    def test_get_reports_missing_and_forbidden_ids(self):
+        ids = [self.mine[1].id, self.theirs.id, self.foreign.id, 10 ** 9, self.mine[0].id, self.mine[1].id]
+        response = self.client.get(reverse('task-list-create'), {'ids': ','.join(map(str, ids))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([task['id'] for task in response.data['results']], [self.mine[1].id, self.mine[0].id])
+        self.assertEqual(response.data['missing'], [self.foreign.id, 10 ** 9])
+        self.assertEqual(response.data['forbidden'], [self.theirs.id])
+
+    def test_post_with_include(self):
+        response = self.client.post(
+            reverse('task-batch') + '?include=assignee', {'ids': [self.mine[0].id]}, format='json',
+        )
+        self.assertEqual([task['title'] for task in response.data['results']], ['Mine 0'])
+        self.assertEqual([user['id'] for user in response.data['included']['users']], [self.member.id])
+
+    @override_settings(BATCH_MAX_IDS=2)
+    def test_invalid_id_lists_are_rejected(self):
+        for ids in ('', 'a,b', '0', '1,2,3'):
+            response = self.client.get(reverse('task-list-create'), {'ids': ids})
+            self.assertEqual(response.status_code, 400, ids)
+        self.assertEqual(self.client.post(reverse('task-batch'), {'ids': 'x'}, format='json').status_code, 400)
+
+    def test_get_batch_must_be_implemented(self):
+        view = BatchRetrieveMixin()
+        view.request = mock.Mock(method='GET', query_params={'ids': '1'})
+        with self.assertRaisesMessage(ImproperlyConfigured, 'BatchRetrieveMixin must implement get_batch(ids).'):
+            view.batch(view.request)
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+    THROTTLE_BUCKETS={'default': (300, 20), 'task-tag-list-create': (4, 0.01)},
+)
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'poll{i}@gmail.com', f'poll{i}', 'pass12345') for i in range(2)]
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def get(self, **params):
+        return self.client.get(reverse('task-tag-list-create'), params)
+
+    def test_bucket_per_user_and_url_name(self):
+        throttled = DECISIONS.value(view='task-tag-list-create', outcome='throttled')
+        self.assertEqual([self.get().status_code for _ in range(5)], [200, 200, 200, 200, 429])
+        self.assertEqual(self.get()['Retry-After'], '100')
+        self.assertEqual(DECISIONS.value(view='task-tag-list-create', outcome='throttled'), throttled + 2)
+        self.assertEqual(self.client.get(reverse('task-list-create')).status_code, 200)
+
+        self.client.force_authenticate(self.users[1])
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_large_pages_cost_more(self):
+        self.assertEqual(self.get(page_size=30).status_code, 200)
+        self.assertEqual(self.get(page_size=20).status_code, 429)
+        self.assertEqual(self.get(page_size=10).status_code, 200)
+
+    def test_sheds_load_when_a_queue_is_deep(self):
+        REGISTRY.gauge('tests_queue_depth', 'A queue for ThrottlingTests.', function=lambda: 10)
+        shed = DECISIONS.value(view='task-tag-list-create', outcome='shed')
+        with override_settings(THROTTLE_SHED_QUEUES={'tests_queue_depth': 5}, THROTTLE_SHED_COST=4):
+            self.assertEqual([self.get().status_code for _ in range(2)], [200, 429])
+            self.assertIn('throttle_overloaded 1', self.client.get('/metrics').content.decode())
+        self.assertEqual(DECISIONS.value(view='task-tag-list-create', outcome='shed'), shed + 1)
+
+    @override_settings(THROTTLE_BUCKETS={'default': (300, 20), 'token_verify': (2, 0.01)})
+    def test_anonymous_clients_cannot_forge_their_address(self):
+        def verify(forwarded_for):
+            return APIClient().post(reverse('token_verify'), {'token': 'x'}, HTTP_X_FORWARDED_FOR=forwarded_for)
+
+        self.assertEqual([verify(f'198.51.100.{n}').status_code for n in range(3)], [401, 401, 429])
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            # The last entry is the one added by the trusted proxy.
+            self.assertEqual([verify(f'203.0.113.{n}, 198.51.100.7').status_code for n in range(3)], [401, 401, 429])
+            self.assertEqual(verify('198.51.100.8').status_code, 401)
+
+    def test_requires_an_atomic_cache(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            with self.assertRaises(ImproperlyConfigured), self.assertLogs('django.request', 'ERROR'):
+                self.get()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('retry@gmail.com', 'retry', 'pass12345')
+        TenantCache(self.user.organization_id).invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.data = {'title': 'Once', 'description': 'd', 'assigned_to': self.user.id}
+
+    def post(self, url, data, key='key-1'):
+        return self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.post(reverse('task-list-create'), self.data)
+        with self.assertNumQueries(0):
+            retry = self.post(reverse('task-list-create'), self.data)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Task.objects.filter(title='Once').count(), 1)
+
+        self.assertEqual(self.post(reverse('task-list-create'), self.data, key='key-2').status_code, 201)
+        self.assertEqual(Task.objects.filter(title='Once').count(), 2)
+
+        url = reverse('comment-list-create', args=[first.data['id']])
+        for _ in range(2):
+            self.post(url, {'task': first.data['id'], 'content': 'c'})
+        self.assertEqual(Comment.objects.filter(task_id=first.data['id']).count(), 1)
+
+    def test_key_reused_for_another_request(self):
+        self.post(reverse('task-list-create'), self.data)
+        response = self.post(reverse('task-list-create'), {**self.data, 'title': 'Other'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_failed_attempts_are_not_kept(self):
+        self.assertEqual(self.post(reverse('task-list-create'), {'title': 'Once'}).status_code, 400)
+        self.assertEqual(self.post(reverse('task-list-create'), self.data).status_code, 201)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_concurrent_duplicate_is_a_conflict(self):
+        IdempotencyStore(self.user, 'task-list-create', 'key-1').lock()
+        response = self.post(reverse('task-list-create'), self.data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Task.objects.filter(title='Once').exists())
+
+    def test_requires_an_atomic_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(
+                CACHES={**settings.CACHES, 'files': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+                }},
+                TENANT_CACHE_ALIASES={self.user.organization_id: 'files'},
+            ):
+                with self.assertRaisesMessage(ImproperlyConfigured, "FileBasedCache doesn't have them"), \
+                        self.assertLogs('django.request', 'ERROR'):
+                    self.post(reverse('task-list-create'), self.data)
+        self.assertFalse(Task.objects.filter(title='Once').exists())
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TaskUpdateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner@gmail.com', 'owner', 'pass12345')
+        self.task = Task.objects.create(title='Task', description='d', assigned_to=self.user, created_by=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        layer = get_channel_layer()
+        self.channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(user_group(self.user.organization_id, self.user.id), self.channel)
+
+    def patch(self, data):
+        with QueryCounter() as counter:
+            response = self.client.patch(reverse('task-detail', args=[self.task.id]), data)
+        self.assertEqual(response.status_code, 200)
+        return [sql for sql, _ in counter.queries if sql.startswith('UPDATE "tasks_task"')]
+
+    def test_writes_only_changed_columns(self):
+        updates = self.patch({'status': 'IN_PROGRESS', 'title': 'Task'})
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"status"', updates[0])
+        self.assertNotIn('"title"', updates[0])
+        self.assertNotIn('"description"', updates[0])
+        event = async_to_sync(get_channel_layer().receive)(self.channel)
+        self.assertEqual(event['message'], 'Task status has been updated.')
+
+    def test_unchanged_update_is_not_saved_or_announced(self):
+        updated_at = self.task.updated_at
+        self.assertEqual(self.patch({'status': 'TODO', 'title': 'Task'}), [])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.updated_at, updated_at)
+        # The first notification the assignee gets is for the next, real change.
+        self.patch({'assigned_to': self.user.id, 'status': 'COMPLETED'})
+        event = async_to_sync(get_channel_layer().receive)(self.channel)
+        self.assertEqual(event['status'], 'COMPLETED')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TenancyTests(TestCase):
+    def setUp(self):
+        self.acme = Organization.objects.create(name='Acme', slug='acme')
+        self.staff = User.objects.create_user('staff@gmail.com', 'staff', 'pass12345', is_staff=True)
+        self.outsider = User.objects.create_user('out@gmail.com', 'out', 'pass12345', organization=self.acme)
+        self.task = Task.objects.create(title='Ours', description='d', assigned_to=self.staff)
+        self.foreign = Task.objects.create(title='Theirs', description='d', assigned_to=self.outsider,
+                                           organization=self.acme)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_staff_only_see_their_organization(self):
+        response = self.client.get(reverse('task-list-create'))
+        self.assertEqual([task['id'] for task in response.data['results']], [self.task.id])
+        self.assertEqual(self.client.get(reverse('task-detail', args=[self.foreign.id])).status_code, 404)
+
+    def test_cannot_assign_or_comment_across_organizations(self):
+        response = self.client.post(reverse('task-list-create'), {
+            'title': 't', 'description': 'd', 'status': 'TODO', 'assigned_to': self.outsider.id,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('assigned_to', response.data)
+        self.client.patch(reverse('task-detail', args=[self.task.id]), {'created_by': self.outsider.id})
+        self.task.refresh_from_db()
+        self.assertIsNone(self.task.created_by_id)
+        response = self.client.post(reverse('comment-list-create', args=[self.foreign.id]), {
+            'task': self.foreign.id, 'content': 'hi',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_tags_are_per_organization(self):
+        Tag.objects.create(name='urgent', organization=self.acme)
+        self.client.put(reverse('tag-list-create', args=[self.task.id]), {'tags': ['urgent']}, format='json')
+        self.assertEqual(self.task.tags.get().organization_id, self.staff.organization_id)
+        self.assertEqual(Tag.objects.filter(name='urgent').count(), 2)
+
+    def test_cache_namespaces(self):
+        ours, theirs = TenantCache(self.staff.organization_id), TenantCache(self.acme.id)
+        ours.set('tags', ['a'])
+        theirs.set('tags', ['b'])
+        self.assertEqual(ours.get('tags'), ['a'])
+        theirs.invalidate()
+        self.assertIsNone(theirs.get('tags'))
+        self.assertEqual(TenantCache(self.staff.organization_id).get('tags'), ['a'])
+        self.assertNotEqual(tenant_group(1, 'user_1'), tenant_group(2, 'user_1'))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, TASK_SUBSCRIPTIONS_PER_CONNECTION=2)
+class TaskSubscriptionTests(TransactionTestCase):
+    # The consumer checks access from a database thread, so rows must be committed.
+    serialized_rollback = True
+
+    def setUp(self):
+        self.user = User.objects.create_user('live@gmail.com', 'live', 'pass12345')
+        self.tasks = [Task.objects.create(title=f'Task {n}', description='d') for n in range(3)]
+        acme = Organization.objects.create(name='Acme', slug='acme')
+        self.foreign = Task.objects.create(title='Theirs', description='d', organization=acme)
+        self.token = RefreshToken.for_user(self.user).access_token
+
+    def connect(self, query=''):
+        return WebsocketCommunicator(application, f'/ws/notifications/{self.user.id}/?token={self.token}{query}')
+
+    def test_subscribe_receive_and_unsubscribe(self):
+        first, second, third = self.tasks
+
+        async def scenario():
+            communicator = self.connect()
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            await communicator.send_json_to({'action': 'subscribe', 'task_ids': [first.id, self.foreign.id]})
+            self.assertEqual(await communicator.receive_json_from(),
+                             {'type': 'subscribed', 'task_ids': [first.id], 'rejected': [self.foreign.id]})
+            await communicator.send_json_to({'action': 'subscribe', 'task_ids': [first.id, second.id, third.id]})
+            reply = await communicator.receive_json_from()
+            # Two subscriptions per connection in this test; re-subscribing is a no-op.
+            self.assertEqual(reply['task_ids'], [first.id, second.id])
+            self.assertEqual(reply['rejected'], [third.id])
+
+            await database_sync_to_async(Comment.objects.create)(task=first, user=self.user, content='hello')
+            event = await communicator.receive_json_from()
+            self.assertEqual((event['type'], event['task_id'], event['comment']['content']),
+                             ('comment.created', first.id, 'hello'))
+
+            await communicator.send_json_to({'action': 'unsubscribe', 'task_ids': [first.id]})
+            self.assertEqual(await communicator.receive_json_from(), {'type': 'unsubscribed', 'task_ids': [first.id]})
+            await database_sync_to_async(Comment.objects.create)(task=first, user=self.user, content='missed')
+            self.assertTrue(await communicator.receive_nothing())
+
+            await communicator.send_to(text_data='nonsense')
+            self.assertEqual((await communicator.receive_json_from())['type'], 'error')
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_huge_subscribe_messages_look_up_only_what_fits(self):
+        first, second, _ = self.tasks
+
+        async def scenario():
+            communicator = self.connect()
+            await communicator.connect()
+            # More ids than SQLite accepts as bound variables in one query.
+            ids = [first.id, second.id, *range(10 ** 6, 10 ** 6 + 300000)]
+            await communicator.send_json_to({'action': 'subscribe', 'task_ids': ids})
+            reply = await communicator.receive_json_from(timeout=10)
+            self.assertEqual((reply['task_ids'], len(reply['rejected'])), ([first.id, second.id], 300000))
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_resubscribe_on_connect(self):
+        task = self.tasks[0]
+
+        async def scenario():
+            communicator = self.connect(f'&tasks={task.id}')
+            await communicator.connect()
+            self.assertEqual((await communicator.receive_json_from())['task_ids'], [task.id])
+
+            task.status = 'COMPLETED'
+            await database_sync_to_async(task.save)(update_fields=['status'])
+            event = await communicator.receive_json_from()
+            self.assertEqual((event['type'], event['task']['status']), ('task.updated', 'COMPLETED'))
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class NotificationStreamTests(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        self.user = User.objects.create_user('sse@gmail.com', 'sse', 'pass12345')
+        self.token = RefreshToken.for_user(self.user).access_token
+
+    def open(self, query='', headers=()):
+        return ApplicationCommunicator(application, {
+            'type': 'http', 'method': 'GET', 'path': '/api/notifications/stream/',
+            'query_string': query.encode(), 'headers': [(b'host', b'testserver'), *headers],
+        })
+
+    def notify(self, text):
+        notify(self.user.organization_id, self.user.id,
+               {'message': text, 'task_id': 1, 'task_title': 'T', 'status': 'TODO'})
+
+    def test_requires_a_token(self):
+        async def scenario():
+            communicator = self.open()
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            self.assertEqual((await communicator.receive_output())['status'], 401)
+
+        async_to_sync(scenario)()
+
+    def test_streams_and_resumes_after_last_event_id(self):
+        async def read_event(communicator):
+            return (await communicator.receive_output())['body'].decode()
+
+        async def scenario():
+            communicator = self.open(f'token={self.token}')
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output()
+            self.assertEqual((start['status'], dict(start['headers'])[b'Content-Type']), (200, b'text/event-stream'))
+            self.assertEqual(await read_event(communicator), 'retry: 3000\n\n')
+
+            await database_sync_to_async(self.notify)('first')
+            first = await read_event(communicator)
+            self.assertIn('event: notification', first)
+            self.assertIn('"message": "first"', first)
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+            # Missed while disconnected; replayed on reconnect.
+            await database_sync_to_async(self.notify)('second')
+            last_id = first.split('\n')[0].removeprefix('id: ')
+            communicator = self.open(f'token={self.token}', [(b'last-event-id', last_id.encode())])
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            await communicator.receive_output()
+            await read_event(communicator)
+            replayed = await read_event(communicator)
+            self.assertIn('"message": "second"', replayed)
+            self.assertNotIn('first', replayed)
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(scenario)()
+
+    def test_ids_are_sequential_per_user(self):
+        first = remember_notification(self.user.organization_id, self.user.id, {'message': 'a'})
+        second = remember_notification(self.user.organization_id, self.user.id, {'message': 'b'})
+        self.assertEqual(second['id'], first['id'] + 1)
+        self.assertEqual(replay_notifications(self.user.organization_id, self.user.id, first['id']), [second])
+
+    def test_only_replayed_events_are_skipped(self):
+        async def read_event(communicator):
+            return (await communicator.receive_output())['body'].decode()
+
+        async def scenario():
+            await database_sync_to_async(self.notify)('missed')
+            missed = (await database_sync_to_async(replay_notifications)(
+                self.user.organization_id, self.user.id, 0))[-1]
+            communicator = self.open(f'token={self.token}', [(b'last-event-id', str(missed['id'] - 1).encode())])
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            await communicator.receive_output()
+            await read_event(communicator)
+            self.assertIn('"message": "missed"', await read_event(communicator))
+
+            # The same event delivered live is a duplicate; one with a lower id from another worker is not.
+            channel_layer = get_channel_layer()
+            group = user_group(self.user.organization_id, self.user.id)
+            await channel_layer.group_send(group, missed)
+            await channel_layer.group_send(group, {**missed, 'id': missed['id'] - 5, 'message': 'late'})
+            self.assertIn('"message": "late"', await read_event(communicator))
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(scenario)()
+
+    @override_settings(NOTIFICATION_STREAM_HEARTBEAT=0.01)
+    def test_a_broken_stream_does_not_stop_the_heartbeat(self):
+        class Stream:
+            def __init__(self, broken):
+                self.broken, self.bodies = broken, []
+
+            async def send_body(self, body, more_body=False):
+                if self.broken:
+                    raise RuntimeError('closed')
+                self.bodies.append(body)
+
+        async def scenario():
+            heartbeats, broken, healthy = StreamHeartbeats(), Stream(True), Stream(False)
+            heartbeats.add(broken)
+            heartbeats.add(healthy)
+            await asyncio.sleep(0.05)
+            self.assertNotIn(broken, heartbeats.streams)
+            self.assertGreater(len(healthy.bodies), 1)
+            self.assertFalse(heartbeats.task.done())
+            heartbeats.discard(healthy)
+            await heartbeats.task
+
+        async_to_sync(scenario)()
+
+    @override_settings(NOTIFICATION_STREAM_HEARTBEAT=0.05)
+    def test_heartbeat(self):
+        async def scenario():
+            communicator = self.open(f'token={self.token}')
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            await communicator.receive_output()
+            await communicator.receive_output()
+            self.assertEqual((await communicator.receive_output())['body'], b': heartbeat\n\n')
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(scenario)()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, TASK_SYNC_SETTLE_SECONDS=0)
+class TaskSyncTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('sync@gmail.com', 'sync', 'pass12345')
+        self.other = User.objects.create_user('other@gmail.com', 'other', 'pass12345')
+        self.kept = Task.objects.create(title='Kept', description='d', assigned_to=self.member)
+        self.moved = Task.objects.create(title='Moved', description='d', assigned_to=self.member)
+        self.doomed = Task.objects.create(title='Doomed', description='d', assigned_to=self.member)
+        self.client = APIClient()
+        self.client.force_authenticate(self.member)
+
+    def sync(self, cursor=None, **params):
+        if cursor is not None:
+            params['since'] = cursor
+        return self.client.get(reverse('task-changes'), params)
+
+    def test_initial_sync_then_deltas(self):
+        response = self.sync()
+        self.assertEqual([task['id'] for task in response.data['changed']],
+                         [self.kept.id, self.moved.id, self.doomed.id])
+        self.assertFalse(response.data['has_more'])
+        cursor = response.data['cursor']
+        self.assertEqual(self.sync(cursor).data['changed'], [])
+
+        self.kept.status = 'COMPLETED'
+        self.kept.save(update_fields=['status'])
+        moved = Task.objects.get(id=self.moved.id)
+        moved.assigned_to = self.other
+        moved.save()
+        admin = User.objects.create_user('boss@gmail.com', 'boss', 'pass12345', is_staff=True)
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.client.delete(reverse('task-detail', args=[self.doomed.id])).status_code, 204)
+        self.client.force_authenticate(self.member)
+
+        response = self.sync(cursor)
+        self.assertEqual([task['id'] for task in response.data['changed']], [self.kept.id])
+        self.assertEqual(response.data['changed'][0]['status'], 'COMPLETED')
+        self.assertEqual(response.data['removed'], [self.moved.id, self.doomed.id])
+
+        # Staff still see the reassigned task; only the deletion is a removal for them.
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.sync(cursor).data['removed'], [self.doomed.id])
+
+    def test_paging_and_archival(self):
+        first = self.sync(limit=2).data
+        self.assertEqual(len(first['changed']), 2)
+        self.assertTrue(first['has_more'])
+        second = self.sync(first['cursor'], limit=2).data
+        self.assertEqual([task['id'] for task in second['changed']], [self.doomed.id])
+
+        Task.objects.filter(id=self.kept.id).update(status='COMPLETED')
+        archive_batch([self.kept.id])
+        third = self.sync(second['cursor']).data
+        self.assertEqual(third['removed'], [self.kept.id])
+
+        # Restored tasks are changes again, and no longer reported as removed.
+        restore_tasks([self.kept.id])
+        fourth = self.sync(second['cursor']).data
+        self.assertEqual([task['id'] for task in fourth['changed']], [self.kept.id])
+        self.assertEqual(fourth['removed'], [])
+
+    def test_bad_and_expired_cursors(self):
+        self.assertEqual(self.sync('garbage').status_code, 400)
+        self.assertEqual(self.sync('99999999999999999999.1.1').status_code, 400)
+        self.assertEqual(self.sync('1.0.0').status_code, 410)
+
+    def test_empty_update_fields_saves_nothing(self):
+        updated_at = self.kept.updated_at
+        with self.assertNumQueries(0):
+            self.kept.save(update_fields=[])
+        self.kept.refresh_from_db()
+        self.assertEqual(self.kept.updated_at, updated_at)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TagSearchTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        top_tags.invalidate()
+        self.user = User.objects.create_user('tagger@gmail.com', 'tagger', 'pass12345', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tasks = [Task.objects.create(title=f'Task {n}', description='d') for n in range(3)]
+        self.backend, self.bug, self.backlog = (Tag.objects.create(name=name) for name in ('Backend', 'bug', 'backlog'))
+
+    def usage(self):
+        return dict(Tag.objects.values_list('name', 'usage_count'))
+
+    def search(self, q, **params):
+        return [tag['name'] for tag in self.client.get(reverse('tag-search'), {'q': q, **params}).data]
+
+    def test_usage_count_follows_tag_links(self):
+        first, second, third = self.tasks
+        first.tags.add(self.bug, self.backend)
+        second.tags.add(self.bug)
+        second.tags.add(self.bug)
+        self.backlog.tasks.add(first, third)
+        self.assertEqual(self.usage(), {'Backend': 1, 'bug': 2, 'backlog': 2})
+
+        first.tags.remove(self.backend, self.backlog)
+        third.tags.clear()
+        self.assertEqual(self.usage(), {'Backend': 0, 'bug': 2, 'backlog': 0})
+
+        self.client.delete(reverse('task-detail', args=[second.id]))
+        first.status = 'COMPLETED'
+        first.save()
+        archive_batch([first.id])
+        self.assertEqual(self.usage()['bug'], 0)
+        restore_tasks([first.id])
+        self.assertEqual(self.usage()['bug'], 1)
+
+    def test_prefix_search_ranked_by_usage(self):
+        self.tasks[0].tags.add(self.backlog)
+        self.backlog.tasks.add(self.tasks[1])
+        self.backend.tasks.add(self.tasks[2])
+        self.assertEqual(self.search('BA'), ['backlog', 'Backend'])
+        self.assertEqual(self.search(''), ['backlog', 'Backend', 'bug'])
+        self.assertEqual(self.search('b', limit=1), ['backlog'])
+        self.assertEqual(self.search('x'), [])
+
+        # Tags created through the API are found right away.
+        self.client.patch(reverse('tag-list-create', args=[self.tasks[0].id]), {'tags': ['bash']}, format='json')
+        self.assertEqual(self.search('bas'), ['bash'])
+
+    @override_settings(TAG_TOP_N=1)
+    def test_search_beyond_the_top_tags(self):
+        self.bug.tasks.add(*self.tasks)
+        self.backend.tasks.add(self.tasks[0])
+        self.assertEqual(self.search('b'), ['bug', 'Backend', 'backlog'])
+        self.assertEqual(self.search('ba'), ['Backend', 'backlog'])
+
+    def test_cached_tag_ids_follow_renames_and_deletes(self):
+        organization_id = self.bug.organization_id
+        self.assertEqual(tag_ids(organization_id, ['bug', 'nope']), {'bug': self.bug.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(tag_ids(organization_id, ['bug']), {'bug': self.bug.id})
+
+        bug = Tag.objects.get(id=self.bug.id)
+        bug.name = 'defect'
+        bug.save()
+        self.assertEqual(tag_ids(organization_id, ['bug', 'defect']), {'defect': self.bug.id})
+        bug.delete()
+        self.assertEqual(tag_ids(organization_id, ['defect']), {})
+
+    def test_query_budget(self):
+        names = (f'budget-{n}' for n in itertools.count())
+
+        def prepare():
+            # Measure the uncached path.
+            top_tags.invalidate()
+
+        self.assertQueryBudget(
+            lambda _: self.client.get(reverse('tag-search'), {'q': 'b'}),
+            lambda: Tag.objects.create(name=next(names)),
+            prepare=prepare,
+        )
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TaskTagFilterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('filter@gmail.com', 'filter', 'pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.bug, self.ui, self.docs = (Tag.objects.create(name=name) for name in ('bug', 'ui', 'docs'))
+        self.both, self.bug_only, self.untagged = (
+            Task.objects.create(title=title, description='d', assigned_to=self.user) for title in ('Both', 'Bug', 'None')
+        )
+        self.both.tags.add(self.bug, self.ui)
+        self.bug_only.tags.add(self.bug)
+
+    def filtered(self, **params):
+        response = self.client.get(reverse('task-list-create'), params)
+        self.assertEqual(response.status_code, 200)
+        return [task['id'] for task in response.data['results']]
+
+    def test_any_and_all(self):
+        self.assertEqual(sorted(self.filtered(tags='bug,ui')), [self.both.id, self.bug_only.id])
+        self.assertEqual(self.filtered(tags='bug,ui', tags_mode='all'), [self.both.id])
+        self.assertEqual(self.filtered(tags='bug,docs', tags_mode='all'), [])
+        self.assertEqual(self.filtered(tags='missing'), [])
+        self.assertEqual(len(self.filtered(tags=' , ')), 3)
+
+    def test_single_query_without_duplicates(self):
+        url = reverse('task-tag-list-create')
+        with QueryCounter() as counter:
+            response = self.client.get(url, {'tags': 'bug,ui'})
+        self.assertEqual(response.data['count'], 2)
+        tasks = [sql for sql, _ in counter.queries if sql.startswith('SELECT "tasks_task"."id"')]
+        self.assertEqual(len(tasks), 1)
+        self.assertIn('"tasks_task_tags"', tasks[0])
+        self.assertEqual(self.client.get(url, {'tags': 'bug', 'tags_mode': 'some'}).status_code, 400)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ArchiveTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('archive@gmail.com', 'archive', 'pass12345')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.tag = Tag.objects.create(name='old')
+        self.counter = itertools.count()
+        self.old = self.make_task('COMPLETED', days=200)
+        self.recent = self.make_task('COMPLETED', days=1)
+        self.open = self.make_task('TODO', days=200)
+
+    def make_task(self, status, days):
+        task = Task.objects.create(
+            title=f'Task {next(self.counter)}', description='d', status=status,
+            assigned_to=self.user, created_by=self.user,
+        )
+        past = timezone.now() - timedelta(days=days)
+        Task.objects.filter(id=task.id).update(created_at=past, updated_at=past)
+        task.tags.add(self.tag)
+        Comment.objects.create(task=task, user=self.user, content='c')
+        return task
+
+    def test_archive_and_restore_round_trip(self):
+        created_at = Task.objects.get(id=self.old.id).created_at
+        self.assertEqual(archive_completed_tasks(older_than=timedelta(days=90), batch_size=1), 1)
+        self.assertFalse(Task.objects.filter(id=self.old.id).exists())
+        self.assertFalse(Comment.objects.filter(task_id=self.old.id).exists())
+        archived = ArchivedTask.objects.get(id=self.old.id)
+        self.assertEqual(list(archived.tags.all()), [self.tag])
+        self.assertEqual(archived.comments.count(), 1)
+
+        listing = self.client.get(reverse('task-list-create')).data['results']
+        self.assertEqual({task['id'] for task in listing}, {self.recent.id, self.open.id})
+        archive = self.client.get(reverse('archived-task-list')).data['results']
+        self.assertEqual([task['id'] for task in archive], [self.old.id])
+
+        response = self.client.post(reverse('archived-task-restore', args=[self.old.id]))
+        self.assertEqual(response.status_code, 200)
+        restored = Task.objects.get(id=self.old.id)
+        self.assertEqual(restored.created_at, created_at)
+        self.assertEqual(list(restored.tags.all()), [self.tag])
+        self.assertEqual(restored.comments.count(), 1)
+        self.assertFalse(ArchivedTask.objects.exists())
+
+    def test_restored_tasks_are_not_archived_again(self):
+        archive_completed_tasks(older_than=timedelta(days=90))
+        restore_tasks([self.old.id])
+        self.assertEqual(archive_completed_tasks(older_than=timedelta(days=90)), 0)
+        self.assertTrue(Task.objects.filter(id=self.old.id).exists())
+
+    def test_recently_changed_tasks_stay(self):
+        Task.objects.get(id=self.old.id).save()
+        self.assertEqual(archivable_tasks(older_than=timedelta(days=90)).count(), 0)
+
+    def test_query_budgets(self):
+        def grow():
+            archive_batch([self.make_task('COMPLETED', days=200).id])
+
+        archive_batch([self.old.id])
+        self.assertQueryBudget(lambda: self.client.get(reverse('archived-task-list')), grow)
+        self.assertQueryBudget(lambda: self.client.get(reverse('archived-task-detail', args=[self.old.id])), grow)
+        self.assertQueryBudget(
+            lambda task_id: self.client.post(reverse('archived-task-restore', args=[task_id])),
+            grow,
+            prepare=lambda: ArchivedTask.objects.order_by('id').values_list('id', flat=True).first(),
+        )
+
+
+class OpenAPISchemaTests(TestCase):
+    def test_build_and_serve_prebuilt_schema(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(OPENAPI_SCHEMA_DIR=directory):
+            call_command('build_openapi_schema', stdout=StringIO())
+            response = self.client.get('/swagger.json')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('/tasks/', json.loads(response.content)['paths'])
+            self.assertIn('max-age', response['Cache-Control'])
+
+            cached = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(self.client.get('/swagger.yaml').status_code, 200)
+
+
+class ColdStartTests(SimpleTestCase):
+    def test_asgi_import_within_budget(self):
+        # Best of three, to keep a busy CI machine from failing the build on noise.
+        profiles = [profile_import('core.asgi') for _ in range(3)]
+        profile = min(profiles, key=lambda p: p.total_ms)
+        self.assertLess(profile.total_ms, settings.ASGI_IMPORT_BUDGET_MS)
+
+        for module in ('drf_yasg', 'drf_spectacular', 'daphne.server', 'tasks.admin', 'users.admin'):
+            self.assertNotIn(module, profile.modules)
@@ -2,22 +2,36 @@ from django.urls import path
 from .views import (
     TaskListCreateView,
     TaskDetailView,
+    TaskChangesView,
+    TaskBatchView,
     TaskListView,
     AddTagsToTaskView,
+    TagSearchView,
     CommentListCreateView,
-    CommentDetailView
+    CommentDetailView,
+    ArchivedTaskListView,
+    ArchivedTaskDetailView,
+    RestoreArchivedTaskView,
 )
 
 urlpatterns = [
     # Task Management URLs
     path('tasks/', TaskListCreateView.as_view(), name='task-list-create'),
     path('tasks/<int:pk>/', TaskDetailView.as_view(), name='task-detail'),
+    path('tasks/changes/', TaskChangesView.as_view(), name='task-changes'),
+    path('tasks/batch/', TaskBatchView.as_view(), name='task-batch'),
 
     # Tagging System URLs
     path('tag/<int:pk>/', AddTagsToTaskView.as_view(), name='tag-list-create'),
+    path('tags/', TagSearchView.as_view(), name='tag-search'),
     path('task-tags/', TaskListView.as_view(), name='task-tag-list-create'),
 
     # Commenting System URLs
     path('tasks/<int:task_id>/comments/', CommentListCreateView.as_view(), name='comment-list-create'),
     path('comments/<int:pk>/', CommentDetailView.as_view(), name='comment-detail'),
+
+    # Archived Task URLs
+    path('tasks/archive/', ArchivedTaskListView.as_view(), name='archived-task-list'),
+    path('tasks/archive/<int:pk>/', ArchivedTaskDetailView.as_view(), name='archived-task-detail'),
+    path('tasks/archive/<int:pk>/restore/', RestoreArchivedTaskView.as_view(), name='archived-task-restore'),
 ]
@@ -1,18 +1,94 @@
 from django_filters.rest_framework import filters
 from rest_framework import generics, permissions, filters,status
-from .models import Task, Tag, Comment
+from django.conf import settings
+from .models import Task, TaskTombstone, Tag, Comment, ArchivedTask
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from core.batch import BatchRetrieveMixin
+from core.idempotency import IdempotentCreateMixin
+from users.authentication import JWTAuthentication
+from users.directory import remember_assignee
 from .pagination import TaskPagination
 from .filters import TaskFilter 
+from .archive import restore_tasks
+from .includes import build_included, parse_include
+from .signals import publish_task_event
+from .sync import SyncCursor, changes_since, is_expired, record_removals, visible_tombstones
+from .tags import recount_usage, search_tags, tag_ids, top_tags
 from .serializers import *
 
 
 
 
-class TaskListCreateView(generics.ListCreateAPIView):
+class VisibleTasksMixin:
+    """
+    Scopes ``get_queryset`` to the tasks the user may list: every task of their organization
+    for staff, their assigned tasks otherwise.
+    """
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Task.objects.none()
+        # Staff see every task of their own organization only.
+        queryset = Task.objects.filter(organization_id=self.request.user.organization_id).prefetch_related('tags')
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(assigned_to=self.request.user)
+
+
+class IncludeMixin:
+    """
+    Adds the resources named by ``?include=`` to list and detail responses (see tasks/includes.py).
+    """
+
+    def get_include(self):
+        return parse_include(self.request.query_params.get('include'))
+
+    def paginate_queryset(self, queryset):
+        self.page = super().paginate_queryset(queryset)
+        return self.page
+
+    def list(self, request, *args, **kwargs):
+        include = self.get_include()
+        response = super().list(request, *args, **kwargs)
+        if include:
+            response.data['included'] = build_included(self.page, include, self.get_serializer_context())
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        include = self.get_include()
+        instance = self.get_object()
+        data = self.get_serializer(instance).data
+        if include:
+            data = {**data, 'included': build_included([instance], include, self.get_serializer_context())}
+        return Response(data)
+
+
+class TaskBatchMixin(BatchRetrieveMixin):
+    """
+    Multi-get for visible tasks (see core/batch.py), honouring ``?include=``.
+    """
+
+    def get_batch(self, ids):
+        found = {task.id: task for task in self.get_queryset().filter(id__in=ids)}
+        forbidden = set()
+        if len(found) < len(ids) and not self.request.user.is_staff:
+            # Tasks of the organization that are assigned to someone else.
+            forbidden = set(Task.objects.filter(
+                organization_id=self.request.user.organization_id, id__in=[pk for pk in ids if pk not in found],
+            ).values_list('id', flat=True))
+        return found, forbidden
+
+    def batch(self, request, *args, **kwargs):
+        include = self.get_include()
+        response = super().batch(request, *args, **kwargs)
+        if include:
+            response.data['included'] = build_included(self.batch_objects, include, self.get_serializer_context())
+        return response
+
+
+class TaskListCreateView(IdempotentCreateMixin, IncludeMixin, TaskBatchMixin, VisibleTasksMixin, generics.ListCreateAPIView):
     """
     This view handles listing and creating tasks.
 
@@ -27,6 +103,7 @@ class TaskListCreateView(generics.ListCreateAPIView):
 
     Methods:
     get_queryset: Returns the queryset based on user permissions.
+    list: Lists the tasks, or only those in ``?ids=`` (see TaskBatchMixin).
     perform_create: Creates a new task with the assigned user and creator.
     """
     queryset = Task.objects.all()
@@ -36,22 +113,41 @@ class TaskListCreateView(generics.ListCreateAPIView):
     filter_backends = [DjangoFilterBackend]
     filterset_class = TaskFilter
     pagination_class = TaskPagination 
-     
-    def get_queryset(self):
-        if self.request.user.is_staff:
-            return Task.objects.all()
-        return Task.objects.filter(assigned_to=self.request.user)
+    query_budget = {'GET': 6, 'POST': 5}
+
+    def list(self, request, *args, **kwargs):
+        if 'ids' in request.query_params:
+            return self.batch(request, *args, **kwargs)
+        return super().list(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        assigned_user_id = self.request.data.get('assigned_to')
-        if assigned_user_id:
-            assigned_user = User.objects.get(id=assigned_user_id)
-            serializer.save(assigned_to=assigned_user, created_by=self.request.user)
-        else:
-            serializer.save(created_by=self.request.user)
+        # `assigned_to` is already resolved to a User by the serializer's validation.
+        serializer.save(created_by=self.request.user, organization_id=self.request.user.organization_id)
+        remember_assignee(self.request.user, serializer.instance.assigned_to_id)
+
+
+class TaskBatchView(IncludeMixin, TaskBatchMixin, VisibleTasksMixin, generics.GenericAPIView):
+    """
+    This view returns the visible tasks among a list of ids too long for ``GET /api/tasks/?ids=``.
+
+    Attributes:
+    serializer_class: The serializer class for tasks.
+    authentication_classes: The authentication classes used for this view.
+    permission_classes: The permission classes required for this view.
+
+    Methods:
+    post: Returns the tasks in ``ids`` and the ids that are missing or forbidden.
+    """
+    serializer_class = TaskSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 6
 
+    def post(self, request, *args, **kwargs):
+        return self.batch(request, *args, **kwargs)
 
-class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
+
+class TaskDetailView(IncludeMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     This view handles retrieving, updating, and deleting a single task.
 
@@ -62,19 +158,74 @@ class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes: The permission classes required for this view.
 
     Methods:
+    get_queryset: Returns the tasks of the user's organization.
     perform_update: Updates the task if the user is the creator or a staff member.
+    perform_destroy: Deletes the task and tells its subscribers.
     """
-    queryset = Task.objects.all()
+    queryset = Task.objects.prefetch_related('tags')
     serializer_class = TaskSerializer
     authentication_classes = [JWTAuthentication] 
     permission_classes = [permissions.IsAuthenticated]
-    
+    query_budget = {'GET': 5, 'PUT': 7, 'PATCH': 7, 'DELETE': 8}
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Task.objects.none()
+        return Task.objects.filter(organization_id=self.request.user.organization_id).prefetch_related('tags')
 
     def perform_update(self, serializer):
-        task = self.get_object()
-        if task.created_by != self.request.user and not self.request.user.is_staff:
+        task = serializer.instance
+        if task.created_by_id != self.request.user.id and not self.request.user.is_staff:
             raise PermissionDenied("You do not have permission to update this task.")
         serializer.save()
+        if 'assigned_to' in serializer.changed_fields:
+            remember_assignee(self.request.user, serializer.instance.assigned_to_id)
+
+    def perform_destroy(self, instance):
+        organization_id, task_id = instance.organization_id, instance.id
+        tag_ids = [tag.id for tag in instance.tags.all()]
+        record_removals([(organization_id, task_id, instance.assigned_to_id)], TaskTombstone.DELETED)
+        instance.delete()
+        # Cascaded link deletes send no m2m_changed (see tasks/tags.py).
+        recount_usage(tag_ids)
+        publish_task_event(organization_id, task_id, 'task.deleted')
+
+
+class TaskChangesView(VisibleTasksMixin, generics.GenericAPIView):
+    """
+    This view returns the tasks that changed since a cursor, for clients keeping local copies.
+
+    Attributes:
+    serializer_class: The serializer class for tasks.
+    authentication_classes: The authentication classes used for this view.
+    permission_classes: The permission classes required for this view.
+
+    Methods:
+    get: Returns the tasks created or updated and the ids of tasks removed since ``since``.
+    """
+    serializer_class = TaskSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
+
+    def get(self, request, *args, **kwargs):
+        try:
+            cursor = SyncCursor.decode(request.query_params['since']) if 'since' in request.query_params else SyncCursor()
+            limit = int(request.query_params.get('limit', settings.TASK_SYNC_PAGE_SIZE))
+        except ValueError:
+            return Response({"detail": "Invalid `since` cursor or `limit`."}, status=status.HTTP_400_BAD_REQUEST)
+        if is_expired(cursor):
+            return Response({"detail": "This cursor has expired; list /api/tasks/ again and start over."},
+                            status=status.HTTP_410_GONE)
+        limit = min(max(limit, 1), settings.TASK_SYNC_MAX_PAGE_SIZE)
+
+        page = changes_since(self.get_queryset(), visible_tombstones(request.user), cursor, limit)
+        return Response({
+            'changed': self.get_serializer(page.changed, many=True).data,
+            'removed': page.removed,
+            'cursor': page.cursor.encode(),
+            'has_more': page.has_more,
+        })
 
 
 class AddTagsToTaskView(generics.UpdateAPIView):
@@ -88,12 +239,19 @@ class AddTagsToTaskView(generics.UpdateAPIView):
     pagination_class: The pagination class for this view.
 
     Methods:
+    get_queryset: Returns the tasks of the user's organization.
     update: Adds tags to the task if the user is authenticated.
     """
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = TaskPagination 
+    query_budget = {'PUT': 10, 'PATCH': 10}
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Task.objects.none()
+        return Task.objects.filter(organization_id=self.request.user.organization_id)
 
     def update(self, request, *args, **kwargs):
         task = self.get_object()
@@ -102,15 +260,51 @@ class AddTagsToTaskView(generics.UpdateAPIView):
         if not isinstance(tags_data, list):
             return Response({"error": "Tags must be provided as a list."}, status=status.HTTP_400_BAD_REQUEST)
 
-        for tag_name in tags_data:
-            tag, created = Tag.objects.get_or_create(name=tag_name)
-            task.tags.add(tag)
-
-        task.save()  
+        # Resolve every tag in a constant number of queries instead of one get_or_create per name.
+        names = set(tags_data)
+        ids = tag_ids(task.organization_id, names)
+        if names - ids.keys():
+            Tag.objects.bulk_create(
+                [Tag(organization_id=task.organization_id, name=name) for name in names - ids.keys()],
+                ignore_conflicts=True,
+            )
+            top_tags.invalidate(task.organization_id)
+            ids.update(tag_ids(task.organization_id, names - ids.keys()))
+        task.tags.add(*ids.values())
+
+        # Only the tags changed; bump updated_at for delta-sync clients without rewriting the row.
+        task.save(update_fields=['updated_at'])
 
         return Response(self.get_serializer(task).data, status=status.HTTP_200_OK)
     
 
+class TagSearchView(generics.GenericAPIView):
+    """
+    This view handles tag autocomplete.
+
+    Attributes:
+    serializer_class: The serializer class for tags with their usage.
+    authentication_classes: The authentication classes used for this view.
+    permission_classes: The permission classes required for this view.
+
+    Methods:
+    get: Returns the organization's most used tags starting with ``q``.
+    """
+    serializer_class = TagUsageSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', settings.TAG_SEARCH_LIMIT))
+        except ValueError:
+            return Response({"detail": "Invalid `limit`."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), settings.TAG_SEARCH_MAX_LIMIT)
+        tags = search_tags(request.user.organization_id, request.query_params.get('q', ''), limit)
+        return Response(self.get_serializer(tags, many=True).data)
+
+
 class TaskListView(generics.ListAPIView):
     """
     This view handles listing tasks.
@@ -126,7 +320,7 @@ class TaskListView(generics.ListAPIView):
     ordering: The ordering of tasks.
 
     Methods:
-    get_queryset: Returns the queryset of all tasks.
+    get_queryset: Returns the tasks of the user's organization.
     """
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
@@ -136,12 +330,15 @@ class TaskListView(generics.ListAPIView):
     filterset_class = TaskFilter
     pagination_class = TaskPagination 
     ordering = ['due_date']
+    query_budget = 4
 
     def get_queryset(self):
-        return Task.objects.all()
+        if getattr(self, 'swagger_fake_view', False):
+            return Task.objects.none()
+        return Task.objects.filter(organization_id=self.request.user.organization_id).prefetch_related('tags')
 
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class CommentListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     """
     This view handles listing and creating comments.
 
@@ -153,6 +350,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
     pagination_class: The pagination class for this view.
 
     Methods:
+    get_queryset: Returns the comments on the task in the URL, oldest first.
     perform_create: Creates a new comment with the user.
     """
     queryset = Comment.objects.all()
@@ -160,8 +358,17 @@ class CommentListCreateView(generics.ListCreateAPIView):
     authentication_classes = [JWTAuthentication]  # Add JWT Authentication
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = TaskPagination 
+    query_budget = {'GET': 3, 'POST': 3}
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Comment.objects.none()
+        return Comment.objects.filter(
+            organization_id=self.request.user.organization_id, task_id=self.kwargs['task_id'],
+        ).order_by('created_at', 'id')
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user=self.request.user, organization_id=self.request.user.organization_id)
 
 
 class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -176,6 +383,7 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
     pagination_class: The pagination class for this view.
 
     Methods:
+    get_queryset: Returns the comments of the user's organization.
     perform_update: Updates the comment if the user is the creator or a staff member.
     perform_destroy: Deletes the comment if the user is the creator or a staff member.
     """
@@ -184,14 +392,111 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
     authentication_classes = [JWTAuthentication] 
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = TaskPagination 
+    query_budget = {'GET': 2, 'PUT': 4, 'PATCH': 4, 'DELETE': 3}
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Comment.objects.none()
+        return Comment.objects.filter(organization_id=self.request.user.organization_id)
 
     def perform_update(self, serializer):
-        comment = self.get_object()
-        if comment.user != self.request.user and not self.request.user.is_staff:
+        comment = serializer.instance
+        if comment.user_id != self.request.user.id and not self.request.user.is_staff:
             raise PermissionDenied("You do not have permission to update this comment.")
         serializer.save()
 
     def perform_destroy(self, instance):
-        if instance.user != self.request.user and not self.request.user.is_staff:
+        if instance.user_id != self.request.user.id and not self.request.user.is_staff:
             raise PermissionDenied("You do not have permission to delete this comment.")
-        instance.delete()
\ No newline at end of file
+        comment_id = instance.id
+        instance.delete()
+        publish_task_event(instance.organization_id, instance.task_id, 'comment.deleted', comment={'id': comment_id})
+
+class ArchivedTaskListView(generics.ListAPIView):
+    """
+    This view handles listing archived tasks.
+
+    Attributes:
+    serializer_class: The serializer class for archived tasks.
+    authentication_classes: The authentication classes used for this view.
+    permission_classes: The permission classes required for this view.
+    pagination_class: The pagination class for this view.
+
+    Methods:
+    get_queryset: Returns archived tasks based on user permissions, most recently archived first.
+    """
+    serializer_class = ArchivedTaskSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TaskPagination
+    query_budget = 4
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ArchivedTask.objects.none()
+        queryset = ArchivedTask.objects.filter(
+            organization_id=self.request.user.organization_id,
+        ).prefetch_related('tags').order_by('-archived_at', '-id')
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(assigned_to=self.request.user)
+
+
+class ArchivedTaskDetailView(generics.RetrieveAPIView):
+    """
+    This view handles retrieving a single archived task with its comments.
+
+    Attributes:
+    serializer_class: The serializer class for archived tasks.
+    authentication_classes: The authentication classes used for this view.
+    permission_classes: The permission classes required for this view.
+
+    Methods:
+    get_queryset: Returns archived tasks based on user permissions.
+    """
+    serializer_class = ArchivedTaskDetailSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ArchivedTask.objects.none()
+        queryset = ArchivedTask.objects.filter(
+            organization_id=self.request.user.organization_id,
+        ).prefetch_related('tags', 'comments')
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(assigned_to=self.request.user)
+
+
+class RestoreArchivedTaskView(generics.GenericAPIView):
+    """
+    This view handles moving an archived task back into the active task list.
+
+    Attributes:
+    authentication_classes: The authentication classes used for this view.
+    permission_classes: The permission classes required for this view.
+
+    Methods:
+    get_queryset: Returns the archived tasks of the user's organization.
+    post: Restores the task if the user is the creator or a staff member.
+    """
+    queryset = ArchivedTask.objects.all()
+    serializer_class = TaskSerializer
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 20
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ArchivedTask.objects.none()
+        return ArchivedTask.objects.filter(organization_id=self.request.user.organization_id)
+
+    def post(self, request, *args, **kwargs):
+        archived = self.get_object()
+        if archived.created_by_id != request.user.id and not request.user.is_staff:
+            raise PermissionDenied("You do not have permission to restore this task.")
+        restore_tasks([archived.id])
+        task = Task.objects.prefetch_related('tags').get(id=archived.id)
+        return Response(self.get_serializer(task).data, status=status.HTTP_200_OK)
@@ -1,21 +1,53 @@
 # admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User
+from core.paginator import EstimatedCountPaginator
+from .models import Organization, User
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 
+
+class OrganizationFilter(admin.SimpleListFilter):
+    """
+    Filters by an organization slug typed into a text box, instead of listing every organization in the sidebar.
+    """
+    title = 'organization'
+    parameter_name = 'organization'
+    template = 'admin/organization_filter.html'
+
+    def lookups(self, request, model_admin):
+        # A single placeholder: the template renders the text box, but an empty list would hide the filter.
+        return (('', ''),)
+
+    def choices(self, changelist):
+        # The other active parameters go into hidden inputs so that submitting the slug keeps them.
+        yield {
+            'value': self.value() or '',
+            'params': [(name, value) for name, value in changelist.params.items()
+                       if name not in (self.parameter_name, 'p')],
+        }
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(organization__slug=self.value())
+        return queryset
+
+
 class UserAdmin(BaseUserAdmin):
     add_form = CustomUserCreationForm
     form = CustomUserChangeForm
 
-    list_display = ('email', 'username', 'is_staff', 'is_superuser', 'is_active')
-    list_filter = ('is_staff', 'is_superuser', 'is_active')
-    search_fields = ('email', 'username')
+    list_display = ('email', 'username', 'organization', 'is_staff', 'is_superuser', 'is_active')
+    list_select_related = ('organization',)
+    list_filter = ('is_staff', 'is_superuser', 'is_active', OrganizationFilter)
+    # Prefix matches; these also back the task and comment admin autocomplete widgets.
+    search_fields = ('^email', '^username')
     ordering = ('email',)
     filter_horizontal = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
-        (None, {'fields': ('email', 'username', 'password')}),
+        (None, {'fields': ('email', 'username', 'password', 'organization')}),
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
@@ -23,8 +55,15 @@ class UserAdmin(BaseUserAdmin):
     add_fieldsets = (
         (None, {
             'classes': ('wide',),
-            'fields': ('email', 'username', 'password1', 'password2'),
+            'fields': ('email', 'username', 'organization', 'password1', 'password2'),
         }),
     )
 
 admin.site.register(User, UserAdmin)
+
+
+@admin.register(Organization)
+class OrganizationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'created_at')
+    search_fields = ('^name', '^slug')
+    prepopulated_fields = {'slug': ('name',)}
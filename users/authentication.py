@@ -0,0 +1,78 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.instrumentation import timer
+from .caching import get_cached_user
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    simplejwt's JWTAuthentication, reporting its time to the ``auth`` Server-Timing phase
+    and loading the user from the user cache (see users/caching.py) instead of the database.
+    """
+
+    def authenticate(self, request):
+        with timer('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        # Same checks as simplejwt's get_user.
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Channels middleware that sets ``scope['user']`` from a JWT access token.
+
+    Replaces ``AuthMiddlewareStack`` for websockets, which loaded the session from
+    the database on every connection. The token is read from the ``token`` query
+    parameter (browsers can't set headers on websocket requests) or an
+    ``Authorization: Bearer`` header. Without a valid token the user is anonymous.
+    """
+
+    authentication_class = JWTAuthentication
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope, user=await self.get_user(scope))
+        return await super().__call__(scope, receive, send)
+
+    def get_raw_token(self, scope):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if token:
+            return token[0].encode()
+        header = dict(scope.get('headers', [])).get(b'authorization')
+        if header:
+            return self.authentication_class().get_raw_token(header)
+        return None
+
+    async def get_user(self, scope):
+        raw_token = self.get_raw_token(scope)
+        if raw_token is None:
+            return AnonymousUser()
+        auth = self.authentication_class()
+        try:
+            validated_token = auth.get_validated_token(raw_token)
+            return await database_sync_to_async(auth.get_user)(validated_token)
+        except (InvalidToken, AuthenticationFailed):
+            return AnonymousUser()
@@ -0,0 +1,188 @@
+"""
+Authentication backend that verifies passwords in a bounded executor.
+
+A password check costs hundreds of milliseconds of CPU by design. Run on the
+request thread, a burst of logins (e.g. every client reconnecting after an
+outage) occupies every worker and starves the rest of the API. Instead,
+``OffloadedModelBackend`` hands the hash work to ``LoginVerifier``: a thread
+pool of ``LOGIN_VERIFY_WORKERS`` (the hashers release the GIL) with room for
+``LOGIN_VERIFY_QUEUE_SIZE`` waiting checks. A login that finds the queue full,
+or waits longer than ``LOGIN_VERIFY_TIMEOUT`` seconds, fails fast with a 503
+and a ``Retry-After`` header.
+
+It is used for every ``authenticate()`` call: ``/api/login/``, ``/api/token/`` and the admin.
+DRF turns ``LoginUnavailable`` into the 503 for the API views; for other views,
+such as the admin login form, ``LoginUnavailableMiddleware`` does.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.metrics import REGISTRY
+from .hashing import verify_password
+
+VERIFY_DURATION = REGISTRY.histogram(
+    'login_password_verify_seconds',
+    'Time spent hashing in the login executor.',
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    'login_queue_wait_seconds',
+    'Time login password checks waited for a free executor thread.',
+)
+PENDING = REGISTRY.gauge(
+    'login_pending',
+    'Login password checks running or queued in the executor.',
+)
+REJECTED = REGISTRY.counter(
+    'login_rejected_total',
+    'Logins rejected with 503 because the executor was saturated or too slow.',
+    ('reason',),
+)
+
+
+class LoginUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many login attempts in progress, try again shortly.'
+    default_code = 'login_unavailable'
+
+    def __init__(self, wait=None):
+        super().__init__()
+        # DRF's exception handler turns `wait` into a Retry-After header.
+        self.wait = wait
+
+
+class LoginVerifier:
+    """
+    A thread pool with a bounded queue that rejects work instead of queueing indefinitely.
+
+    Attributes:
+    workers: Threads hashing concurrently.
+    queue_size: Checks allowed to wait for a thread.
+    timeout: Seconds a caller waits for its result before giving up.
+    """
+
+    def __init__(self, workers, queue_size, timeout, retry_after=1):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-verify')
+
+    def _release(self, future):
+        PENDING.dec()
+        self._slots.release()
+
+    def run(self, fn, *args):
+        """
+        Runs ``fn(*args)`` in the pool and returns its result.
+
+        Raises:
+        LoginUnavailable
+            If the pool and its queue are full, or the result takes longer than ``timeout``.
+        """
+        if not self._slots.acquire(blocking=False):
+            REJECTED.inc(reason='saturated')
+            raise LoginUnavailable(wait=self.retry_after)
+        PENDING.inc()
+        queued = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            QUEUE_WAIT.observe(started - queued)
+            try:
+                return fn(*args)
+            finally:
+                VERIFY_DURATION.observe(time.perf_counter() - started)
+
+        try:
+            future = self._executor.submit(task)
+        except RuntimeError:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Frees the slot now if the check hasn't started; otherwise when it finishes.
+            future.cancel()
+            REJECTED.inc(reason='timeout')
+            raise LoginUnavailable(wait=self.retry_after)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_login_verifier():
+    """
+    Returns the process-wide ``LoginVerifier``, built from settings on first use.
+    """
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                _verifier = LoginVerifier(
+                    workers=settings.LOGIN_VERIFY_WORKERS,
+                    queue_size=settings.LOGIN_VERIFY_QUEUE_SIZE,
+                    timeout=settings.LOGIN_VERIFY_TIMEOUT,
+                    retry_after=settings.LOGIN_RETRY_AFTER,
+                )
+    return _verifier
+
+
+class OffloadedModelBackend(ModelBackend):
+    """
+    ``ModelBackend`` that verifies the password in the login executor.
+
+    The user is fetched and an upgraded hash saved on the request thread, so the
+    executor threads never open database connections.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so that unknown and known users take the same time (as ModelBackend does).
+            get_login_verifier().run(make_password, password)
+            return None
+
+        is_correct, upgraded = get_login_verifier().run(verify_password, password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+        if upgraded:
+            user.password = upgraded
+            user.save(update_fields=['password'])
+        return user
+
+
+class LoginUnavailableMiddleware(MiddlewareMixin):
+    """
+    Answers a ``LoginUnavailable`` raised outside DRF views (e.g. the admin login) with a 503 and ``Retry-After``.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, LoginUnavailable):
+            return None
+        response = HttpResponse(str(exception.detail), status=exception.status_code, content_type='text/plain')
+        if exception.wait is not None:
+            response['Retry-After'] = str(exception.wait)
+        return response
@@ -0,0 +1,59 @@
+"""
+Cached ``User`` lookups by id.
+
+JWT authentication (HTTP and websockets) resolves users through
+``get_cached_user`` instead of a query per request. Only the fields in
+``CACHED_FIELDS`` are cached, never the password hash; the returned users have
+the other fields deferred, so reading one costs a query. Saving or deleting a
+user invalidates its entry in every worker (see ``core/caching.py``); users
+changed with ``QuerySet.update()`` must call ``user_cache.invalidate(user_id)``
+themselves.
+"""
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.caching import TwoTierCache
+from .models import User
+
+# What authentication, permissions and the user serializers read.
+CACHED_FIELDS = ('id', 'email', 'username', 'organization_id', 'is_active', 'is_staff', 'is_superuser')
+
+user_cache = TwoTierCache('users')
+
+
+def _load(user_ids):
+    return {row['id']: row for row in User.objects.filter(id__in=user_ids).values(*CACHED_FIELDS)}
+
+
+def _build(row):
+    # A fresh instance per call, so changes made while serving one request don't leak into others.
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in row]
+    return User.from_db(DEFAULT_DB_ALIAS, names, [row[name] for name in names])
+
+
+def get_cached_user(user_id):
+    """
+    Returns the user with this id, or None.
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    row = user_cache.get(user_id, lambda: _load([user_id]).get(user_id))
+    return _build(row) if row is not None else None
+
+
+def get_cached_users(user_ids):
+    """
+    Returns ``{id: user}`` for the existing users among ``user_ids``, loading the uncached ones with one query.
+    """
+    rows = user_cache.get_many(list(user_ids), _load)
+    return {user_id: _build(row) for user_id, row in rows.items()}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
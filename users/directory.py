@@ -0,0 +1,123 @@
+"""
+User search for assignee pickers.
+
+``/api/users/search/?q=<prefix>`` returns the active users of the requester's
+organization whose username starts with ``prefix``, or whose email is ``q``,
+ignoring case, ordered by the matched value. Emails are only matched whole and
+never returned, since self-registered users all share the default organization
+and must not be able to list each other's addresses. Each field is read from
+its ``(organization, LOWER(field), id)`` index, so a page costs two short index
+scans however many users exist. Users matching on both fields are only taken
+from the username scan, which keeps the two lists disjoint; they are merged
+in Python and paginated with a keyset cursor, not an OFFSET.
+
+Without ``q`` the endpoint returns the users the requester recently assigned
+tasks to. ``remember_assignee`` keeps the last ``USER_RECENT_ASSIGNEES`` of
+them per user in the shared cache; the users are then read through the user
+cache (see ``users/caching.py``).
+"""
+
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from core.tenancy import TenantCache
+from .caching import get_cached_users
+from .models import User
+
+# Sorts after every character, so [prefix, prefix + MAX_CHAR) holds exactly the values starting with prefix.
+MAX_CHAR = '\U0010ffff'
+USER_FIELDS = ('id', 'username')
+
+
+class SearchCursor:
+    """
+    The position after the last user of a page: the matched value (lowercased) and the user id.
+    """
+
+    def __init__(self, key, user_id):
+        self.key = key
+        self.user_id = user_id
+
+    @classmethod
+    def decode(cls, value):
+        """
+        Raises:
+        ValueError
+            If ``value`` isn't a cursor returned by ``encode``.
+        """
+        try:
+            key, user_id = json.loads(base64.urlsafe_b64decode(value.encode()))
+        except (binascii.Error, TypeError, UnicodeError, json.JSONDecodeError) as exc:
+            raise ValueError(value) from exc
+        if not isinstance(key, str) or not isinstance(user_id, int):
+            raise ValueError(value)
+        return cls(key, user_id)
+
+    def encode(self):
+        return base64.urlsafe_b64encode(json.dumps([self.key, self.user_id]).encode()).decode()
+
+
+def search_queryset(organization_id, field, prefix, after=None, exact=False):
+    """
+    Returns the active users of the organization whose lowercased ``field`` starts with ``prefix``
+    (or equals it, if ``exact``), in index order.
+    """
+    users = User.objects.filter(organization_id=organization_id, is_active=True).annotate(key=Lower(field))
+    users = users.filter(key=prefix) if exact else users.filter(key__gte=prefix, key__lt=prefix + MAX_CHAR)
+    if after is not None:
+        users = users.filter(Q(key__gt=after.key) | Q(key=after.key, id__gt=after.user_id))
+    return users.order_by('key', 'id').values(*USER_FIELDS, 'key')
+
+
+def search_users(organization_id, prefix, limit, after=None):
+    """
+    Returns up to ``limit`` users matching the (non-empty) ``prefix`` after the cursor ``after``, and the cursor of the next page.
+
+    Returns:
+    tuple
+        A list of ``{'id', 'username'}`` dicts and a ``SearchCursor``, or None on the last page.
+    """
+    prefix = prefix.strip().lower()
+    by_username = search_queryset(organization_id, 'username', prefix, after)
+    # Users whose username matches too come from the first scan.
+    by_email = (
+        search_queryset(organization_id, 'email', prefix, after, exact=True)
+        .alias(lower_username=Lower('username')).exclude(lower_username__startswith=prefix)
+    )
+    matches = sorted([*by_username[:limit + 1], *by_email[:limit + 1]], key=lambda user: (user['key'], user['id']))
+    page = matches[:limit]
+    cursor = SearchCursor(page[-1]['key'], page[-1]['id']) if len(matches) > limit else None
+    return [{field: user[field] for field in USER_FIELDS} for user in page], cursor
+
+
+def _recent_key(user_id):
+    return f"recent_assignees:{user_id}"
+
+
+def remember_assignee(user, assignee_id):
+    """
+    Moves ``assignee_id`` to the front of the users ``user`` recently assigned tasks to.
+    """
+    if assignee_id is None or not settings.USER_RECENT_ASSIGNEES:
+        return
+    cache = TenantCache(user.organization_id)
+    recent = [assignee_id, *(pk for pk in cache.get(_recent_key(user.id), []) if pk != assignee_id)]
+    cache.set(_recent_key(user.id), recent[:settings.USER_RECENT_ASSIGNEES], settings.USER_RECENT_ASSIGNEES_TTL)
+
+
+def recent_assignees(user):
+    """
+    Returns the users ``user`` recently assigned tasks to, most recent first, as ``{'id', 'username'}`` dicts.
+    """
+    ids = TenantCache(user.organization_id).get(_recent_key(user.id), [])
+    users = get_cached_users(ids) if ids else {}
+    return [
+        {field: getattr(users[pk], field) for field in USER_FIELDS}
+        for pk in ids
+        if pk in users and users[pk].is_active and users[pk].organization_id == user.organization_id
+    ]
@@ -8,7 +8,7 @@ class CustomUserCreationForm(forms.ModelForm):
 
     class Meta:
         model = User
-        fields = ('email', 'username')
+        fields = ('email', 'username', 'organization')
 
     def clean_password2(self):
         password1 = self.cleaned_data.get("password1")
@@ -27,4 +27,4 @@ class CustomUserCreationForm(forms.ModelForm):
 class CustomUserChangeForm(forms.ModelForm):
     class Meta:
         model = User
-        fields = ('email', 'username', 'is_active', 'is_staff', 'is_superuser')
+        fields = ('email', 'username', 'organization', 'is_active', 'is_staff', 'is_superuser')
@@ -0,0 +1,127 @@
+"""
+Password hashing.
+
+``TunedPBKDF2PasswordHasher`` is the default hasher; its work factor comes from
+``PASSWORD_HASH_ITERATIONS`` (see ``manage.py benchmark_hashers``), and hashes
+made with another work factor are upgraded on the next successful login.
+``verify_password`` is the CPU-heavy half of a login, run off the request
+thread by ``users.backends``. ``hash_passwords`` spreads bulk hashing over a
+pool of ``USER_PROVISIONING_WORKERS`` processes shared by the whole process.
+
+This module must not import models: spawned pool workers import it before
+Django is set up.
+"""
+
+import math
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher, identify_hasher, make_password
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count from ``PASSWORD_HASH_ITERATIONS``.
+
+    Uses the ``pbkdf2_sha256`` algorithm name, so existing hashes verify unchanged;
+    ``must_update`` flags hashes made with a different iteration count.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+
+def verify_password(password, encoded):
+    """
+    Checks ``password`` against ``encoded`` without touching the database.
+
+    Mirrors ``django.contrib.auth.hashers.check_password``, but instead of saving an
+    upgraded hash it returns it, so the caller can store it from its own thread.
+
+    Returns:
+    tuple
+        ``(is_correct, new_encoded)``; ``new_encoded`` is None unless the hash should be upgraded.
+    """
+    if password is None or not encoded:
+        return False, None
+    preferred = get_hasher('default')
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False, None
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = hasher.verify(password, encoded)
+    if not is_correct and not hasher_changed and must_update:
+        # Equalize the time taken whatever the stored work factor, as Django does.
+        hasher.harden_runtime(password, encoded)
+    if is_correct and must_update:
+        return True, make_password(password)
+    return is_correct, None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker(settings_module):
+    # Pool workers are spawned, not forked, so they need their own Django setup.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def hash_pool_size():
+    return settings.USER_PROVISIONING_WORKERS or os.cpu_count() or 1
+
+
+def get_hash_executor():
+    """
+    Returns the process pool used to hash passwords, creating it on first use.
+
+    The pool has ``hash_pool_size()`` processes and is shared by every thread, so
+    concurrent provisioning requests don't each start one.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 'spawn' because forking a process that runs threads (ASGI servers, DB
+            # connections) can deadlock the child.
+            _executor = ProcessPoolExecutor(
+                max_workers=hash_pool_size(),
+                mp_context=get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'),),
+            )
+        return _executor
+
+
+def _make_passwords(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hashes ``passwords`` with the default hasher on up to ``workers`` processes of the pool.
+
+    Parameters:
+    workers : int
+        Processes to keep busy, at most ``hash_pool_size()`` (the default); 1 hashes in this process.
+
+    Returns:
+    list
+        The encoded passwords, in input order.
+    """
+    passwords = list(passwords)
+    workers = min(workers or hash_pool_size(), hash_pool_size(), len(passwords))
+    if workers <= 1:
+        return _make_passwords(passwords)
+    # One chunk per process bounds how much of the shared pool this call takes.
+    size = math.ceil(len(passwords) / workers)
+    chunks = [passwords[start:start + size] for start in range(0, len(passwords), size)]
+    return [encoded for chunk in get_hash_executor().map(_make_passwords, chunks) for encoded in chunk]
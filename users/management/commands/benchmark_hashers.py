@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Times every hasher in PASSWORD_HASHERS on this machine and, with --target-ms, suggests the "
+        "PASSWORD_HASH_ITERATIONS that makes one PBKDF2 hash take that long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--target-ms', type=float, default=None)
+
+    def time_hasher(self, hasher, rounds):
+        salt = hasher.salt()
+        hasher.encode('benchmark-password', salt)  # warm-up, loads the library
+        started = time.perf_counter()
+        for _ in range(rounds):
+            hasher.encode('benchmark-password', salt)
+        return (time.perf_counter() - started) / rounds * 1000
+
+    def handle(self, *args, **options):
+        default = None
+        for hasher in get_hashers():
+            try:
+                elapsed_ms = self.time_hasher(hasher, options['rounds'])
+            except ValueError as exc:
+                # Raised by hashers whose library (argon2-cffi, bcrypt) isn't installed.
+                self.stdout.write(f"{hasher.algorithm:<22} skipped: {exc}")
+                continue
+            self.stdout.write(f"{hasher.algorithm:<22} {elapsed_ms:>9.1f} ms/hash  ({type(hasher).__name__})")
+            if default is None:
+                default = (hasher, elapsed_ms)
+
+        if options['target_ms'] and default and hasattr(default[0], 'iterations'):
+            hasher, elapsed_ms = default
+            suggested = max(1000, round(hasher.iterations * options['target_ms'] / elapsed_ms, -3))
+            self.stdout.write(self.style.SUCCESS(
+                f"PASSWORD_HASH_ITERATIONS = {int(suggested)}  "
+                f"(currently {settings.PASSWORD_HASH_ITERATIONS} at {elapsed_ms:.1f} ms)"
+            ))
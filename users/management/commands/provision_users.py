@@ -0,0 +1,63 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import Organization
+from users.provisioning import provision_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates users in bulk from a CSV (email,username,password) or JSON Lines file, hashing "
+        "passwords in a process pool and reporting rejected rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="A .csv file with a header row, or a .jsonl file with one user per line.")
+        parser.add_argument('--workers', type=int, default=None, help="Hashing processes, up to USER_PROVISIONING_WORKERS; defaults to all of them.")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--staff', action='store_true', help="Create the users with is_staff=True.")
+        parser.add_argument('--organization', default=None,
+                            help="Slug of the organization to create the users in; defaults to the default organization.")
+        parser.add_argument('--errors-output', default=None, help="Write rejected rows to this JSON file.")
+
+    def read_rows(self, path):
+        with open(path, newline='') as fh:
+            if path.endswith('.csv'):
+                rows = list(csv.DictReader(fh))
+            else:
+                rows = [json.loads(line) for line in fh if line.strip()]
+        for row in rows:
+            # Files carry a single password column.
+            row.setdefault('password2', row.get('password'))
+        return rows
+
+    def handle(self, *args, **options):
+        try:
+            rows = self.read_rows(options['path'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read {options['path']}: {exc}")
+
+        extra_fields = {'is_staff': True} if options['staff'] else {}
+        if options['organization']:
+            try:
+                extra_fields['organization_id'] = Organization.objects.get(slug=options['organization']).id
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization {options['organization']!r} does not exist.")
+        result = provision_users(
+            rows,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+            **extra_fields,
+        )
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row'] + 1}: {json.dumps(error['errors'])}")
+        if options['errors_output']:
+            with open(options['errors_output'], 'w') as fh:
+                json.dump(result.errors, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(result.created)} of {len(rows)} users; {len(result.errors)} rows rejected."
+        ))
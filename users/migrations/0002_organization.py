@@ -0,0 +1,39 @@
+# Generated by Django 4.2.15 on 2026-10-19 02:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import users.models
+
+
+def create_default_organization(apps, schema_editor):
+    # Existing users, tasks, tags and comments are assigned to this organization.
+    Organization = apps.get_model('users', 'Organization')
+    Organization.objects.get_or_create(
+        pk=settings.DEFAULT_ORGANIZATION_ID, defaults={'name': 'Default', 'slug': 'default'},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Organization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(create_default_organization, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='user',
+            name='organization',
+            field=models.ForeignKey(default=users.models.default_organization_id, on_delete=django.db.models.deletion.CASCADE, related_name='users', to='users.organization'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.15 on 2026-10-19 03:57
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_organization'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(models.F('organization'), django.db.models.functions.text.Lower('username'), models.F('id'), name='user_org_lower_username_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(models.F('organization'), django.db.models.functions.text.Lower('email'), models.F('id'), name='user_org_lower_email_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.15 on 2026-10-19 06:10
+
+from django.core.management.color import no_style
+from django.db import migrations
+
+
+def reset_organization_sequence(apps, schema_editor):
+    # 0002 inserts the default organization with an explicit id, which doesn't advance
+    # the id sequence on PostgreSQL (or Oracle); without this the next create() collides.
+    Organization = apps.get_model('users', 'Organization')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Organization]):
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_organization_sequence, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,34 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
 
+class Organization(models.Model):
+    """
+    A tenant. Every user, task, tag and comment belongs to exactly one organization.
+    """
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+def default_organization_id():
+    """
+    Returns the id of the organization rows belong to when none is given.
+
+    That organization is created by the ``users`` migrations. Keeps single-tenant
+    installs and self-registration working without a database query per instance;
+    the API always passes the requesting user's organization explicitly.
+    """
+    return settings.DEFAULT_ORGANIZATION_ID
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, username, password=None, **extra_fields):
         if not email:
@@ -32,12 +58,22 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_superuser = models.BooleanField(default=False)
     last_login = models.DateTimeField(blank=True, null=True)
     date_joined = models.DateTimeField(default=timezone.now)
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name='users', default=default_organization_id,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
     objects = UserManager()
 
+    class Meta:
+        indexes = [
+            # Case-insensitive prefix search as ranges on LOWER(...) (see users/directory.py).
+            models.Index(F('organization'), Lower('username'), 'id', name='user_org_lower_username_idx'),
+            models.Index(F('organization'), Lower('email'), 'id', name='user_org_lower_email_idx'),
+        ]
+
     def __str__(self):
         return f"{self.username} | {self.email}"
 
@@ -0,0 +1,142 @@
+"""
+Bulk user provisioning.
+
+``provision_users`` creates many users at once: every row is validated with
+``ProvisionUserSerializer`` (no database access), emails and usernames are
+checked against the database with one set query per batch, passwords are
+hashed in a process pool across all cores, and users are inserted with
+``bulk_create``. Rows that fail are reported individually instead of failing
+the whole import. Used by ``POST /api/users/bulk/`` and
+``manage.py provision_users``.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .hashing import hash_passwords
+from .models import User
+from .serializers import ProvisionUserSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class ProvisioningResult:
+    """
+    The outcome of a bulk provisioning run.
+
+    Attributes:
+    created: The created users.
+    errors: ``{'row': index, 'errors': {...}}`` dicts, one per rejected row.
+    """
+
+    def __init__(self):
+        self.created = []
+        self.errors = []
+
+    def reject(self, row, errors):
+        self.errors.append({'row': row, 'errors': errors})
+
+
+def _validate_rows(rows, result):
+    valid = []
+    for index, row in enumerate(rows):
+        serializer = ProvisionUserSerializer(data=row)
+        if not serializer.is_valid():
+            result.reject(index, serializer.errors)
+            continue
+        data = serializer.validated_data
+        data['email'] = User.objects.normalize_email(data['email'])
+        valid.append((index, data))
+    return valid
+
+
+def _reject_conflicts(batch, result, seen_emails, seen_usernames):
+    # One query for the whole batch instead of an exists() per row.
+    emails = {data['email'] for _, data in batch}
+    usernames = {data['username'] for _, data in batch}
+    taken = User.objects.filter(Q(email__in=emails) | Q(username__in=usernames)).values_list('email', 'username')
+    taken_emails = {email for email, _ in taken}
+    taken_usernames = {username for _, username in taken}
+    taken_emails.update(seen_emails)
+    taken_usernames.update(seen_usernames)
+
+    accepted = []
+    for index, data in batch:
+        errors = {}
+        if data['email'] in taken_emails:
+            errors['email'] = ["This email is already in use."]
+        if data['username'] in taken_usernames:
+            errors['username'] = ["This username is already in use."]
+        if errors:
+            result.reject(index, errors)
+            continue
+        # Later rows with the same email/username conflict with this one.
+        taken_emails.add(data['email'])
+        taken_usernames.add(data['username'])
+        seen_emails.add(data['email'])
+        seen_usernames.add(data['username'])
+        accepted.append((index, data))
+    return accepted
+
+
+def _insert(accepted, users, result):
+    try:
+        with transaction.atomic():
+            result.created.extend(User.objects.bulk_create(users))
+        return
+    except IntegrityError:
+        # Someone registered one of these users since the conflict check; find which row.
+        pass
+    for (index, data), user in zip(accepted, users):
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+            result.created.append(user)
+        except IntegrityError:
+            result.reject(index, {'non_field_errors': ["A user with this email or username already exists."]})
+
+
+def provision_users(rows, workers=None, batch_size=None, log=None, **extra_fields):
+    """
+    Validates and creates users from ``rows`` of ``email``/``username``/``password``/``password2`` dicts.
+
+    Parameters:
+    rows : list
+        The users to create.
+    workers : int
+        Password-hashing processes, up to ``USER_PROVISIONING_WORKERS``; 1 hashes in this process.
+    batch_size : int
+        Rows per conflict query and ``bulk_create``; defaults to ``USER_PROVISIONING_BATCH_SIZE``.
+    log : callable
+        Called with a progress message after each batch.
+    extra_fields :
+        Set on every created user, e.g. ``is_staff=True`` or ``organization_id``.
+
+    Returns:
+    ProvisioningResult
+        The created users and the per-row errors.
+    """
+    batch_size = batch_size or settings.USER_PROVISIONING_BATCH_SIZE
+    result = ProvisioningResult()
+    valid = _validate_rows(rows, result)
+    seen_emails, seen_usernames = set(), set()
+
+    for start in range(0, len(valid), batch_size):
+        accepted = _reject_conflicts(valid[start:start + batch_size], result, seen_emails, seen_usernames)
+        if not accepted:
+            continue
+        hashes = hash_passwords([data['password'] for _, data in accepted], workers=workers)
+        users = [
+            User(email=data['email'], username=data['username'], password=encoded, **extra_fields)
+            for (_, data), encoded in zip(accepted, hashes)
+        ]
+        _insert(accepted, users, result)
+        if log:
+            log(f"Created {len(result.created)} users, rejected {len(result.errors)} rows")
+
+    result.errors.sort(key=lambda error: error['row'])
+    logger.info("Provisioned %d users, rejected %d rows", len(result.created), len(result.errors))
+    return result
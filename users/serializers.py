@@ -1,11 +1,32 @@
 
+from django.conf import settings
 from rest_framework import serializers
 from .models import User
 from django.contrib.auth import authenticate
 from django.core.exceptions import ValidationError
+from core.instrumentation import TimedSerializerMixin
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    The public fields of a user, as embedded in other resources.
+    """
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'email')
+        read_only_fields = fields
+
+
+class UserSearchResultSerializer(UserSummarySerializer):
+    """
+    A user as listed by the user search, without the email address.
+    """
+    class Meta(UserSummarySerializer.Meta):
+        fields = ('id', 'username')
+        read_only_fields = fields
+
+
+class RegisterSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for user registration. Validates and creates new user instances.
     """
@@ -61,6 +82,45 @@ class RegisterSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
+class ProvisionUserSerializer(RegisterSerializer):
+    """
+    Validates one row of a bulk provisioning request without querying the database.
+
+    Email and username uniqueness is checked for the whole batch at once by ``users.provisioning``.
+    """
+
+    class Meta(RegisterSerializer.Meta):
+        extra_kwargs = {
+            'email': {'validators': []},
+            'username': {'validators': []},
+        }
+
+    def validate(self, attrs):
+        """
+        Checks that the passwords match and the username is long enough.
+        """
+        if attrs['password'] != attrs['password2']:
+            raise serializers.ValidationError({"password": "Password fields didn't match."})
+        if len(attrs['username']) < 3:
+            raise serializers.ValidationError({"username": "Username must be at least 3 characters long."})
+        return attrs
+
+
+class BulkProvisionSerializer(serializers.Serializer):
+    """
+    Request body for bulk provisioning: a list of users, each validated by ``ProvisionUserSerializer``.
+    """
+    users = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_users(self, value):
+        """
+        Caps the number of rows per request; larger imports use ``manage.py provision_users``.
+        """
+        limit = settings.USER_PROVISIONING_MAX_ROWS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} users per request.")
+        return value
+
 class LoginSerializer(serializers.Serializer):
     """
     Serializer for user login. Validates email and password, and returns user tokens if successful.
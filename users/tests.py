@@ -1,3 +1,401 @@
-from django.test import TestCase
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import check_password
+from django.test import TestCase, TransactionTestCase, override_settings, tag
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.caching import LRUCache, TwoTierCache, clear_local_caches
+from core.query_budget import QueryBudgetTestMixin
+from .authentication import JWTAuthentication, JWTAuthMiddleware
+from .backends import LoginUnavailable, LoginVerifier
+from .caching import CACHED_FIELDS, get_cached_user, user_cache
+from .hashing import get_hash_executor
+from .provisioning import hash_passwords, provision_users
+from .models import Organization, User
+
+
+@tag('query_budget')
+class UserQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    password = 'pass12345'
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root@gmail.com', 'root', self.password)
+        self.client = APIClient()
+        self.access = str(RefreshToken.for_user(self.admin).access_token)
+        self.counter = itertools.count()
+
+    def grow(self):
+        n = next(self.counter)
+        User.objects.create_user(f'grow{n}@gmail.com', f'grow{n}', self.password)
+
+    def new_user_data(self):
+        n = next(self.counter)
+        return {'email': f'new{n}@gmail.com', 'username': f'new{n}', 'password': self.password, 'password2': self.password}
+
+    def fresh_refresh(self):
+        return {'refresh': str(RefreshToken.for_user(self.admin))}
+
+    def test_register(self):
+        self.assertQueryBudget(
+            lambda data: self.client.post(reverse('register'), data), self.grow, prepare=self.new_user_data,
+        )
+
+    def test_admin_register(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertQueryBudget(
+            lambda data: self.client.post(reverse('admin-register'), data), self.grow, prepare=self.new_user_data,
+        )
+
+    def test_bulk_provision(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertQueryBudget(
+            lambda data: self.client.post(reverse('user-bulk-provision'), data, format='json'),
+            self.grow,
+            prepare=lambda: {'users': [self.new_user_data(), self.new_user_data()]},
+        )
+
+    def test_user_batch(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+        def ids():
+            return list(User.objects.values_list('id', flat=True))
+
+        self.assertQueryBudget(
+            lambda user_ids: self.client.get(reverse('user-batch'), {'ids': ','.join(map(str, user_ids))}),
+            self.grow, prepare=ids,
+        )
+        self.assertQueryBudget(
+            lambda user_ids: self.client.post(reverse('user-batch'), {'ids': user_ids}, format='json'),
+            self.grow, prepare=ids,
+        )
+
+    def test_user_search(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertQueryBudget(lambda: self.client.get(reverse('user-search'), {'q': 'GROW', 'limit': 3}), self.grow)
+        self.assertQueryBudget(lambda: self.client.get(reverse('user-search')), self.grow)
+
+    def test_login(self):
+        credentials = {'email': 'root@gmail.com', 'password': self.password}
+        self.assertQueryBudget(lambda: self.client.post(reverse('login'), credentials), self.grow)
+        self.assertQueryBudget(lambda: self.client.post(reverse('token_obtain_pair'), credentials), self.grow)
+
+    def test_logout(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertQueryBudget(
+            lambda data: self.client.post(reverse('logout'), data), self.grow, prepare=self.fresh_refresh,
+        )
+
+    def test_token_endpoints(self):
+        for name in ('token_refresh', 'token_blacklist'):
+            self.assertQueryBudget(
+                lambda data: self.client.post(reverse(name), data), self.grow, prepare=self.fresh_refresh,
+            )
+        self.assertQueryBudget(
+            lambda: self.client.post(reverse('token_verify'), {'token': self.access}), self.grow,
+        )
+
+
+class LeanMiddlewareTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('root@gmail.com', 'root', 'pass12345')
+
+    def test_api_skips_session_csrf_and_messages(self):
+        self.client.force_login(self.admin)
+        access = RefreshToken.for_user(self.admin).access_token
+        response = self.client.get('/api/tasks/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 200)
+        for attribute in ('session', '_messages', 'csrf_processing_done'):
+            self.assertFalse(hasattr(response.wsgi_request, attribute), attribute)
+
+    def test_admin_keeps_full_stack(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.admin)
+        self.assertTrue(hasattr(response.wsgi_request, '_messages'))
+
+
+class JWTAuthMiddlewareTests(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        self.user = User.objects.create_user('ws@gmail.com', 'ws', 'pass12345')
+
+    def scope_user(self, **scope):
+        seen = {}
+
+        async def app(scope, receive, send):
+            seen['user'] = scope['user']
+
+        async_to_sync(JWTAuthMiddleware(app))({'type': 'websocket', **scope}, None, None)
+        return seen['user']
+
+    def test_token_from_query_string_or_header(self):
+        access = str(RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(self.scope_user(query_string=f'token={access}'.encode()), self.user)
+        self.assertEqual(self.scope_user(headers=[(b'authorization', f'Bearer {access}'.encode())]), self.user)
+
+    def test_missing_or_invalid_token_is_anonymous(self):
+        self.assertTrue(self.scope_user().is_anonymous)
+        self.assertTrue(self.scope_user(query_string=b'token=garbage').is_anonymous)
+
+
+class TwoTierCacheTests(TestCase):
+    def test_lru_evicts_least_recently_used_and_expired(self):
+        evicted = []
+        lru = LRUCache(maxsize=2, ttl=60, on_evict=evicted.append)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b', None), lru.get('c')), (1, None, 3))
+        with mock.patch('core.caching.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(lru.get('a', None))
+        self.assertEqual(evicted, ['size', 'expired'])
+
+    def test_invalidation_reaches_other_workers(self):
+        # Two instances of the same cache stand in for two workers sharing the default cache.
+        here, there = TwoTierCache('test'), TwoTierCache('test')
+        here.shared.delete(here.shared_key('k'))
+        loads = []
+
+        def load(key):
+            loads.append(key)
+            return len(loads)
+
+        self.assertEqual(here.get('k', lambda: load('k')), 1)
+        self.assertEqual(there.get('k', lambda: load('k')), 1)  # from the shared tier
+        here.invalidate('k')
+        with override_settings(CACHE_VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(there.get('k', lambda: load('k')), 2)
+        self.assertEqual(loads, ['k', 'k'])
+        self.assertEqual(here.stats()['misses'], 2)
+
+    def test_invalidation_only_drops_that_key(self):
+        here, there = TwoTierCache('test-keys'), TwoTierCache('test-keys')
+        here.shared.delete_many([here.shared_key('a'), here.shared_key('b')])
+        there.get('a', lambda: 'a1')
+        there.get('b', lambda: 'b1')
+        here.shared.set(here.shared_key('b'), 'b2')  # Only reached if b left the local tier.
+        here.invalidate('a')
+        with override_settings(CACHE_VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(there.get('a', lambda: 'a2'), 'a2')
+            self.assertEqual(there.get('b', lambda: 'b3'), 'b1')
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        clear_local_caches()
+        self.user = User.objects.create_user('cached@gmail.com', 'cached', 'pass12345')
+        self.token = JWTAuthentication().get_validated_token(str(RefreshToken.for_user(self.user).access_token))
+
+    def test_authentication_reads_the_user_once(self):
+        self.assertEqual(JWTAuthentication().get_user(self.token), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(JWTAuthentication().get_user(self.token), self.user)
+
+    def test_password_hashes_are_not_cached(self):
+        JWTAuthentication().get_user(self.token)
+        cached = user_cache.shared.get(user_cache.shared_key(self.user.id))
+        self.assertEqual(set(cached), set(CACHED_FIELDS))
+        user = get_cached_user(self.user.id)
+        self.assertEqual((user.email, user.organization_id), (self.user.email, self.user.organization_id))
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('pass12345'))
+
+    def test_saving_the_user_invalidates_it(self):
+        JWTAuthentication().get_user(self.token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            JWTAuthentication().get_user(self.token)
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            JWTAuthentication().get_user(self.token)
+
+
+class UserBatchTests(TestCase):
+    def test_only_users_of_the_same_organization(self):
+        acme = Organization.objects.create(name='Acme', slug='acme')
+        me = User.objects.create_user('me@gmail.com', 'me', 'pass12345')
+        colleague = User.objects.create_user('colleague@gmail.com', 'colleague', 'pass12345')
+        outsider = User.objects.create_user('outsider@gmail.com', 'outsider', 'pass12345', organization=acme)
+        client = APIClient()
+        client.force_authenticate(me)
+        response = client.get(reverse('user-batch'), {'ids': f'{colleague.id},{outsider.id},{me.id}'})
+        self.assertEqual(response.data, {
+            'results': [
+                {'id': colleague.id, 'username': 'colleague', 'email': 'colleague@gmail.com'},
+                {'id': me.id, 'username': 'me', 'email': 'me@gmail.com'},
+            ],
+            'missing': [outsider.id],
+            'forbidden': [],
+        })
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        clear_local_caches()
+        self.me = User.objects.create_user('me@gmail.com', 'me', 'pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def search(self, q, **params):
+        return self.client.get(reverse('user-search'), {'q': q, **params}).data
+
+    def test_prefix_on_username_or_email(self):
+        acme = Organization.objects.create(name='Acme', slug='acme')
+        for username, email in [('Anna', 'anna@gmail.com'), ('bob', 'Annie@gmail.com'), ('carl', 'carl@gmail.com'),
+                                ('annabel', 'x@gmail.com')]:
+            User.objects.create_user(email, username, 'pass12345')
+        User.objects.create_user('ann@acme.com', 'ann-acme', 'pass12345', organization=acme)
+        User.objects.create_user('ann@gone.com', 'ann-gone', 'pass12345', is_active=False)
+        data = self.search('ANN')
+        self.assertEqual([user['username'] for user in data['results']], ['Anna', 'annabel'])
+        self.assertEqual(set(data['results'][0]), {'id', 'username'})
+        self.assertIsNone(data['next'])
+        # Emails only match whole, so they can't be enumerated by prefix.
+        self.assertEqual([user['username'] for user in self.search('annie@gmail.com')['results']], ['bob'])
+        self.assertEqual(self.search('annie@')['results'], [])
+
+    def test_pages_with_a_cursor(self):
+        for n in range(7):
+            User.objects.create_user(f'page{n}@gmail.com', f'user{n}', 'pass12345')
+        User.objects.create_user('user@gmail.com', 'zed', 'pass12345')
+        seen, cursor = [], None
+        while True:
+            data = self.search('u', limit=3, **({'cursor': cursor} if cursor else {}))
+            seen += [user['username'] for user in data['results']]
+            cursor = data['next']
+            if cursor is None:
+                break
+        # zed's email starts with "u" too, but emails only match whole.
+        self.assertEqual(seen, [f'user{n}' for n in range(7)])
+        self.assertEqual(self.client.get(reverse('user-search'), {'q': 'u', 'cursor': 'junk'}).status_code, 400)
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_empty_query_lists_recent_assignees(self):
+        first = User.objects.create_user('first@gmail.com', 'first', 'pass12345')
+        second = User.objects.create_user('second@gmail.com', 'second', 'pass12345')
+        for assignee in (first, second, first):
+            self.client.post(reverse('task-list-create'), {'title': 't', 'description': 'd', 'assigned_to': assignee.id})
+        self.assertEqual([user['username'] for user in self.search('')['results']], ['first', 'second'])
+
+
+class ProvisioningTests(TestCase):
+    password = 'pass12345'
+
+    def row(self, email, username, password2=None):
+        return {'email': email, 'username': username, 'password': self.password, 'password2': password2 or self.password}
+
+    def test_creates_valid_rows_and_reports_the_rest(self):
+        User.objects.create_user('taken@gmail.com', 'taken', self.password)
+        rows = [
+            self.row('one@gmail.com', 'one'),
+            self.row('taken@gmail.com', 'fresh'),
+            self.row('two@gmail.com', 'one'),
+            self.row('three@example.org', 'three'),
+            self.row('four@gmail.com', 'four', password2='different'),
+            self.row('five@gmail.com', 'five'),
+        ]
+        # One conflict query and one INSERT (plus the savepoint around it).
+        with self.assertNumQueries(4):
+            result = provision_users(rows, workers=1)
+
+        self.assertEqual([user.username for user in result.created], ['one', 'five'])
+        self.assertEqual([error['row'] for error in result.errors], [1, 2, 3, 4])
+        self.assertIn('email', result.errors[0]['errors'])
+        self.assertIn('username', result.errors[1]['errors'])
+        user = User.objects.get(username='five')
+        self.assertEqual(user.email, 'five@gmail.com')
+        self.assertTrue(user.check_password(self.password))
+
+    def test_hashes_in_a_process_pool(self):
+        passwords = ['first-secret', 'second-secret', 'third-secret']
+        hashes = hash_passwords(passwords, workers=2)
+        self.assertTrue(all(check_password(p, h) for p, h in zip(passwords, hashes)))
+
+    def test_concurrent_callers_share_one_pool(self):
+        with ThreadPoolExecutor(max_workers=8) as threads:
+            executors = list(threads.map(lambda _: get_hash_executor(), range(8)))
+        self.assertEqual(len(set(map(id, executors))), 1)
+
+    def test_endpoint_requires_superuser(self):
+        member = User.objects.create_user('member@gmail.com', 'member', self.password)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(member).access_token}')
+        response = client.post(reverse('user-bulk-provision'), {'users': [self.row('x@gmail.com', 'xxx')]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        admin = User.objects.create_superuser('root@gmail.com', 'root', self.password)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+        response = client.post(reverse('user-bulk-provision'), {'users': [self.row('x@gmail.com', 'xxx')]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'][0]['email'], 'x@gmail.com')
+        self.assertEqual(response.data['errors'], [])
+
+        with override_settings(USER_PROVISIONING_MAX_ROWS=1):
+            rows = [self.row('y@gmail.com', 'yyy'), self.row('z@gmail.com', 'zzz')]
+            response = client.post(reverse('user-bulk-provision'), {'users': rows}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(email='y@gmail.com').exists())
+
+
+class LoginVerifierTests(TestCase):
+    password = 'pass12345'
+
+    def test_rejects_when_saturated(self):
+        verifier = LoginVerifier(workers=1, queue_size=0, timeout=5)
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=verifier.run, args=(block,))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(LoginUnavailable):
+                verifier.run(lambda: None)
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual(verifier.run(lambda: 'ok'), 'ok')
+        verifier.shutdown()
+
+    def test_login_returns_503_with_retry_after_when_saturated(self):
+        User.objects.create_user('busy@gmail.com', 'busy', self.password)
+        saturated = mock.Mock(run=mock.Mock(side_effect=LoginUnavailable(wait=1)))
+        with mock.patch('users.backends.get_login_verifier', return_value=saturated):
+            response = self.client.post(reverse('login'), {'email': 'busy@gmail.com', 'password': self.password})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_admin_login_returns_503_when_saturated(self):
+        User.objects.create_superuser('boss@gmail.com', 'boss', self.password)
+        saturated = mock.Mock(run=mock.Mock(side_effect=LoginUnavailable(wait=1)))
+        with mock.patch('users.backends.get_login_verifier', return_value=saturated):
+            response = self.client.post(reverse('admin:login'), {'username': 'boss@gmail.com', 'password': self.password})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_upgrades_hash_on_login(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            user = User.objects.create_user('old@gmail.com', 'old', self.password)
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            response = self.client.post(reverse('login'), {'email': 'old@gmail.com', 'password': self.password})
+            self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+        response = self.client.post(reverse('login'), {'email': 'old@gmail.com', 'password': 'wrong-password'})
+        self.assertEqual(response.status_code, 400)
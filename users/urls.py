@@ -5,7 +5,7 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
     TokenBlacklistView,
 )
-from .views import RegisterView, LoginView, LogoutView, AdminRegisterView
+from .views import RegisterView, LoginView, LogoutView, AdminRegisterView, BulkProvisionView, UserBatchView, UserSearchView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
@@ -16,4 +16,7 @@ urlpatterns = [
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('token/blacklist/', TokenBlacklistView.as_view(), name='token_blacklist'),
     path('admin-register/', AdminRegisterView.as_view(), name='admin-register'),
+    path('users/bulk/', BulkProvisionView.as_view(), name='user-bulk-provision'),
+    path('users/batch/', UserBatchView.as_view(), name='user-batch'),
+    path('users/search/', UserSearchView.as_view(), name='user-search'),
 ]
@@ -1,13 +1,18 @@
 import logging
+from django.conf import settings
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import User
 from rest_framework.views import APIView
-from .serializers import RegisterSerializer, LoginSerializer
+from .serializers import RegisterSerializer, LoginSerializer, BulkProvisionSerializer, UserSearchResultSerializer, UserSummarySerializer
+from .caching import get_cached_users
+from .directory import SearchCursor, recent_assignees, search_users
+from .provisioning import provision_users
 from .permissions import IsAdminUser
 from users import serializers 
+from core.batch import BatchRetrieveMixin
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +34,7 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = RegisterSerializer
+    query_budget = 4
 
     def create(self, request, *args, **kwargs):
         """
@@ -48,7 +54,7 @@ class RegisterView(generics.CreateAPIView):
             serializer.is_valid(raise_exception=True)
             self.perform_create(serializer)
             headers = self.get_success_headers(serializer.data)
-            logger.info(f"User registered with email: {serializer.data['email']}")
+            logger.info("User registered with email: %s", serializer.data['email'])
             return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
         except serializers.ValidationError as e:
             return Response(e.detail, status=status.HTTP_400_BAD_REQUEST)
@@ -64,6 +70,7 @@ class LoginView(generics.GenericAPIView):
     """
 
     serializer_class = LoginSerializer
+    query_budget = 2
 
     def post(self, request, *args, **kwargs):
         """
@@ -94,6 +101,7 @@ class LogoutView(generics.GenericAPIView):
     """
 
     permission_classes = (IsAuthenticated,)
+    query_budget = 7
 
     def post(self, request, *args, **kwargs):
         """
@@ -112,10 +120,10 @@ class LogoutView(generics.GenericAPIView):
             refresh_token = request.data["refresh"]
             token = RefreshToken(refresh_token)
             token.blacklist()
-            logger.info(f"User logged out with email: {request.user.email}")
+            logger.info("User logged out with email: %s", request.user.email)
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
-            logger.error(f"Error during logout: {str(e)}")
+            logger.error("Error during logout: %s", e)
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -135,6 +143,7 @@ class AdminRegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (IsAdminUser,)
     serializer_class = RegisterSerializer
+    query_budget = 5
 
     def get_serializer_context(self):
         """
@@ -168,15 +177,132 @@ class AdminRegisterView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
-        logger.info(f"Admin user registered with email: {serializer.data['email']}")
+        logger.info("Admin user registered with email: %s", serializer.data['email'])
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def perform_create(self, serializer):
         """
-        Saves the admin user with is_superuser set to True.
+        Saves the admin user with is_superuser set to True, in the requesting admin's organization.
 
         Parameters:
         serializer : RegisterSerializer
             The serializer object containing the admin user data.
         """
-        serializer.save(is_superuser=True)
\ No newline at end of file
+        serializer.save(is_superuser=True, organization_id=self.request.user.organization_id)
+
+
+class BulkProvisionView(generics.GenericAPIView):
+    """
+    A view for creating many users in one request.
+
+    Attributes:
+    permission_classes : (IsAdminUser,)
+        The permissions required for accessing this view.
+    serializer_class : BulkProvisionSerializer
+        The serializer class for this view.
+    """
+
+    permission_classes = (IsAdminUser,)
+    serializer_class = BulkProvisionSerializer
+    query_budget = 5
+
+    def post(self, request, *args, **kwargs):
+        """
+        Validates and creates the users in ``users`` in the requesting admin's organization,
+        reporting rejected rows individually.
+
+        Parameters:
+        request : Request
+            The request object containing the list of users.
+
+        Returns:
+        Response
+            A response object with the created users and the per-row errors.
+            The status code is 201 if at least one user was created, 400 otherwise.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = provision_users(
+            serializer.validated_data['users'],
+            workers=settings.USER_PROVISIONING_HTTP_WORKERS,
+            organization_id=request.user.organization_id,
+        )
+        logger.info("Bulk provisioning by %s: %d created, %d rejected",
+                    request.user.email, len(result.created), len(result.errors))
+        return Response(
+            {
+                'created': [{'id': user.id, 'email': user.email, 'username': user.username} for user in result.created],
+                'errors': result.errors,
+            },
+            status=status.HTTP_201_CREATED if result.created else status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class UserBatchView(BatchRetrieveMixin, generics.GenericAPIView):
+    """
+    A view returning the users of the requester's organization among a list of ids
+    (``GET ?ids=1,2,3`` or ``POST {"ids": [...]}``, see core/batch.py).
+
+    Attributes:
+    permission_classes : (IsAuthenticated,)
+        The permissions required for accessing this view.
+    serializer_class : UserSummarySerializer
+        The serializer class for this view.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    serializer_class = UserSummarySerializer
+    query_budget = 2
+
+    def get_batch(self, ids):
+        # Through the user cache: usually no query at all.
+        users = get_cached_users(ids)
+        organization_id = self.request.user.organization_id
+        return {pk: user for pk, user in users.items() if user.organization_id == organization_id}, ()
+
+    def get(self, request, *args, **kwargs):
+        return self.batch(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        return self.batch(request, *args, **kwargs)
+
+
+class UserSearchView(generics.GenericAPIView):
+    """
+    A view for finding assignees: the users of the requester's organization whose username
+    starts with ``q``, or whose email is ``q`` (see users/directory.py).
+
+    Attributes:
+    permission_classes : (IsAuthenticated,)
+        The permissions required for accessing this view.
+    serializer_class : UserSearchResultSerializer
+        The serializer class for this view.
+    """
+
+    permission_classes = (IsAuthenticated,)
+    serializer_class = UserSearchResultSerializer
+    query_budget = 3
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns a page of matching users, or the users recently assigned tasks by the requester if ``q`` is empty.
+
+        Parameters:
+        request : Request
+            The request object, with ``q``, ``limit`` and the ``cursor`` of a previous page.
+
+        Returns:
+        Response
+            ``{"results": [...], "next": <cursor or null>}``.
+        """
+        prefix = request.query_params.get('q', '').strip()
+        if not prefix:
+            return Response({'results': recent_assignees(request.user), 'next': None})
+        try:
+            limit = int(request.query_params.get('limit', settings.USER_SEARCH_LIMIT))
+            after = SearchCursor.decode(request.query_params['cursor']) if 'cursor' in request.query_params else None
+        except ValueError:
+            return Response({"detail": "Invalid `limit` or `cursor`."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), settings.USER_SEARCH_MAX_LIMIT)
+        users, cursor = search_users(request.user.organization_id, prefix, limit, after)
+        return Response({'results': users, 'next': cursor.encode() if cursor else None})